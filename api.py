@@ -8,12 +8,18 @@ from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import numpy as np
 import torch
-import torch.nn as nn
 import csv
 import re
 from typing import List, Dict, Optional
+from functools import partial
 import os
 
+from cnn import SimpleCNN
+from batching import MicroBatcher, isolate_failures, json_response
+from text_encoder import TextEncoder, clean_text
+from inference_backend import load_backend
+from verification.fusion import count_fusion
+
 # Initialize FastAPI
 app = FastAPI(
     title="BANED Fake News Detection API",
@@ -53,43 +59,15 @@ class HealthResponse(BaseModel):
     kb_loaded: bool
     version: str
 
-# Simple CNN Model (same as training)
-class SimpleCNN(nn.Module):
-    def __init__(self, vocab_size, embed_dim=64, num_filters=100, dropout_p=0.5):
-        super().__init__()
-        self.embedding = nn.Embedding(vocab_size, embed_dim, padding_idx=0)
-        self.conv1 = nn.Conv1d(embed_dim, num_filters, kernel_size=3, padding=1)
-        self.conv2 = nn.Conv1d(embed_dim, num_filters, kernel_size=4, padding=2)
-        self.conv3 = nn.Conv1d(embed_dim, num_filters, kernel_size=5, padding=2)
-        self.dropout = nn.Dropout(dropout_p)
-        self.fc = nn.Linear(num_filters * 3, 1)
-        self.sigmoid = nn.Sigmoid()
-    
-    def forward(self, x):
-        x = self.embedding(x)
-        x = x.transpose(1, 2)
-        c1 = torch.relu(self.conv1(x))
-        c2 = torch.relu(self.conv2(x))
-        c3 = torch.relu(self.conv3(x))
-        c1 = torch.max(c1, dim=2)[0]
-        c2 = torch.max(c2, dim=2)[0]
-        c3 = torch.max(c3, dim=2)[0]
-        concat = torch.cat([c1, c2, c3], dim=1)
-        concat = self.dropout(concat)
-        out = self.fc(concat)
-        return self.sigmoid(out).squeeze()
-    
-    def predict(self, x):
-        """Prediction mode - returns probabilities"""
-        return self.forward(x)
-
 # Global state
 model = None
+backend = None  # inference_backend: torch, torchscript or onnx
 vocab = None
 real_patterns = []
 fake_patterns = []
 device = 'cpu'
 MODEL_LOADED = False
+CNN_BACKEND = os.environ.get('BANED_CNN_BACKEND', 'torch')
 KB_LOADED = False
 
 # Common words blacklist for filtering
@@ -100,17 +78,9 @@ COMMON_WORDS = {
     'would', 'could', 'should'
 }
 
-def clean_text(text):
-    """Clean text (same as prep_data.py)"""
-    text = text.lower()
-    text = re.sub(r'http\S+|www\S+', '', text)
-    text = re.sub(r'[^a-z\s]', '', text)
-    text = re.sub(r'\s+', ' ', text)
-    return text.strip()
-
 def load_model(model_dir='models'):
     """Load trained CNN model and vocabulary"""
-    global model, vocab, device, MODEL_LOADED
+    global model, backend, vocab, device, MODEL_LOADED
     
     try:
         # Load vocabulary
@@ -118,16 +88,20 @@ def load_model(model_dir='models'):
         with open(vocab_path, 'r', encoding='utf-8') as f:
             vocab = {word.strip(): idx for idx, word in enumerate(f.readlines())}
         
-        # Initialize model
-        model = SimpleCNN(len(vocab), dropout_p=0.5).to(device)
-        
-        # Load weights
         weights_path = os.path.join(model_dir, 'model.pth')
-        model.load_state_dict(torch.load(weights_path, map_location=device))
-        model.eval()
+        if CNN_BACKEND == 'torch':
+            # Initialize model
+            model = SimpleCNN(len(vocab), dropout_p=0.5).to(device)
+            
+            # Load weights
+            model.load_state_dict(torch.load(weights_path, map_location=device))
+            model.eval()
+        
+        # Exported TorchScript/ONNX/int8 graphs are found next to the weights
+        backend = load_backend(CNN_BACKEND, weights_path, model, MAX_LEN, device)
         
         MODEL_LOADED = True
-        print(f"[INFO] Model loaded: {len(vocab)} words in vocabulary")
+        print(f"[INFO] Model loaded: {len(vocab)} words in vocabulary ({backend.name} backend)")
         return True
     except Exception as e:
         print(f"[ERROR] Failed to load model: {e}")
@@ -163,36 +137,41 @@ def load_knowledge_base(kb_dir='kb'):
         KB_LOADED = False
         return False
 
-def predict_cnn(text, mc_samples=10):
-    """Predict using CNN with MC Dropout"""
+# Token length the model was trained on
+MAX_LEN = 50
+
+def texts_to_ids(texts, max_len=MAX_LEN):
+    """Clean, tokenize and pad texts into a [batch, seq_len] int64 index array.
+    
+    seq_len is the longest text in the batch (at least the widest kernel, at most
+    max_len); the backends score it as if padded to max_len.
+    """
+    x, _ = TextEncoder(vocab, max_len, clean=clean_text).encode(texts)
+    return x
+
+def predict_cnn_batch(texts, mc_samples=10):
+    """Predict a list of texts using CNN with MC Dropout (one batched pass)"""
     if not MODEL_LOADED:
         raise ValueError("Model not loaded")
     
-    # Clean and tokenize
-    cleaned = clean_text(text)
-    tokens = cleaned.split()[:50]  # Max 50 tokens
-    
-    # Convert to indices
-    indices = [vocab.get(token, 0) for token in tokens]
+    x = texts_to_ids(texts)
     
-    # Pad
-    if len(indices) < 50:
-        indices += [0] * (50 - len(indices))
-    
-    # Convert to tensor
-    x = torch.tensor([indices], dtype=torch.long).to(device)
-    
-    # MC Dropout inference
-    model.train()  # Keep dropout active
-    predictions = []
-    with torch.no_grad():
-        for _ in range(mc_samples):
-            pred = model(x).item()
-            predictions.append(pred)
+    # MC Dropout inference (shared trunk, resampled dropout masks)
+    mean, _ = mc_dropout(x, mc_samples)
+    return mean.tolist()
+
+def predict_cnn(text, mc_samples=10):
+    """Predict using CNN with MC Dropout"""
+    return predict_cnn_batch([text], mc_samples)[0]
+
+def mc_dropout(x, mc_samples=10):
+    """MC Dropout for a [batch, seq_len] input with one trunk pass (see inference_backend).
     
-    # Average predictions
-    avg_pred = np.mean(predictions)
-    return avg_pred
+    Returns:
+        (mean, std) arrays of shape [batch]
+    """
+    probs = backend.mc_predict(x, mc_samples)  # [mc_samples, batch]
+    return probs.mean(axis=0), probs.std(axis=0)
 
 def match_patterns(text):
     """Match text against knowledge base patterns"""
@@ -216,24 +195,16 @@ def fuse_predictions(cnn_prob, kb_matches):
     if not kb_matches or (not kb_matches['real'] and not kb_matches['fake']):
         return cnn_prob
     
-    # KB probability
-    real_count = len(kb_matches['real'])
-    fake_count = len(kb_matches['fake'])
-    total_count = real_count + fake_count
-    
-    if total_count == 0:
-        kb_prob = 0.5
-    else:
-        kb_prob = real_count / total_count
-    
-    # Confidence-based weighting
-    cnn_confidence = abs(cnn_prob - 0.5)
-    cnn_weight = min(1.0, cnn_confidence / 0.4)
-    kb_weight = 1.0 - cnn_weight
-    
-    # Weighted fusion
-    fused_prob = (cnn_prob * cnn_weight) + (kb_prob * kb_weight)
-    return fused_prob
+    # Confidence-weighted fusion with KB probability = share of real matches
+    return count_fusion(cnn_prob, len(kb_matches['real']), len(kb_matches['fake']), divisor=0.4)
+
+# Micro-batching of concurrent /predict requests
+MAX_BATCH = 32
+MAX_WAIT_MS = 5.0
+# /predict/batch: texts per worker call (one CNN forward pass), and per request
+BATCH_SIZE = 256
+MAX_BATCH_TEXTS = 10000
+cnn_batcher = MicroBatcher(predict_cnn_batch, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS)
 
 @app.on_event("startup")
 async def startup_event():
@@ -241,8 +212,14 @@ async def startup_event():
     print("[INFO] Starting BANED API...")
     load_model()
     load_knowledge_base()
+    cnn_batcher.start()
     print(f"[INFO] API ready - Model: {MODEL_LOADED}, KB: {KB_LOADED}")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the micro-batcher (queued requests are failed)"""
+    await cnn_batcher.stop()
+
 @app.get("/", response_model=HealthResponse)
 async def root():
     """API health check"""
@@ -253,6 +230,45 @@ async def root():
         "version": "3.0.0"
     }
 
+def build_prediction(text, cnn_prob, kb_matches, use_fusion=True):
+    """Fuse one CNN probability with its KB matches and format the response"""
+    # Fusion
+    if use_fusion and KB_LOADED and kb_matches:
+        final_prob = fuse_predictions(cnn_prob, kb_matches)
+        method = "fusion"
+    else:
+        final_prob = cnn_prob
+        method = "cnn_only"
+    
+    # Classify
+    prediction = "REAL" if final_prob > 0.5 else "FAKE"
+    confidence = abs(final_prob - 0.5) * 2  # Convert to 0-1 scale
+    
+    return {
+        "text": text[:100] + "..." if len(text) > 100 else text,
+        "prediction": prediction,
+        "confidence": round(confidence, 4),
+        "cnn_probability": round(cnn_prob, 4),
+        "kb_match": kb_matches,
+        "method": method
+    }
+
+def analyze_texts(texts, use_fusion=True):
+    """Prediction (or error) of every text of a /predict/batch chunk"""
+    results = []
+    for text, cnn_prob in zip(texts, isolate_failures(predict_cnn_batch, texts)):
+        try:
+            if isinstance(cnn_prob, Exception):
+                raise cnn_prob
+            kb_matches = match_patterns(text) if KB_LOADED else None
+            results.append(build_prediction(text, cnn_prob, kb_matches, use_fusion))
+        except Exception as e:
+            results.append({
+                "text": text[:50] + "...",
+                "error": str(e)
+            })
+    return results
+
 @app.post("/predict", response_model=PredictionResponse)
 async def predict(request: PredictionRequest):
     """Predict if text is real or fake news"""
@@ -260,54 +276,32 @@ async def predict(request: PredictionRequest):
         raise HTTPException(status_code=503, detail="Model not loaded")
     
     try:
-        # CNN prediction
-        cnn_prob = predict_cnn(request.text)
+        # CNN prediction (coalesced with concurrent requests, run off the event loop)
+        cnn_prob = await cnn_batcher.submit(request.text)
         
         # KB matching
         kb_matches = match_patterns(request.text) if KB_LOADED else None
         
-        # Fusion
-        if request.use_fusion and KB_LOADED and kb_matches:
-            final_prob = fuse_predictions(cnn_prob, kb_matches)
-            method = "fusion"
-        else:
-            final_prob = cnn_prob
-            method = "cnn_only"
-        
-        # Classify
-        prediction = "REAL" if final_prob > 0.5 else "FAKE"
-        confidence = abs(final_prob - 0.5) * 2  # Convert to 0-1 scale
-        
-        return {
-            "text": request.text[:100] + "..." if len(request.text) > 100 else request.text,
-            "prediction": prediction,
-            "confidence": round(confidence, 4),
-            "cnn_probability": round(cnn_prob, 4),
-            "kb_match": kb_matches,
-            "method": method
-        }
+        return build_prediction(request.text, cnn_prob, kb_matches, request.use_fusion)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/predict/batch")
 async def predict_batch(request: BatchPredictionRequest):
-    """Predict multiple texts at once"""
+    """Predict multiple texts at once (batched CNN passes, interleaved with /predict batches)"""
     if not MODEL_LOADED:
         raise HTTPException(status_code=503, detail="Model not loaded")
+    if len(request.texts) > MAX_BATCH_TEXTS:
+        raise HTTPException(status_code=413, detail=f"Too many texts (max {MAX_BATCH_TEXTS})")
     
-    results = []
-    for text in request.texts:
-        try:
-            pred_req = PredictionRequest(text=text, use_fusion=request.use_fusion)
-            result = await predict(pred_req)
-            results.append(result)
-        except Exception as e:
-            results.append({
-                "text": text[:50] + "...",
-                "error": str(e)
-            })
+    try:
+        results = await cnn_batcher.run_chunked(
+            partial(analyze_texts, use_fusion=request.use_fusion), request.texts, BATCH_SIZE
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
     
-    return {"results": results, "total": len(results)}
+    return await json_response({"results": results, "total": len(results)})
 
 @app.get("/stats")
 async def get_stats():
@@ -316,7 +310,8 @@ async def get_stats():
         "model": {
             "loaded": MODEL_LOADED,
             "vocabulary_size": len(vocab) if vocab else 0,
-            "device": device
+            "device": device,
+            "backend": backend.name if backend else None
         },
         "knowledge_base": {
             "loaded": KB_LOADED,
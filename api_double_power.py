@@ -9,16 +9,19 @@ from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import numpy as np
 import torch
-import torch.nn as nn
 import csv
-import re
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import os
 import sys
 
 # Add verification module to path
 sys.path.append(os.path.dirname(__file__))
 from verification.logical_consistency import DoublePowerVerifier, LogicalConsistencyChecker, FactDatabase
+from verification.analyzed_text import AnalyzedText
+from cnn import SimpleCNN
+from batching import MicroBatcher, isolate_failures, json_response
+from text_encoder import TextEncoder, clean_text_pl
+from inference_backend import load_backend
 
 # Initialize FastAPI
 app = FastAPI(
@@ -57,80 +60,36 @@ class BatchRequest(BaseModel):
     texts: List[str]
     use_double_power: bool = True
 
-# CNN Model (same as BANED)
-class SimpleCNN(nn.Module):
-    def __init__(self, vocab_size, embed_dim=64, num_filters=100, dropout_p=0.5):
-        super().__init__()
-        self.embedding = nn.Embedding(vocab_size, embed_dim, padding_idx=0)
-        self.conv1 = nn.Conv1d(embed_dim, num_filters, kernel_size=3, padding=1)
-        self.conv2 = nn.Conv1d(embed_dim, num_filters, kernel_size=4, padding=2)
-        self.conv3 = nn.Conv1d(embed_dim, num_filters, kernel_size=5, padding=2)
-        self.dropout = nn.Dropout(dropout_p)
-        self.fc = nn.Linear(num_filters * 3, 1)
-        self.sigmoid = nn.Sigmoid()
-    
-    def forward(self, x):
-        x = self.embedding(x)
-        x = x.transpose(1, 2)
-        c1 = torch.relu(self.conv1(x))
-        c2 = torch.relu(self.conv2(x))
-        c3 = torch.relu(self.conv3(x))
-        c1 = torch.max(c1, dim=2)[0]
-        c2 = torch.max(c2, dim=2)[0]
-        c3 = torch.max(c3, dim=2)[0]
-        concat = torch.cat([c1, c2, c3], dim=1)
-        concat = self.dropout(concat)
-        out = self.fc(concat)
-        return self.sigmoid(out).squeeze()
-
 # Global state
-models = {}  # Will hold 'pl' and 'en' models
+models = {}  # Will hold 'pl' and 'en' inference backends (see inference_backend)
+CNN_BACKEND = os.environ.get('BANED_CNN_BACKEND', 'torch')
 vocabs = {}
 double_power_verifier = DoublePowerVerifier()
 device = 'cpu'
 
-# Language detection
-POLISH_CHARS = set('ąćęłńóśźż')
-POLISH_COMMON_WORDS = {
-    'jest', 'się', 'nie', 'że', 'jak', 'ale', 'dla', 'jego', 'przez',
-    'na', 'do', 'po', 'przed', 'bardzo', 'może', 'może', 'tylko'
-}
-
-def detect_language(text: str) -> str:
-    """Auto-detect Polish or English"""
-    text_lower = text.lower()
-    
-    # Check for Polish diacritics
-    if any(char in POLISH_CHARS for char in text_lower):
-        return 'pl'
-    
-    # Check for common Polish words
-    words = set(re.findall(r'\b\w+\b', text_lower))
-    polish_word_count = len(words & POLISH_COMMON_WORDS)
-    
-    if polish_word_count >= 2 or (polish_word_count > 0 and len(words) < 10):
-        return 'pl'
-    
-    return 'en'
-
 def preprocess_text(text: str) -> str:
     """Clean and normalize text"""
-    text = text.lower()
-    text = re.sub(r'http\S+|www\S+', '', text)
-    text = re.sub(r'[^a-ząćęłńóśźż\s]', ' ', text)
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text
+    return clean_text_pl(text)
+
+# Token length the models were trained on
+MAX_LEN = 100
 
-def text_to_indices(text: str, vocab: dict, max_len: int = 100) -> torch.Tensor:
+def texts_to_indices(texts: List[str], vocab: dict, max_len: int = MAX_LEN) -> np.ndarray:
+    """Convert texts to a [batch, seq_len] int64 array of indices, padded only to the
+    longest text in the batch (at least the widest kernel, at most max_len)"""
+    encoder = TextEncoder(vocab, max_len, clean=preprocess_text, unk=vocab.get('<UNK>', 0))
+    x, _ = encoder.encode(texts)
+    return x
+
+def text_to_indices(text: str, vocab: dict, max_len: int = MAX_LEN) -> torch.Tensor:
     """Convert text to tensor indices"""
-    words = preprocess_text(text).split()
-    indices = [vocab.get(w, vocab.get('<UNK>', 0)) for w in words[:max_len]]
-    
-    # Pad to max_len
-    if len(indices) < max_len:
-        indices += [0] * (max_len - len(indices))
-    
-    return torch.tensor([indices], dtype=torch.long)
+    return torch.from_numpy(texts_to_indices([text], vocab, max_len))
+
+def mc_dropout(backend, x: np.ndarray, mc_samples: int = 5):
+    """MC Dropout for a [batch, seq_len] input with one trunk pass (see inference_backend).
+    The input is scored as if padded to MAX_LEN. Returns (mean, std) arrays of shape [batch]."""
+    probs = backend.mc_predict(x, mc_samples)  # [mc_samples, batch]
+    return probs.mean(axis=0), probs.std(axis=0)
 
 def load_model(model_path: str, vocab_path: str, lang: str):
     """Load CNN model and vocabulary"""
@@ -145,47 +104,82 @@ def load_model(model_path: str, vocab_path: str, lang: str):
                 if word:
                     vocab[word] = idx
     
-    # Load model
-    model = SimpleCNN(vocab_size=len(vocab))
-    if os.path.exists(model_path):
-        model.load_state_dict(torch.load(model_path, map_location=device))
-        model.eval()
+    # Load model (exported TorchScript/ONNX/int8 graphs are found next to the weights)
+    model = None
+    if CNN_BACKEND == 'torch':
+        model = SimpleCNN(vocab_size=len(vocab))
+        if os.path.exists(model_path):
+            model.load_state_dict(torch.load(model_path, map_location=device))
+            model.eval()
     
-    models[lang] = model
+    models[lang] = load_backend(CNN_BACKEND, model_path, model, MAX_LEN, device)
     vocabs[lang] = vocab
 
-def predict_with_cnn(text: str, lang: str) -> Dict:
-    """Get CNN prediction"""
+def predict_with_cnn_batch(texts: List[str], lang: str) -> List[Optional[Dict]]:
+    """Get CNN predictions for many texts with one batched MC Dropout pass"""
     if lang not in models:
-        return None
+        return [None] * len(texts)
     
-    model = models[lang]
+    backend = models[lang]
     vocab = vocabs[lang]
     
-    # Convert text to tensor
-    x = text_to_indices(text, vocab)
+    # Convert texts to token IDs
+    x = texts_to_indices(texts, vocab)
     
-    # Get prediction
-    with torch.no_grad():
-        prob = model(x).item()
+    # MC Dropout for uncertainty (5 samples, shared trunk)
+    mean, std = mc_dropout(backend, x, mc_samples=5)
     
-    # MC Dropout for uncertainty (5 samples)
-    model.train()  # Enable dropout
-    mc_probs = []
-    with torch.no_grad():
-        for _ in range(5):
-            mc_probs.append(model(x).item())
-    model.eval()
+    results = []
+    for mean_prob, std_prob in zip(mean.tolist(), std.tolist()):
+        results.append({
+            'probability': mean_prob,
+            'uncertainty': std_prob,
+            'prediction': 'FAKE' if mean_prob > 0.5 else 'REAL',
+            'confidence': abs(mean_prob - 0.5) * 2.0
+        })
+    return results
+
+def predict_with_cnn(text: str, lang: str) -> Dict:
+    """Get CNN prediction"""
+    return predict_with_cnn_batch([text], lang)[0]
+
+def analyze_batch(items: List[tuple]) -> List[tuple]:
+    """
+    Run both powers for (AnalyzedText, lang, use_double_power) items.
+    CNN passes are batched per language; returns (cnn_result, verification_result) per item,
+    or the exception raised while verifying that item.
+    """
+    cnn_results = [None] * len(items)
+    by_lang = {}
+    for i, (text, lang, use_double_power) in enumerate(items):
+        if lang in models and use_double_power:
+            by_lang.setdefault(lang, []).append(i)
     
-    mean_prob = np.mean(mc_probs)
-    std_prob = np.std(mc_probs)
+    for lang, positions in by_lang.items():
+        batch_results = predict_with_cnn_batch([items[i][0].text for i in positions], lang)
+        for i, result in zip(positions, batch_results):
+            cnn_results[i] = result
     
-    return {
-        'probability': mean_prob,
-        'uncertainty': std_prob,
-        'prediction': 'FAKE' if mean_prob > 0.5 else 'REAL',
-        'confidence': abs(mean_prob - 0.5) * 2.0
-    }
+    results = []
+    for (text, lang, use_double_power), cnn_result in zip(items, cnn_results):
+        verification_result = None
+        if use_double_power:
+            cnn_prob = cnn_result['probability'] if cnn_result else None
+            try:
+                verification_result = double_power_verifier.verify(text, cnn_prob)
+            except Exception as e:
+                results.append(e)
+                continue
+        results.append((cnn_result, verification_result))
+    return results
+
+# Micro-batching of concurrent /predict requests
+MAX_BATCH = 32
+MAX_WAIT_MS = 5.0
+# /batch: texts per worker call (one CNN forward pass), and per request
+BATCH_SIZE = 256
+MAX_BATCH_TEXTS = 10000
+batcher = MicroBatcher(analyze_batch, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS)
 
 @app.on_event("startup")
 async def startup_event():
@@ -201,6 +195,13 @@ async def startup_event():
     en_vocab_path = 'models/vocab.txt'
     if os.path.exists(en_model_path):
         load_model(en_model_path, en_vocab_path, 'en')
+    
+    batcher.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the micro-batcher (queued requests are failed)"""
+    await batcher.stop()
 
 @app.get("/")
 async def root():
@@ -220,34 +221,26 @@ async def root():
         "inspiration": "LIMM + Neural Proofs for Sound Verification"
     }
 
-@app.post("/predict", response_model=DoublePowerResponse)
-async def predict(request: DoublePowerRequest):
-    """
-    Double Power Prediction:
-    1. CNN Neural Network (pattern recognition)
-    2. Logical Verification (consistency + fact checking)
-    """
-    text = request.text
-    
+def validate_text(text: str, language: Optional[str] = None) -> Tuple[AnalyzedText, str]:
+    """Check a request text; returns it analyzed (shared with verify()) and its language"""
     if not text or len(text) < 10:
         raise HTTPException(status_code=400, detail="Text too short (min 10 chars)")
     
     # Detect language
-    lang = request.language or detect_language(text)
-    
+    analyzed = AnalyzedText(text)
+    return analyzed, language or analyzed.language
+
+def build_response(text: str, lang: str, use_double_power: bool,
+                   cnn_result: Optional[Dict], verification_result: Optional[Dict]) -> DoublePowerResponse:
+    """Combine both powers into the final response"""
     explanation = []
-    cnn_result = None
-    verification_result = None
     
     # Power 1: CNN Neural Network
-    if lang in models and request.use_double_power:
-        cnn_result = predict_with_cnn(text, lang)
+    if cnn_result:
         explanation.append(f"CNN ({lang.upper()}): {cnn_result['prediction']} with {cnn_result['confidence']:.2%} confidence")
     
     # Power 2: Logical Verification
-    if request.use_double_power:
-        cnn_prob = cnn_result['probability'] if cnn_result else None
-        verification_result = double_power_verifier.verify(text, cnn_prob)
+    if verification_result:
         explanation.append(f"Verification: {verification_result['verdict']} (score: {verification_result['verification_score']})")
         
         if verification_result['all_issues']:
@@ -256,7 +249,7 @@ async def predict(request: DoublePowerRequest):
                 explanation.append(f"  • {issue}")
     
     # Determine final prediction
-    if request.use_double_power and verification_result:
+    if use_double_power and verification_result:
         # Use double power result
         final_prediction = verification_result['verdict']
         final_confidence = verification_result['confidence']
@@ -290,28 +283,70 @@ async def predict(request: DoublePowerRequest):
         explanation=explanation
     )
 
-@app.post("/batch")
-async def batch_predict(request: BatchRequest):
-    """Batch prediction with double power"""
-    results = []
+@app.post("/predict", response_model=DoublePowerResponse)
+async def predict(request: DoublePowerRequest):
+    """
+    Double Power Prediction:
+    1. CNN Neural Network (pattern recognition)
+    2. Logical Verification (consistency + fact checking)
+    """
+    text = request.text
+    analyzed, lang = validate_text(text, request.language)
+    
+    # Power 1 (CNN) + Power 2 (Logical Verification), batched with concurrent requests
+    cnn_result, verification_result = await batcher.submit((analyzed, lang, request.use_double_power))
     
-    for text in request.texts:
+    return build_response(text, lang, request.use_double_power, cnn_result, verification_result)
+
+def analyze_responses(items: List[tuple]) -> List[Dict]:
+    """Response (or error) of every (AnalyzedText, lang, use_double_power) item of a /batch chunk"""
+    results = []
+    for (analyzed, lang, use_double_power), outcome in zip(items, isolate_failures(analyze_batch, items)):
+        text = analyzed.text
         try:
-            result = await predict(DoublePowerRequest(
-                text=text,
-                use_double_power=request.use_double_power
-            ))
-            results.append(result.dict())
+            if isinstance(outcome, Exception):
+                raise outcome
+            cnn_result, verification_result = outcome
+            results.append(build_response(text, lang, use_double_power, cnn_result, verification_result).dict())
         except Exception as e:
             results.append({
                 "text": text[:100],
                 "error": str(e)
             })
+    return results
+
+@app.post("/batch")
+async def batch_predict(request: BatchRequest):
+    """Batch prediction with double power (batched CNN passes, interleaved with /predict batches)"""
+    if len(request.texts) > MAX_BATCH_TEXTS:
+        raise HTTPException(status_code=413, detail=f"Too many texts (max {MAX_BATCH_TEXTS})")
     
-    return {
+    results = [None] * len(request.texts)
+    items = []
+    positions = []
+    for i, text in enumerate(request.texts):
+        try:
+            analyzed, lang = validate_text(text)
+            items.append((analyzed, lang, request.use_double_power))
+            positions.append(i)
+        except Exception as e:
+            results[i] = {
+                "text": text[:100],
+                "error": str(e)
+            }
+    
+    try:
+        analyzed = await batcher.run_chunked(analyze_responses, items, BATCH_SIZE)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    for i, result in zip(positions, analyzed):
+        results[i] = result
+    
+    return await json_response({
         "total": len(request.texts),
         "results": results
-    }
+    })
 
 @app.get("/health")
 async def health_check():
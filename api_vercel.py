@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 """
 Vercel-compatible API for BANED Double Power
-Serverless deployment without PyTorch (verification-only mode)
+Serverless deployment without PyTorch: the English CNN runs in NumPy
+(numpy_cnn.py) next to the verification pipeline; without its weights the
+API falls back to verification-only mode
 """
 from http.server import BaseHTTPRequestHandler
 import json
@@ -9,14 +11,47 @@ import sys
 import os
 
 # Add verification module to path
-sys.path.insert(0, os.path.dirname(__file__))
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
 
 # Import only the verification components (no PyTorch needed)
 from verification.logical_consistency import DoublePowerVerifier
+from verification.analyzed_text import AnalyzedText
 
 # Initialize verifier
 verifier = DoublePowerVerifier()
 
+# English CNN exported with: python save_model.py --export models/model_10k_easy_best.pth --formats npz
+CNN_MODEL_PATH = os.environ.get('BANED_CNN_MODEL', os.path.join(BASE_DIR, 'models', 'model_10k_easy_best.npz'))
+CNN_VOCAB_PATH = os.environ.get('BANED_CNN_VOCAB', os.path.join(BASE_DIR, 'models', 'vocab_10k_easy_360words.txt'))
+MC_SAMPLES = 10
+
+cnn = None
+encoder = None
+try:
+    from numpy_cnn import NumpyCNN
+    from text_encoder import TextEncoder, clean_text
+    
+    cnn = NumpyCNN.load(CNN_MODEL_PATH)
+    with open(CNN_VOCAB_PATH, 'r', encoding='utf-8') as f:
+        vocab = {word.strip(): idx for idx, word in enumerate(f.readlines())}
+    encoder = TextEncoder(vocab, cnn.padded_len, clean=clean_text)
+except (ImportError, OSError, KeyError) as e:
+    cnn = None
+    print(f"[WARN] CNN not loaded, verification-only mode: {e}")
+
+def predict_with_cnn(text):
+    """MC Dropout CNN prediction (probability = P(fake); cnn.py models output P(real))"""
+    ids, _ = encoder.encode([text])
+    real_probs = cnn.mc_predict(ids, MC_SAMPLES)[:, 0]
+    fake_prob = 1.0 - float(real_probs.mean())
+    return {
+        'probability': fake_prob,
+        'uncertainty': float(real_probs.std()),
+        'prediction': 'FAKE' if fake_prob > 0.5 else 'REAL',
+        'confidence': abs(fake_prob - 0.5) * 2.0
+    }
+
 class handler(BaseHTTPRequestHandler):
     def do_GET(self):
         """Handle GET requests"""
@@ -30,8 +65,9 @@ class handler(BaseHTTPRequestHandler):
                 "name": "BANED Double Power API",
                 "version": "4.1.0-vercel",
                 "status": "online",
-                "mode": "heuristic-analysis",
+                "mode": "cnn+heuristic-analysis" if cnn is not None else "heuristic-analysis",
                 "features": [
+                    "NumPy CNN with MC Dropout (English)",
                     "Heuristic Pattern Detection",
                     "Logical Consistency Checking",
                     "Fake News Pattern Recognition",
@@ -53,6 +89,7 @@ class handler(BaseHTTPRequestHandler):
                 "status": "healthy",
                 "heuristic_analysis_active": True,
                 "pattern_detection_enabled": True,
+                "cnn_loaded": cnn is not None,
                 "mode": "serverless"
             }
             
@@ -129,11 +166,14 @@ class handler(BaseHTTPRequestHandler):
                     }).encode())
                     return
                 
-                # Detect language
-                lang = self._detect_language(text)
+                # Detect language (the analyzed text is shared with verify())
+                analyzed = AnalyzedText(text)
+                lang = analyzed.language
                 
-                # Run verification (no CNN in serverless mode)
-                result = verifier.verify(text, cnn_prediction=None)
+                # The CNN was trained on English only
+                cnn_result = predict_with_cnn(text) if cnn is not None and lang == 'en' else None
+                cnn_prob = cnn_result['probability'] if cnn_result else None
+                result = verifier.verify(analyzed, cnn_prediction=cnn_prob)
                 
                 # Build response
                 # Build explanation
@@ -144,6 +184,8 @@ class handler(BaseHTTPRequestHandler):
                     f"Logical Consistency: {result['power_1_consistency']['consistency_level']}",
                     f"Pattern Detection: {result['power_2_fact_check']['verification_level']}"
                 ]
+                if cnn_result:
+                    explanation.append(f"CNN: {cnn_result['prediction']} (fake probability {cnn_result['probability']:.2f} ± {cnn_result['uncertainty']:.2f})")
                 
                 # Add Stage 2 info if available
                 if result.get('stage2_enabled') and result.get('stage2_fact_verification'):
@@ -165,8 +207,8 @@ class handler(BaseHTTPRequestHandler):
                     "confidence": result['confidence'],
                     "fake_probability": result['fake_probability'],
                     "language": lang,
-                    "method": "HEURISTIC_ANALYSIS" if not result.get('stage2_enabled') else "STAGE1+STAGE2",
-                    "cnn_score": None,
+                    "method": ("CNN+" if cnn_result else "") + ("HEURISTIC_ANALYSIS" if not result.get('stage2_enabled') else "STAGE1+STAGE2"),
+                    "cnn_score": cnn_result,
                     "verification": result,
                     "explanation": explanation
                 }
@@ -205,28 +247,3 @@ class handler(BaseHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
         self.end_headers()
-    
-    def _detect_language(self, text):
-        """Simple language detection"""
-        import re
-        
-        polish_chars = set('ąćęłńóśźż')
-        polish_words = {
-            'jest', 'się', 'nie', 'że', 'jak', 'ale', 'dla', 'jego', 'przez',
-            'na', 'do', 'po', 'przed', 'bardzo', 'może', 'tylko'
-        }
-        
-        text_lower = text.lower()
-        
-        # Check for Polish diacritics
-        if any(char in polish_chars for char in text_lower):
-            return 'pl'
-        
-        # Check for common Polish words
-        words = set(re.findall(r'\b\w+\b', text_lower))
-        polish_word_count = len(words & polish_words)
-        
-        if polish_word_count >= 2 or (polish_word_count > 0 and len(words) < 10):
-            return 'pl'
-        
-        return 'en'
@@ -2,12 +2,18 @@
 """
 apriori_algo.py - Knowledge Base generation using Apriori algorithm
 Finds frequent word patterns in text data
+Mining engines: apriori (horizontal), eclat (vertical TID bitsets), fpgrowth
 """
 import argparse
 import csv
+import json
+import os
 import sys
+import tempfile
 from collections import defaultdict, Counter
-from itertools import combinations
+from multiprocessing import Pool
+
+import numpy as np
 
 
 def tokenize(text):
@@ -15,62 +21,769 @@ def tokenize(text):
     return text.lower().split()
 
 
-def get_itemsets(transactions, min_support_count):
-    """Generate frequent itemsets using Apriori algorithm."""
-    # Count individual items
+class TokenVocabulary:
+    """Maps tokens to dense integer IDs, assigned in first-seen order.
+    
+    Also keeps how often each token occurred, so the vocabulary can be reused
+    by cnn.build_vocab without re-tokenizing the corpus.
+    """
+    
+    def __init__(self, tokens=(), counts=None):
+        self.tokens = list(tokens)
+        self.token_to_id = {token: i for i, token in enumerate(self.tokens)}
+        self.counts = list(counts) if counts is not None else [0] * len(self.tokens)
+    
+    def __len__(self):
+        return len(self.tokens)
+    
+    def intern(self, token):
+        """Return the ID of a token, adding it if unseen, and count the occurrence."""
+        token_id = self.token_to_id.get(token)
+        if token_id is None:
+            token_id = len(self.tokens)
+            self.token_to_id[token] = token_id
+            self.tokens.append(token)
+            self.counts.append(0)
+        self.counts[token_id] += 1
+        return token_id
+    
+    def encode(self, tokens):
+        """Intern a transaction; returns its sorted, unique token IDs."""
+        return sorted({self.intern(token) for token in tokens})
+    
+    def lookup(self, tokens):
+        """Sorted IDs of already known tokens, or None if any token is unknown."""
+        ids = [self.token_to_id.get(token) for token in tokens]
+        if None in ids:
+            return None
+        return tuple(sorted(ids))
+    
+    def decode(self, itemset):
+        """Convert an itemset of IDs back to a frozenset of tokens."""
+        return frozenset(self.tokens[i] for i in itemset)
+    
+    def save(self, path):
+        """Write one 'token<TAB>count' line per ID."""
+        with open(path, 'w', encoding='utf-8') as f:
+            for token, count in zip(self.tokens, self.counts):
+                f.write(f"{token}\t{count}\n")
+    
+    @classmethod
+    def load(cls, path):
+        tokens, counts = [], []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                token, count = line.rstrip('\n').split('\t')
+                tokens.append(token)
+                counts.append(int(count))
+        return cls(tokens, counts)
+
+
+class EncodedCorpus:
+    """Transactions as CSR arrays of sorted, unique int32 token IDs.
+    
+    token_ids holds the IDs of all transactions back to back and offsets (int64,
+    one entry more than there are transactions) the start of each of them. The
+    arrays are either in memory or memory-mapped from disk (see save/load):
+    <prefix>.tokens, <prefix>.offsets and <prefix>.vocab.txt.
+    """
+    
+    def __init__(self, offsets, token_ids, vocab):
+        self.offsets = offsets
+        self.token_ids = token_ids
+        self.vocab = vocab
+    
+    @classmethod
+    def from_token_lists(cls, token_lists, vocab=None):
+        """Encode tokenized transactions, skipping empty ones."""
+        vocab = vocab if vocab is not None else TokenVocabulary()
+        token_ids, lengths = [], []
+        for tokens in token_lists:
+            if tokens:
+                ids = vocab.encode(tokens)
+                token_ids.extend(ids)
+                lengths.append(len(ids))
+        
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return cls(offsets, np.array(token_ids, dtype=np.int32), vocab)
+    
+    @classmethod
+    def from_texts(cls, texts, tokenizer=tokenize, vocab=None):
+        """Tokenize and encode texts, skipping empty ones."""
+        return cls.from_token_lists((tokenizer(text) for text in texts if text), vocab)
+    
+    @classmethod
+    def load(cls, prefix):
+        """Memory-map a corpus written by save() or encode_file()."""
+        vocab = TokenVocabulary.load(f"{prefix}.vocab.txt")
+        offsets = np.memmap(f"{prefix}.offsets", dtype=np.int64, mode='r')
+        if offsets[-1]:
+            token_ids = np.memmap(f"{prefix}.tokens", dtype=np.int32, mode='r')
+        else:
+            # numpy cannot map an empty file
+            token_ids = np.zeros(0, dtype=np.int32)
+        return cls(offsets, token_ids, vocab)
+    
+    def save(self, prefix):
+        np.asarray(self.token_ids, dtype=np.int32).tofile(f"{prefix}.tokens")
+        np.asarray(self.offsets, dtype=np.int64).tofile(f"{prefix}.offsets")
+        self.vocab.save(f"{prefix}.vocab.txt")
+    
+    def __len__(self):
+        return len(self.offsets) - 1
+    
+    def iter_chunks(self, chunk_size=10000):
+        """Yield (token_ids, local_offsets) for consecutive blocks of transactions."""
+        for start in range(0, len(self), chunk_size):
+            end = min(start + chunk_size, len(self))
+            lo, hi = self.offsets[start], self.offsets[end]
+            yield np.asarray(self.token_ids[lo:hi]), np.asarray(self.offsets[start:end + 1]) - lo
+    
+    def transactions(self):
+        """Return the transactions as a list of sorted tuples of IDs."""
+        result = []
+        for token_ids, offsets in self.iter_chunks():
+            ids = token_ids.tolist()
+            bounds = offsets.tolist()
+            result.extend(tuple(ids[a:b]) for a, b in zip(bounds[:-1], bounds[1:]))
+        return result
+    
+    def item_counts(self, chunk_size=10000):
+        """Number of transactions containing each token ID."""
+        counts = np.zeros(len(self.vocab), dtype=np.int64)
+        for token_ids, _ in self.iter_chunks(chunk_size):
+            # IDs are unique within a transaction, so occurrences = transactions
+            counts += np.bincount(token_ids, minlength=len(self.vocab))
+        return counts
+    
+    def close(self):
+        """Release memory maps (needed before the files can be deleted on Windows)."""
+        self.offsets = None
+        self.token_ids = None
+
+
+def count_items(transactions):
+    """Count in how many transactions each item appears."""
     item_counts = Counter()
     for transaction in transactions:
-        for item in set(transaction):
-            item_counts[item] += 1
+        item_counts.update(set(transaction))
+    return item_counts
+
+
+def generate_candidates(frequent_itemsets, k):
+    """Build k-itemset candidates from frequent (k-1)-itemsets.
     
-    # Filter by minimum support
-    frequent_1_itemsets = {
-        frozenset([item]): count 
-        for item, count in item_counts.items() 
+    Itemsets are sorted tuples. Two (k-1)-itemsets are joined only when they
+    share the same (k-2)-prefix, and a candidate is kept only if all of its
+    (k-1)-subsets are frequent (downward closure).
+    """
+    prefix_groups = defaultdict(list)
+    for itemset in sorted(frequent_itemsets):
+        prefix_groups[itemset[:-1]].append(itemset[-1])
+    
+    candidates = []
+    for prefix, tails in prefix_groups.items():
+        for i in range(len(tails)):
+            for j in range(i + 1, len(tails)):
+                candidate = prefix + (tails[i], tails[j])
+                # The two subsets dropping the last two items are the joined
+                # itemsets themselves, so only the others need checking
+                if all(candidate[:m] + candidate[m + 1:] in frequent_itemsets
+                       for m in range(k - 2)):
+                    candidates.append(candidate)
+    
+    return candidates
+
+
+def build_candidate_trie(candidates):
+    """Store candidates in a prefix trie of nested dicts; leaves hold counts."""
+    root = {}
+    for candidate in candidates:
+        node = root
+        for item in candidate[:-1]:
+            node = node.setdefault(item, {})
+        node[candidate[-1]] = 0
+    return root
+
+
+def count_in_trie(node, transaction, start, depth):
+    """Increment every candidate of length `depth` contained in the sorted transaction."""
+    if depth == 1:
+        for item in transaction[start:]:
+            if item in node:
+                node[item] += 1
+        return
+    
+    for i in range(start, len(transaction) - depth + 1):
+        child = node.get(transaction[i])
+        if child is not None:
+            count_in_trie(child, transaction, i + 1, depth - 1)
+
+
+def collect_trie_counts(node, prefix=()):
+    """Yield (itemset, count) pairs stored in the trie leaves."""
+    for item, child in node.items():
+        if isinstance(child, dict):
+            yield from collect_trie_counts(child, prefix + (item,))
+        else:
+            yield prefix + (item,), child
+
+
+def count_candidates(transactions, candidates, k):
+    """Count support of k-itemset candidates over sorted transactions."""
+    trie = build_candidate_trie(candidates)
+    for transaction in transactions:
+        if len(transaction) >= k:
+            count_in_trie(trie, transaction, 0, k)
+    return dict(collect_trie_counts(trie))
+
+
+def get_itemsets(transactions, min_support_count, max_length=3):
+    """Generate frequent itemsets using Apriori algorithm.
+    
+    Args:
+        transactions: List of token lists
+        min_support_count: Minimum number of transactions containing an itemset
+        max_length: Maximum itemset size
+    
+    Returns:
+        Dictionary mapping frozenset itemsets to their counts
+    """
+    # An itemset has to occur at least once to be reported
+    min_support_count = max(min_support_count, 1)
+    
+    # Count individual items
+    item_counts = count_items(transactions)
+    frequent_items = {
+        item for item, count in item_counts.items()
         if count >= min_support_count
     }
     
-    if not frequent_1_itemsets:
+    if not frequent_items:
         return {}
     
-    all_frequent = dict(frequent_1_itemsets)
-    current_itemsets = frequent_1_itemsets
-    k = 2
+    all_frequent = {
+        (item,): item_counts[item] for item in frequent_items
+    }
+    current_itemsets = dict(all_frequent)
     
-    # Generate k-itemsets
-    while current_itemsets and k <= 3:  # Limit to 3-itemsets for speed
-        # Generate candidates
-        candidates = set()
-        items = list(current_itemsets.keys())
-        
-        for i in range(len(items)):
-            for j in range(i + 1, len(items)):
-                union = items[i] | items[j]
-                if len(union) == k:
-                    candidates.add(union)
-        
-        # Count candidates
-        candidate_counts = defaultdict(int)
-        for transaction in transactions:
-            transaction_set = set(transaction)
-            for candidate in candidates:
-                if candidate.issubset(transaction_set):
-                    candidate_counts[candidate] += 1
+    # Keep only frequent items, sorted so every candidate is a sorted subsequence
+    transactions = [
+        tuple(sorted(frequent_items.intersection(transaction)))
+        for transaction in transactions
+    ]
+    
+    k = 2
+    while current_itemsets and k <= max_length:
+        candidates = generate_candidates(current_itemsets, k)
+        if not candidates:
+            break
+        
+        # Items outside every candidate can never contribute at this level
+        candidate_items = set()
+        for candidate in candidates:
+            candidate_items.update(candidate)
+        transactions = [
+            filtered for filtered in (
+                tuple(item for item in transaction if item in candidate_items)
+                for transaction in transactions
+            )
+            if len(filtered) >= k
+        ]
+        
+        candidate_counts = count_candidates(transactions, candidates, k)
         
         # Filter by support
         current_itemsets = {
-            itemset: count 
-            for itemset, count in candidate_counts.items() 
+            itemset: count
+            for itemset, count in candidate_counts.items()
             if count >= min_support_count
         }
         
         all_frequent.update(current_itemsets)
         k += 1
     
+    return {frozenset(itemset): count for itemset, count in all_frequent.items()}
+
+
+# Number of set bits for every possible byte value
+POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def popcount(bitsets):
+    """Count set bits along the last axis of packed uint8 bitsets."""
+    return POPCOUNT_TABLE[bitsets].sum(axis=-1, dtype=np.int64)
+
+
+def build_tid_bitsets(transactions, items):
+    """Build one packed transaction-ID bitset per item (rows follow `items`)."""
+    item_index = {item: i for i, item in enumerate(items)}
+    tid_lists = [[] for _ in items]
+    for tid, transaction in enumerate(transactions):
+        for item in set(transaction):
+            index = item_index.get(item)
+            if index is not None:
+                tid_lists[index].append(tid)
+    
+    row = np.zeros(len(transactions), dtype=bool)
+    bitsets = np.zeros((len(items), (len(transactions) + 7) // 8), dtype=np.uint8)
+    for index, tids in enumerate(tid_lists):
+        row[:] = False
+        row[tids] = True
+        bitsets[index] = np.packbits(row)
+    
+    return bitsets
+
+
+def get_itemsets_eclat(transactions, min_support_count, max_length=3):
+    """Generate frequent itemsets with Eclat over vertical TID bitsets.
+    
+    Each frequent item keeps the set of transactions containing it as a packed
+    NumPy bitset. Extending an itemset intersects its bitset with those of all
+    remaining items in one vectorized AND, and support is the popcount.
+    
+    Returns:
+        Dictionary mapping frozenset itemsets to their counts
+    """
+    min_support_count = max(min_support_count, 1)
+    
+    item_counts = count_items(transactions)
+    # Rarest items first keeps the intersected bitsets sparse
+    items = sorted(
+        (item for item, count in item_counts.items() if count >= min_support_count),
+        key=lambda item: (item_counts[item], item)
+    )
+    
+    if not items:
+        return {}
+    
+    bitsets = build_tid_bitsets(transactions, items)
+    counts = np.array([item_counts[item] for item in items], dtype=np.int64)
+    
+    all_frequent = {}
+    
+    def extend(prefix, prefix_items, prefix_bitsets, prefix_counts):
+        for i, item in enumerate(prefix_items):
+            itemset = prefix + (item,)
+            all_frequent[frozenset(itemset)] = int(prefix_counts[i])
+            
+            if len(itemset) >= max_length or i + 1 >= len(prefix_items):
+                continue
+            
+            joined = np.bitwise_and(prefix_bitsets[i + 1:], prefix_bitsets[i])
+            joined_counts = popcount(joined)
+            keep = np.flatnonzero(joined_counts >= min_support_count)
+            if keep.size:
+                extend(
+                    itemset,
+                    [prefix_items[i + 1 + j] for j in keep],
+                    joined[keep],
+                    joined_counts[keep]
+                )
+    
+    extend((), items, bitsets, counts)
+    return all_frequent
+
+
+class FPNode:
+    """Node of an FP-tree."""
+    __slots__ = ('item', 'count', 'parent', 'children', 'link')
+    
+    def __init__(self, item, parent):
+        self.item = item
+        self.count = 0
+        self.parent = parent
+        self.children = {}
+        self.link = None
+
+
+def build_fp_tree(weighted_paths, min_support_count):
+    """Build an FP-tree from (items, count) pairs.
+    
+    Returns:
+        (root, header) where header maps each frequent item to its support
+        and the first node of its node-link chain, ordered from the least to
+        the most frequent item.
+    """
+    item_counts = Counter()
+    for items, count in weighted_paths:
+        for item in items:
+            item_counts[item] += count
+    
+    frequent = {
+        item: count for item, count in item_counts.items()
+        if count >= min_support_count
+    }
+    # Most frequent items closest to the root maximizes prefix sharing
+    rank = {
+        item: r for r, item in enumerate(
+            sorted(frequent, key=lambda item: (-frequent[item], item))
+        )
+    }
+    
+    root = FPNode(None, None)
+    heads = {}
+    for items, count in weighted_paths:
+        path = sorted((item for item in items if item in rank), key=rank.__getitem__)
+        node = root
+        for item in path:
+            child = node.children.get(item)
+            if child is None:
+                child = FPNode(item, node)
+                node.children[item] = child
+                child.link = heads.get(item)
+                heads[item] = child
+            child.count += count
+            node = child
+    
+    header = [
+        (item, frequent[item], heads[item])
+        for item in sorted(rank, key=rank.__getitem__, reverse=True)
+    ]
+    return root, header
+
+
+def get_itemsets_fpgrowth(transactions, min_support_count, max_length=3):
+    """Generate frequent itemsets with FP-Growth.
+    
+    Transactions are compressed into a prefix tree once; frequent itemsets are
+    then grown from conditional pattern bases without further passes over the
+    data.
+    
+    Returns:
+        Dictionary mapping frozenset itemsets to their counts
+    """
+    min_support_count = max(min_support_count, 1)
+    all_frequent = {}
+    
+    def mine(weighted_paths, suffix):
+        _, header = build_fp_tree(weighted_paths, min_support_count)
+        for item, support, node in header:
+            itemset = suffix + (item,)
+            all_frequent[frozenset(itemset)] = support
+            
+            if len(itemset) >= max_length:
+                continue
+            
+            # Conditional pattern base: prefix paths leading to this item
+            conditional_paths = []
+            while node is not None:
+                path = []
+                parent = node.parent
+                while parent.item is not None:
+                    path.append(parent.item)
+                    parent = parent.parent
+                if path:
+                    conditional_paths.append((path, node.count))
+                node = node.link
+            
+            if conditional_paths:
+                mine(conditional_paths, itemset)
+    
+    mine([(set(transaction), 1) for transaction in transactions], ())
     return all_frequent
 
 
-def apriori_algorithm(texts, min_support=0.1, max_length=3, output_file=None):
+ENGINES = {
+    'apriori': get_itemsets,
+    'eclat': get_itemsets_eclat,
+    'fpgrowth': get_itemsets_fpgrowth,
+}
+
+
+def mine_itemsets(transactions, min_support_count, max_length=3, engine='apriori'):
+    """Generate frequent itemsets with the selected mining engine."""
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine '{engine}' (choose from: {', '.join(ENGINES)})")
+    return ENGINES[engine](transactions, min_support_count, max_length)
+
+
+def mine_corpus(corpus, min_support_count, max_length=3, engine='apriori'):
+    """Mine an EncodedCorpus on integer IDs; returns itemsets of tokens -> counts."""
+    frequent_itemsets = mine_itemsets(corpus.transactions(), min_support_count, max_length, engine)
+    return {corpus.vocab.decode(itemset): count for itemset, count in frequent_itemsets.items()}
+
+
+def count_itemsets(transactions, itemsets):
+    """Count the support of arbitrary-length itemsets (given as sorted tuples)."""
+    by_length = defaultdict(list)
+    for itemset in itemsets:
+        by_length[len(itemset)].append(itemset)
+    
+    wanted = set()
+    for itemset in itemsets:
+        wanted.update(itemset)
+    
+    prepared = [tuple(sorted(wanted.intersection(transaction))) for transaction in transactions]
+    
+    counts = {}
+    for k, candidates in by_length.items():
+        if k == 1:
+            item_counts = count_items(prepared)
+            counts.update({itemset: item_counts[itemset[0]] for itemset in candidates})
+        else:
+            counts.update(count_candidates(prepared, candidates, k))
+    
+    return counts
+
+
+def count_patterns(corpus, itemsets):
+    """Count token itemsets (tuples of words) in an EncodedCorpus.
+    
+    Itemsets with a word the corpus never saw are not counted (count 0).
+    """
+    encoded = {}
+    for itemset in itemsets:
+        ids = corpus.vocab.lookup(itemset)
+        if ids is not None:
+            encoded[ids] = itemset
+    
+    counts = count_itemsets(corpus.transactions(), list(encoded)) if encoded else {}
+    return {encoded[ids]: count for ids, count in counts.items()}
+
+
+def iter_text_rows(rows):
+    """Tokenized transactions from the 'text' column of CSV rows."""
+    for row in rows:
+        if 'text' in row and row['text']:
+            tokens = tokenize(row['text'])
+            if tokens:
+                yield tokens
+
+
+def read_transactions(input_file):
+    """Yield tokenized transactions from the 'text' column of a CSV."""
+    with open(input_file, 'r', encoding='utf-8') as f:
+        yield from iter_text_rows(csv.DictReader(f))
+
+
+def split_records(input_file, num_shards):
+    """Split a CSV into byte ranges of whole records for sharded reading.
+    
+    A newline ends a record only outside quoted fields, i.e. after an even
+    number of quote characters (an escaped quote is two of them). The file is
+    only scanned for quotes and newlines here; every shard parses its own range.
+    
+    Returns:
+        (header fields, list of num_shards (start, end) byte ranges)
+    """
+    size = os.path.getsize(input_file)
+    with open(input_file, 'rb') as f:
+        header = f.readline()
+        if not header:
+            return [], []
+        fieldnames = next(csv.reader([header.decode('utf-8')]))
+        
+        bounds = [f.tell()]
+        quotes = 0
+        for shard_index in range(1, num_shards):
+            target = max(size * shard_index // num_shards, bounds[-1])
+            while f.tell() < target:
+                block = f.read(min(target - f.tell(), 1 << 20))
+                quotes += block.count(b'"')
+            # Finish the current line, then continue to the first line end outside quotes
+            while True:
+                line = f.readline()
+                quotes += line.count(b'"')
+                if not line or quotes % 2 == 0:
+                    break
+            bounds.append(f.tell())
+        bounds.append(size)
+    return fieldnames, list(zip(bounds[:-1], bounds[1:]))
+
+
+def read_transactions_range(input_file, fieldnames, start, end):
+    """Yield tokenized transactions from the records in bytes [start, end) of a CSV."""
+    with open(input_file, 'rb') as f:
+        f.seek(start)
+        
+        def lines():
+            position = start
+            while position < end:
+                line = f.readline()
+                if not line:
+                    break
+                position += len(line)
+                yield line.decode('utf-8')
+        
+        yield from iter_text_rows(csv.DictReader(lines(), fieldnames=fieldnames))
+
+
+def _mine_shard(args):
+    """SON pass 1: mine one shard at the proportionally scaled support."""
+    input_file, fieldnames, start, end, min_support, max_length, engine = args
+    corpus = EncodedCorpus.from_token_lists(read_transactions_range(input_file, fieldnames, start, end))
+    # At least 1, or a small shard would enumerate every itemset it contains
+    local_support_count = max(int(min_support * len(corpus)), 1)
+    local_itemsets = mine_corpus(corpus, local_support_count, max_length, engine)
+    return len(corpus), [tuple(sorted(itemset)) for itemset in local_itemsets]
+
+
+def _count_shard(args):
+    """SON pass 2: count the global candidates in one shard."""
+    input_file, fieldnames, start, end, candidates = args
+    corpus = EncodedCorpus.from_token_lists(read_transactions_range(input_file, fieldnames, start, end))
+    return count_patterns(corpus, candidates)
+
+
+def mine_file_sharded(input_file, min_support, max_length=3, engine='apriori', workers=2):
+    """Mine a CSV with the two-pass SON partition algorithm on a process pool.
+    
+    Pass 1 mines every shard locally; any globally frequent itemset is locally
+    frequent in at least one shard, so the union of local results is a complete
+    candidate set. Pass 2 counts those candidates exactly in every shard and the
+    counts are summed.
+    
+    Returns:
+        (frequent itemsets as frozenset -> count, total transactions)
+    """
+    fieldnames, ranges = split_records(input_file, workers)
+    with Pool(workers) as pool:
+        shard_args = [
+            (input_file, fieldnames, start, end, min_support, max_length, engine)
+            for start, end in ranges
+        ]
+        local_results = pool.map(_mine_shard, shard_args)
+        
+        total_transactions = sum(count for count, _ in local_results)
+        candidates = set()
+        for _, itemsets in local_results:
+            candidates.update(itemsets)
+        candidates = sorted(candidates)
+        print(f"[INFO] Pass 1: {len(candidates)} candidate itemsets from {workers} shards")
+        
+        if not candidates:
+            return {}, total_transactions
+        
+        shard_counts = pool.map(
+            _count_shard,
+            [(input_file, fieldnames, start, end, candidates) for start, end in ranges]
+        )
+    
+    totals = Counter()
+    for counts in shard_counts:
+        totals.update(counts)
+    
+    min_support_count = max(int(min_support * total_transactions), 1)
+    frequent_itemsets = {
+        frozenset(itemset): count
+        for itemset, count in totals.items()
+        if count >= min_support_count
+    }
+    return frequent_itemsets, total_transactions
+
+
+def write_chunk(token_chunk, length_chunk, base_offset, tokens_out, offsets_out):
+    """Append one chunk of encoded transactions; returns the new token total."""
+    np.asarray(token_chunk, dtype=np.int32).tofile(tokens_out)
+    (base_offset + np.cumsum(length_chunk, dtype=np.int64)).tofile(offsets_out)
+    return base_offset + len(token_chunk)
+
+
+def encode_file(input_file, prefix, chunk_size=10000):
+    """Stream a CSV into the on-disk EncodedCorpus layout and memory-map it.
+    
+    Rows are tokenized chunk by chunk and tokens are interned into integer IDs;
+    only the vocabulary and the current chunk are kept in memory.
+    """
+    vocab = TokenVocabulary()
+    total = 0
+    
+    with open(f"{prefix}.tokens", 'wb') as tokens_out, open(f"{prefix}.offsets", 'wb') as offsets_out:
+        np.zeros(1, dtype=np.int64).tofile(offsets_out)
+        token_chunk, length_chunk = [], []
+        for transaction in read_transactions(input_file):
+            ids = vocab.encode(transaction)
+            token_chunk.extend(ids)
+            length_chunk.append(len(ids))
+            if len(length_chunk) >= chunk_size:
+                total = write_chunk(token_chunk, length_chunk, total, tokens_out, offsets_out)
+                token_chunk, length_chunk = [], []
+        if length_chunk:
+            total = write_chunk(token_chunk, length_chunk, total, tokens_out, offsets_out)
+    
+    vocab.save(f"{prefix}.vocab.txt")
+    return EncodedCorpus.load(prefix)
+
+
+def iter_filtered_transactions(corpus, keep, min_items, chunk_size=10000):
+    """Sequentially scan the corpus, keeping only items flagged in `keep`.
+    
+    Yields sorted tuples of token IDs with at least min_items items.
+    """
+    for token_ids, offsets in corpus.iter_chunks(chunk_size):
+        mask = keep[token_ids]
+        kept = token_ids[mask].tolist()
+        # Transactions are never empty, so reduceat sees no empty segments
+        ends = np.cumsum(np.add.reduceat(mask.astype(np.int64), offsets[:-1])).tolist()
+        start = 0
+        for end in ends:
+            if end - start >= min_items:
+                yield tuple(kept[start:end])
+            start = end
+
+
+def get_itemsets_streaming(corpus, min_support_count, max_length=3, chunk_size=10000):
+    """Level-wise Apriori where every level is one sequential pass over a (mapped) corpus.
+    
+    Returns:
+        Dictionary mapping frozenset itemsets (of token strings) to their counts
+    """
+    min_support_count = max(min_support_count, 1)
+    vocab_size = len(corpus.vocab)
+    item_counts = corpus.item_counts(chunk_size)
+    
+    frequent_ids = np.flatnonzero(item_counts >= min_support_count)
+    all_frequent = {(int(i),): int(item_counts[i]) for i in frequent_ids}
+    current_itemsets = dict(all_frequent)
+    
+    k = 2
+    while current_itemsets and k <= max_length:
+        candidates = generate_candidates(current_itemsets, k)
+        if not candidates:
+            break
+        
+        keep = np.zeros(vocab_size, dtype=bool)
+        keep[np.unique(np.array(candidates, dtype=np.int64))] = True
+        
+        trie = build_candidate_trie(candidates)
+        for transaction in iter_filtered_transactions(corpus, keep, k, chunk_size):
+            count_in_trie(trie, transaction, 0, k)
+        
+        current_itemsets = {
+            itemset: count
+            for itemset, count in collect_trie_counts(trie)
+            if count >= min_support_count
+        }
+        all_frequent.update(current_itemsets)
+        k += 1
+    
+    return {corpus.vocab.decode(itemset): count for itemset, count in all_frequent.items()}
+
+
+def mine_file_streaming(input_file, min_support, max_length=3, chunk_size=10000, spill_dir=None):
+    """Mine a CSV in constant memory via an on-disk encoded copy of the transactions.
+    
+    Returns:
+        (frequent itemsets as frozenset -> count, total transactions)
+    """
+    with tempfile.TemporaryDirectory(dir=spill_dir, ignore_cleanup_errors=True) as tmp_dir:
+        corpus = encode_file(input_file, os.path.join(tmp_dir, 'transactions'), chunk_size)
+        total_transactions = len(corpus)
+        print(f"[INFO] Encoded {total_transactions} transactions, "
+              f"{len(corpus.token_ids)} tokens, {len(corpus.vocab)} distinct words")
+        
+        frequent_itemsets = {}
+        if total_transactions:
+            min_support_count = int(min_support * total_transactions)
+            frequent_itemsets = get_itemsets_streaming(corpus, min_support_count, max_length, chunk_size)
+        corpus.close()
+    
+    return frequent_itemsets, total_transactions
+
+
+def apriori_algorithm(texts, min_support=0.1, max_length=3, output_file=None, engine='apriori'):
     """Run Apriori algorithm on a list of texts.
     
     Args:
@@ -78,26 +791,22 @@ def apriori_algorithm(texts, min_support=0.1, max_length=3, output_file=None):
         min_support: Minimum support threshold (0-1)
         max_length: Maximum pattern length
         output_file: Optional CSV file to save results
+        engine: Mining engine ('apriori', 'eclat' or 'fpgrowth')
     
     Returns:
         Dictionary mapping patterns to support values
     """
-    # Tokenize all texts
-    transactions = []
-    for text in texts:
-        if text:
-            tokens = tokenize(text)
-            if tokens:
-                transactions.append(tokens)
+    # Tokenize all texts into integer-encoded transactions
+    corpus = EncodedCorpus.from_texts(texts)
     
-    if not transactions:
+    if not len(corpus):
         return {}
     
-    total_transactions = len(transactions)
+    total_transactions = len(corpus)
     min_support_count = int(min_support * total_transactions)
     
     # Run Apriori
-    frequent_itemsets = get_itemsets(transactions, min_support_count)
+    frequent_itemsets = mine_corpus(corpus, min_support_count, max_length, engine)
     
     # Convert to dictionary of pattern: support
     results = {}
@@ -111,69 +820,209 @@ def apriori_algorithm(texts, min_support=0.1, max_length=3, output_file=None):
         with open(output_file, 'w', encoding='utf-8', newline='') as f:
             writer = csv.writer(f)
             writer.writerow(['pattern', 'support'])
-            for pattern, support in sorted(results.items(), key=lambda x: x[1], reverse=True):
+            for pattern, support in sorted(results.items(), key=lambda x: (-x[1], x[0])):
                 writer.writerow([pattern, support])
     
     return results
 
 
-def process_file(input_file, min_support, output_file):
-    """Process CSV and generate frequent itemsets."""
+def write_patterns(frequent_itemsets, total_transactions, min_support, output_file):
+    """Write itemsets reaching min_support as a pattern/support/count CSV.
+    
+    Returns:
+        List of result rows, sorted by support
+    """
+    min_support_count = max(int(min_support * total_transactions), 1)
+    
+    # Calculate support values and sort
+    results = []
+    for itemset, count in frequent_itemsets.items():
+        if count < min_support_count:
+            continue
+        support = count / total_transactions
+        pattern = ' '.join(sorted(itemset))
+        results.append({
+            'pattern': pattern,
+            'support': support,
+            'count': count
+        })
+    
+    # Sort by support descending (ties by pattern, so output is engine-independent)
+    results.sort(key=lambda x: (-x['support'], x['pattern']))
+    
+    # Write output
+    with open(output_file, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['pattern', 'support', 'count'])
+        writer.writeheader()
+        writer.writerows(results)
+    
+    print(f"[INFO] Found {len(results)} frequent patterns")
+    print(f"[INFO] Output written to: {output_file}")
+    
+    # Show top 5
+    if results:
+        print("\n[INFO] Top 5 patterns:")
+        for i, result in enumerate(results[:5], 1):
+            print(f"  {i}. '{result['pattern']}' (support: {result['support']:.3f})")
+    
+    return results
+
+
+def save_state(state_file, frequent_itemsets, total_transactions, min_support, lower_support,
+               max_length, rescan_transactions, delta_since_rescan=0):
+    """Persist per-itemset counts next to the KB for incremental updates.
+    
+    Counts are kept for every itemset whose support reached lower_support at
+    the last full mining (the "pre-large" itemsets), not only the ones in the KB.
+    """
+    state = {
+        'total_transactions': total_transactions,
+        'min_support': min_support,
+        'lower_support': lower_support,
+        'max_length': max_length,
+        'rescan_transactions': rescan_transactions,
+        'delta_since_rescan': delta_since_rescan,
+        'counts': {
+            ' '.join(sorted(itemset)): count
+            for itemset, count in sorted(frequent_itemsets.items(), key=lambda x: (-x[1], sorted(x[0])))
+        }
+    }
+    with open(state_file, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=1)
+    print(f"[INFO] State written to: {state_file} ({len(state['counts'])} itemsets)")
+
+
+def load_state(state_file):
+    """Load a state file written by save_state()."""
+    with open(state_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def safe_delta_size(state):
+    """Number of new transactions that can be absorbed without re-mining.
+    
+    Pre-large bound: as long as fewer than
+    (min_support - lower_support) * N / (1 - min_support) transactions were
+    added since the last full mining over N transactions, no itemset outside
+    the stored pre-large set can have become frequent.
+    """
+    upper, lower = state['min_support'], state['lower_support']
+    if upper >= 1:
+        return 0
+    return int((upper - lower) * state['rescan_transactions'] / (1 - upper))
+
+
+def update_file(delta_file, state_file, output_file):
+    """Fold a batch of new rows into an existing KB without re-mining the history.
+    
+    Only the delta rows are scanned: the stored counts of all pre-large
+    itemsets are incremented, then itemsets are promoted to or demoted from the
+    KB according to min_support over the new transaction total.
+    """
+    print(f"[INFO] Incremental update from: {delta_file}")
+    print(f"[INFO] State: {state_file}")
+    
+    try:
+        state = load_state(state_file)
+        delta = EncodedCorpus.from_token_lists(read_transactions(delta_file))
+        
+        if not len(delta):
+            print("[WARN] No new transactions found")
+            return
+        
+        itemsets = [tuple(pattern.split()) for pattern in state['counts']]
+        delta_counts = count_patterns(delta, itemsets)
+        
+        frequent_itemsets = {
+            frozenset(itemset): state['counts'][' '.join(itemset)] + delta_counts.get(itemset, 0)
+            for itemset in itemsets
+        }
+        total_transactions = state['total_transactions'] + len(delta)
+        delta_since_rescan = state['delta_since_rescan'] + len(delta)
+        
+        min_support = state['min_support']
+        old_threshold = max(int(min_support * state['total_transactions']), 1)
+        new_threshold = max(int(min_support * total_transactions), 1)
+        promoted = demoted = 0
+        for itemset in itemsets:
+            was_frequent = state['counts'][' '.join(itemset)] >= old_threshold
+            is_frequent = frequent_itemsets[frozenset(itemset)] >= new_threshold
+            promoted += is_frequent and not was_frequent
+            demoted += was_frequent and not is_frequent
+        
+        print(f"[INFO] New transactions: {len(delta)} (total: {total_transactions})")
+        print(f"[INFO] Promoted: {promoted}, demoted: {demoted}")
+        
+        if delta_since_rescan > safe_delta_size(state):
+            print(f"[WARN] {delta_since_rescan} transactions added since the last full mining "
+                  f"(safe bound: {safe_delta_size(state)})")
+            print("[WARN] Newly frequent itemsets may be missing - re-run full mining with --state")
+        
+        write_patterns(frequent_itemsets, total_transactions, min_support, output_file)
+        save_state(state_file, frequent_itemsets, total_transactions, min_support,
+                   state['lower_support'], state['max_length'], state['rescan_transactions'],
+                   delta_since_rescan)
+    
+    except FileNotFoundError as e:
+        print(f"[ERROR] File not found: {e.filename}")
+        sys.exit(1)
+    except Exception as e:
+        print(f"[ERROR] {str(e)}")
+        sys.exit(1)
+
+
+def process_file(input_file, min_support, output_file, max_length=3, engine='apriori', workers=1,
+                 stream=False, chunk_size=10000, spill_dir=None, state_file=None, lower_support=None):
+    """Process CSV and generate frequent itemsets.
+    
+    With state_file set, itemsets are mined down to lower_support and their
+    counts are saved for later incremental updates (see update_file).
+    """
     print(f"[INFO] Reading from: {input_file}")
     print(f"[INFO] Minimum support: {min_support}")
+    print(f"[INFO] Maximum pattern length: {max_length}")
+    print(f"[INFO] Mining engine: {engine}")
+    
+    mining_support = min_support
+    if state_file:
+        if lower_support is None:
+            lower_support = min_support / 2
+        mining_support = lower_support
+        print(f"[INFO] Pre-large support for incremental state: {lower_support}")
     
     try:
-        # Read transactions
-        transactions = []
-        with open(input_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if 'text' in row and row['text']:
-                    tokens = tokenize(row['text'])
-                    if tokens:
-                        transactions.append(tokens)
-        
-        if not transactions:
+        if stream:
+            print(f"[INFO] Streaming mode: chunks of {chunk_size} rows spilled to disk")
+            frequent_itemsets, total_transactions = mine_file_streaming(
+                input_file, mining_support, max_length, chunk_size, spill_dir
+            )
+        elif workers > 1:
+            print(f"[INFO] Sharded mining with {workers} worker processes")
+            frequent_itemsets, total_transactions = mine_file_sharded(
+                input_file, mining_support, max_length, engine, workers
+            )
+        else:
+            # Read transactions
+            corpus = EncodedCorpus.from_token_lists(read_transactions(input_file))
+            total_transactions = len(corpus)
+            
+            # Run Apriori
+            frequent_itemsets = mine_corpus(
+                corpus, int(mining_support * total_transactions), max_length, engine
+            ) if total_transactions else {}
+        
+        if not total_transactions:
             print("[WARN] No transactions found")
             return
         
-        total_transactions = len(transactions)
-        min_support_count = int(min_support * total_transactions)
-        
         print(f"[INFO] Total transactions: {total_transactions}")
-        print(f"[INFO] Minimum support count: {min_support_count}")
-        
-        # Run Apriori
-        frequent_itemsets = get_itemsets(transactions, min_support_count)
-        
-        # Calculate support values and sort
-        results = []
-        for itemset, count in frequent_itemsets.items():
-            support = count / total_transactions
-            pattern = ' '.join(sorted(itemset))
-            results.append({
-                'pattern': pattern,
-                'support': support,
-                'count': count
-            })
-        
-        # Sort by support descending
-        results.sort(key=lambda x: x['support'], reverse=True)
-        
-        # Write output
-        with open(output_file, 'w', encoding='utf-8', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=['pattern', 'support', 'count'])
-            writer.writeheader()
-            writer.writerows(results)
+        print(f"[INFO] Minimum support count: {int(min_support * total_transactions)}")
         
-        print(f"[INFO] Found {len(results)} frequent patterns")
-        print(f"[INFO] Output written to: {output_file}")
+        write_patterns(frequent_itemsets, total_transactions, min_support, output_file)
         
-        # Show top 5
-        if results:
-            print("\n[INFO] Top 5 patterns:")
-            for i, result in enumerate(results[:5], 1):
-                print(f"  {i}. '{result['pattern']}' (support: {result['support']:.3f})")
+        if state_file:
+            save_state(state_file, frequent_itemsets, total_transactions, min_support,
+                       lower_support, max_length, total_transactions)
     
     except FileNotFoundError:
         print(f"[ERROR] Input file not found: {input_file}")
@@ -185,17 +1034,54 @@ def process_file(input_file, min_support, output_file):
 
 def main():
     parser = argparse.ArgumentParser(description='Generate knowledge base using Apriori')
-    parser.add_argument('-i', '--input', required=True, help='Input CSV file')
+    parser.add_argument('-i', '--input', required=True, help='Input CSV file (new rows with --incremental)')
     parser.add_argument('--min_support', type=float, default=0.3, help='Minimum support (0-1)')
     parser.add_argument('--out', '--output', dest='output', required=True, help='Output CSV file')
+    parser.add_argument('--max_length', type=int, default=3, help='Maximum pattern length')
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='apriori',
+                        help='Mining engine (eclat/fpgrowth suit low --min_support)')
+    parser.add_argument('--workers', type=int, default=1, help='Worker processes for sharded mining')
+    parser.add_argument('--stream', action='store_true',
+                        help='Constant-memory mining over a memory-mapped on-disk copy of the input')
+    parser.add_argument('--chunk_size', type=int, default=10000, help='Rows per chunk in streaming mode')
+    parser.add_argument('--spill_dir', default=None, help='Directory for streaming spill files (default: system temp)')
+    parser.add_argument('--state', default=None, help='Itemset count state file for incremental updates')
+    parser.add_argument('--lower_support', type=float, default=None,
+                        help='Support down to which counts are kept in --state (default: min_support / 2)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Treat --input as new rows and update --out and --state in place')
     
     args = parser.parse_args()
     
+    if args.incremental:
+        if not args.state:
+            print("[ERROR] --incremental requires --state")
+            sys.exit(1)
+        update_file(args.input, args.state, args.output)
+        return
+    
     if args.min_support <= 0 or args.min_support > 1:
         print("[ERROR] min_support must be between 0 and 1")
         sys.exit(1)
     
-    process_file(args.input, args.min_support, args.output)
+    if args.lower_support is not None and not 0 < args.lower_support <= args.min_support:
+        print("[ERROR] lower_support must be between 0 and min_support")
+        sys.exit(1)
+    
+    if args.max_length < 1:
+        print("[ERROR] max_length must be at least 1")
+        sys.exit(1)
+    
+    if args.workers < 1:
+        print("[ERROR] workers must be at least 1")
+        sys.exit(1)
+    
+    if args.stream and (args.workers > 1 or args.engine != 'apriori'):
+        print("[ERROR] --stream runs the level-wise apriori engine in a single process")
+        sys.exit(1)
+    
+    process_file(args.input, args.min_support, args.output, args.max_length, args.engine, args.workers,
+                 args.stream, args.chunk_size, args.spill_dir, args.state, args.lower_support)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+batching.py - Dynamic micro-batching for the BANED APIs
+Coalesces concurrent requests into one batched model call run off the event loop
+"""
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+
+
+def isolate_failures(process_batch, items):
+    """
+    Run process_batch(items) so that one bad item only fails itself.
+
+    If the batch raises, every item is run again on its own. Returns one
+    entry per item: its result, or the exception it raised. process_batch
+    may also return an exception in place of a single item's result.
+    """
+    try:
+        results = list(process_batch(items))
+    except Exception as e:
+        if len(items) == 1:
+            return [e]
+        return [isolate_failures(process_batch, [item])[0] for item in items]
+
+    if len(results) < len(items):
+        error = RuntimeError(f"process_batch returned {len(results)} results for {len(items)} items")
+        results.extend([error] * (len(items) - len(results)))
+    return results[:len(items)]
+
+
+def _encode_json(content) -> bytes:
+    # Same encoding as JSONResponse
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(",", ":")).encode("utf-8")
+
+
+async def json_response(content) -> Response:
+    """
+    JSON response for a bulk request, encoded in a threadpool thread.
+
+    Encoding thousands of results takes seconds; returning them as a plain
+    dict would do it on the event loop and stall every other request.
+    """
+    return Response(await run_in_threadpool(_encode_json, content), media_type="application/json")
+
+
+class MicroBatcher:
+    """
+    Request-coalescing scheduler.
+
+    Callers `await submit(item)`. A background task takes the first queued
+    item, keeps collecting until `max_batch` items are queued or `max_wait_ms`
+    has passed, then runs `process_batch(items)` in a worker thread and
+    resolves every caller's future with its own result. Failures are
+    isolated per item (see isolate_failures).
+    """
+
+    def __init__(self, process_batch, max_batch=32, max_wait_ms=5.0):
+        """
+        Args:
+            process_batch: Blocking function mapping a list of items to a list of results
+            max_batch: Maximum items per batch
+            max_wait_ms: How long to wait for more items after the first one arrives
+        """
+        self.process_batch = process_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        # One worker: batches run in order and the model is never used concurrently
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='microbatch')
+        self.queue = None
+        self.task = None
+
+    def start(self):
+        """Start the background batching task on the running event loop."""
+        if self.task is None or self.task.done():
+            self.queue = asyncio.Queue()
+            self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the batching task; items still queued are failed."""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        while self.queue is not None and not self.queue.empty():
+            _, future = self.queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Batcher stopped"))
+
+    async def submit(self, item):
+        """Queue one item and wait for its result."""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((item, future))
+        return await future
+
+    async def run(self, fn, *args):
+        """Run a blocking call on the batcher's worker thread."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def run_chunked(self, fn, items, chunk_size):
+        """
+        Run a bulk request as fn(chunk) over chunks of items on the worker thread.
+
+        Each chunk is a separate worker call, so batches of concurrent
+        submit() callers run in between and wait for at most one chunk.
+        """
+        results = []
+        for start in range(0, len(items), chunk_size):
+            results.extend(await self.run(fn, items[start:start + chunk_size]))
+        return results
+
+    async def _collect(self, batch):
+        """Wait for one item, then gather more until the batch is full or the wait expires."""
+        loop = asyncio.get_running_loop()
+        batch.append(await self.queue.get())
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch:
+            # Take whatever is already queued without waiting
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = []
+            try:
+                await self._collect(batch)
+
+                # Skip callers that went away while queued
+                batch = [(item, future) for item, future in batch if not future.done()]
+                if not batch:
+                    continue
+
+                items = [item for item, _ in batch]
+                results = await loop.run_in_executor(self.executor, isolate_failures, self.process_batch, items)
+
+                for (_, future), result in zip(batch, results):
+                    if future.done():
+                        continue
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+            finally:
+                # Only reached with unresolved futures when stop() cancels us mid-batch
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(RuntimeError("Batcher stopped"))
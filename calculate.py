@@ -6,7 +6,9 @@ import argparse
 import csv
 import numpy as np
 import sys
-from collections import defaultdict
+
+from kb_matcher import kb_scores
+from verification.fusion import baseline_fusion
 
 
 def load_support(support_file):
@@ -25,21 +27,6 @@ def load_support(support_file):
         return {}
 
 
-def calculate_kb_support(text, patterns, limit=20):
-    """Calculate knowledge base support for text."""
-    words = set(text.lower().split())
-    total_support = 0.0
-    matches = 0
-    
-    for pattern, support in list(patterns.items())[:limit]:
-        pattern_words = set(pattern.split())
-        if pattern_words.issubset(words):
-            total_support += support
-            matches += 1
-    
-    return total_support, matches
-
-
 def main():
     parser = argparse.ArgumentParser(description='Calculate calibrated metrics')
     parser.add_argument('combined_csv', help='Combined CSV with text and label columns')
@@ -84,20 +71,17 @@ def main():
     
     print(f"[INFO] Processing {len(texts)} samples...")
     
+    # KB support and simple fusion for the whole corpus
+    kb = kb_scores(texts, real_patterns, fake_patterns, args.limit)
+    fused_probs = baseline_fusion(cnn_probs, kb['kb_prob'])
+    
     # Calculate metrics
     results = []
     for i, (text, label, cnn_prob) in enumerate(zip(texts, labels, cnn_probs)):
-        real_support, real_matches = calculate_kb_support(text, real_patterns, args.limit)
-        fake_support, fake_matches = calculate_kb_support(text, fake_patterns, args.limit)
-        
-        # Simple fusion: weighted average
-        kb_signal = real_support - fake_support
-        # Normalize kb_signal to [0, 1] range (simple approach)
-        kb_prob = 0.5 + (kb_signal * 0.5)  # Scale to 0-1
-        kb_prob = max(0.0, min(1.0, kb_prob))  # Clamp
-        
-        # Fuse CNN and KB (simple average)
-        fused_prob = (cnn_prob + kb_prob) / 2.0
+        kb_prob = kb['kb_prob'][i]
+        fused_prob = fused_probs[i]
+        real_matches = int(kb['real_matches'][i])
+        fake_matches = int(kb['fake_matches'][i])
         
         # Predictions
         cnn_pred = 1 if cnn_prob > 0.5 else 0
@@ -6,7 +6,9 @@ import argparse
 import csv
 import numpy as np
 import sys
-from collections import defaultdict
+
+from kb_matcher import kb_scores
+from verification import fusion
 
 
 # Common words that appear in both real and fake news - filter these out
@@ -52,49 +54,21 @@ def filter_distinctive_patterns(patterns, blacklist=COMMON_WORDS_BLACKLIST):
     return filtered
 
 
-def calculate_kb_support(text, patterns, limit=20):
-    """Calculate knowledge base support for text."""
-    words = set(text.lower().split())
-    total_support = 0.0
-    matches = 0
-    matched_patterns = []
-    
-    for pattern, support in list(patterns.items())[:limit]:
-        pattern_words = set(pattern.split())
-        if pattern_words.issubset(words):
-            total_support += support
-            matches += 1
-            matched_patterns.append(pattern)
-    
-    return total_support, matches, matched_patterns
-
-
 def weighted_fusion(cnn_prob, kb_signal, cnn_confidence):
     """
     Weighted fusion: give more weight to CNN when it's very confident
     
     Args:
-        cnn_prob: CNN probability (0-1)
+        cnn_prob: CNN probability (0-1), scalar or array
         kb_signal: KB signal (-inf to +inf, where positive = real, negative = fake)
         cnn_confidence: How confident CNN is (distance from 0.5)
     
     Returns:
         Fused probability (0-1)
     """
-    # Normalize kb_signal to probability
-    kb_prob = 0.5 + (kb_signal * 0.5)
-    kb_prob = max(0.0, min(1.0, kb_prob))
-    
-    # CNN weight based on confidence
     # If CNN is very confident (>0.4 from center), trust it more
     # If CNN is uncertain (<0.2 from center), trust KB more
-    cnn_weight = min(1.0, cnn_confidence / 0.4)  # 0 to 1 scale
-    kb_weight = 1.0 - cnn_weight
-    
-    # Weighted average
-    fused_prob = (cnn_prob * cnn_weight) + (kb_prob * kb_weight)
-    
-    return fused_prob
+    return fusion.weighted_fusion(cnn_prob, fusion.kb_probability(kb_signal), cnn_confidence, divisor=0.4)
 
 
 def main():
@@ -152,103 +126,70 @@ def main():
     
     print(f"[INFO] Processing {len(texts)} samples with OPTIMIZED fusion...")
     
-    # Calculate metrics with both methods
-    results_baseline = []
-    results_optimized = []
+    # KB support for the whole corpus in one sparse pass per KB
+    kb = kb_scores(texts, real_patterns, fake_patterns, args.limit)
+    labels = np.array(labels)
+    
+    # BASELINE: Simple fusion (original method)
+    fused_probs_baseline = fusion.baseline_fusion(cnn_probs, kb['kb_prob'])
+    
+    # OPTIMIZED: Weighted fusion
+    cnn_confidences = np.abs(cnn_probs - 0.5)
+    fused_probs_optimized = weighted_fusion(cnn_probs, kb['kb_signal'], cnn_confidences)
     
-    for i, (text, label, cnn_prob) in enumerate(zip(texts, labels, cnn_probs)):
-        real_support, real_matches, real_patterns_matched = calculate_kb_support(text, real_patterns, args.limit)
-        fake_support, fake_matches, fake_patterns_matched = calculate_kb_support(text, fake_patterns, args.limit)
-        
-        # BASELINE: Simple fusion (original method)
-        kb_signal_baseline = real_support - fake_support
-        kb_prob_baseline = 0.5 + (kb_signal_baseline * 0.5)
-        kb_prob_baseline = max(0.0, min(1.0, kb_prob_baseline))
-        fused_prob_baseline = (cnn_prob + kb_prob_baseline) / 2.0
-        
-        # OPTIMIZED: Weighted fusion
-        kb_signal_optimized = real_support - fake_support
-        cnn_confidence = abs(cnn_prob - 0.5)
-        fused_prob_optimized = weighted_fusion(cnn_prob, kb_signal_optimized, cnn_confidence)
-        
-        # Predictions
-        cnn_pred = 1 if cnn_prob > 0.5 else 0
-        fused_pred_baseline = 1 if fused_prob_baseline > 0.5 else 0
-        fused_pred_optimized = 1 if fused_prob_optimized > 0.5 else 0
-        
-        results_baseline.append({
-            'text': text[:50] + '...',
-            'label': label,
-            'cnn_prob': cnn_prob,
-            'fused_prob': fused_prob_baseline,
-            'cnn_pred': cnn_pred,
-            'fused_pred': fused_pred_baseline,
-            'cnn_confidence': cnn_confidence,
-            'real_matches': real_matches,
-            'fake_matches': fake_matches
-        })
-        
-        results_optimized.append({
-            'text': text[:50] + '...',
-            'label': label,
-            'cnn_prob': cnn_prob,
-            'fused_prob': fused_prob_optimized,
-            'cnn_pred': cnn_pred,
-            'fused_pred': fused_pred_optimized,
-            'cnn_confidence': cnn_confidence,
-            'real_matches': real_matches,
-            'fake_matches': fake_matches
-        })
+    # Predictions
+    cnn_preds = (cnn_probs > 0.5).astype(int)
+    fused_preds_baseline = (fused_probs_baseline > 0.5).astype(int)
+    fused_preds_optimized = (fused_probs_optimized > 0.5).astype(int)
     
     # Calculate accuracy for both methods
-    cnn_correct = sum(1 for r in results_baseline if r['cnn_pred'] == r['label'])
-    baseline_correct = sum(1 for r in results_baseline if r['fused_pred'] == r['label'])
-    optimized_correct = sum(1 for r in results_optimized if r['fused_pred'] == r['label'])
+    total = len(labels)
+    cnn_correct = int(np.sum(cnn_preds == labels))
+    baseline_correct = int(np.sum(fused_preds_baseline == labels))
+    optimized_correct = int(np.sum(fused_preds_optimized == labels))
     
-    cnn_accuracy = cnn_correct / len(results_baseline)
-    baseline_accuracy = baseline_correct / len(results_baseline)
-    optimized_accuracy = optimized_correct / len(results_optimized)
+    cnn_accuracy = cnn_correct / total
+    baseline_accuracy = baseline_correct / total
+    optimized_accuracy = optimized_correct / total
     
     print("\n" + "="*80)
     print("RESULTS COMPARISON: BASELINE vs OPTIMIZED FUSION")
     print("="*80)
-    print(f"Total samples: {len(results_baseline)}")
-    print(f"\nCNN Accuracy:            {cnn_accuracy:.3f} ({cnn_correct}/{len(results_baseline)})")
-    print(f"Baseline Fusion:         {baseline_accuracy:.3f} ({baseline_correct}/{len(results_baseline)})")
-    print(f"Optimized Fusion:        {optimized_accuracy:.3f} ({optimized_correct}/{len(results_optimized)})")
+    print(f"Total samples: {total}")
+    print(f"\nCNN Accuracy:            {cnn_accuracy:.3f} ({cnn_correct}/{total})")
+    print(f"Baseline Fusion:         {baseline_accuracy:.3f} ({baseline_correct}/{total})")
+    print(f"Optimized Fusion:        {optimized_accuracy:.3f} ({optimized_correct}/{total})")
     print(f"\nImprovement over CNN:")
     print(f"  Baseline:  {(baseline_accuracy - cnn_accuracy):+.3f}")
     print(f"  Optimized: {(optimized_accuracy - cnn_accuracy):+.3f}")
     print(f"\nOptimized vs Baseline:   {(optimized_accuracy - baseline_accuracy):+.3f}")
     
     # Show cases where optimized differs from baseline
-    differences = []
-    for b, o in zip(results_baseline, results_optimized):
-        if b['fused_pred'] != o['fused_pred']:
-            differences.append((b, o))
+    differences = np.flatnonzero(fused_preds_baseline != fused_preds_optimized)
     
-    if differences:
+    if len(differences):
         print(f"\n{len(differences)} cases where OPTIMIZED differs from BASELINE:")
         print("-" * 80)
-        for i, (baseline_result, opt_result) in enumerate(differences[:10], 1):
-            label_str = "REAL" if baseline_result['label'] == 1 else "FAKE"
-            print(f"\n{i}. [{label_str}] {baseline_result['text']}")
-            print(f"   CNN: {baseline_result['cnn_prob']:.3f} (confidence: {baseline_result['cnn_confidence']:.3f})")
-            print(f"   Baseline:  {baseline_result['fused_prob']:.3f} → {'REAL' if baseline_result['fused_pred']==1 else 'FAKE'} {'✓' if baseline_result['fused_pred']==baseline_result['label'] else '✗'}")
-            print(f"   Optimized: {opt_result['fused_prob']:.3f} → {'REAL' if opt_result['fused_pred']==1 else 'FAKE'} {'✓' if opt_result['fused_pred']==opt_result['label'] else '✗'}")
+        for i, idx in enumerate(differences[:10], 1):
+            label = labels[idx]
+            label_str = "REAL" if label == 1 else "FAKE"
+            print(f"\n{i}. [{label_str}] {texts[idx][:50] + '...'}")
+            print(f"   CNN: {cnn_probs[idx]:.3f} (confidence: {cnn_confidences[idx]:.3f})")
+            print(f"   Baseline:  {fused_probs_baseline[idx]:.3f} → {'REAL' if fused_preds_baseline[idx]==1 else 'FAKE'} {'✓' if fused_preds_baseline[idx]==label else '✗'}")
+            print(f"   Optimized: {fused_probs_optimized[idx]:.3f} → {'REAL' if fused_preds_optimized[idx]==1 else 'FAKE'} {'✓' if fused_preds_optimized[idx]==label else '✗'}")
     else:
         print("\n[INFO] Optimized fusion produces same predictions as baseline")
     
     # Confidence analysis
-    baseline_confidences = [abs(r['fused_prob'] - 0.5) for r in results_baseline]
-    optimized_confidences = [abs(r['fused_prob'] - 0.5) for r in results_optimized]
+    baseline_confidences = np.abs(fused_probs_baseline - 0.5)
+    optimized_confidences = np.abs(fused_probs_optimized - 0.5)
     
     print(f"\n{'='*80}")
     print("CONFIDENCE ANALYSIS")
     print(f"{'='*80}")
     print(f"{'Method':<20} {'Avg Conf':<15} {'Min Conf':<15} {'Max Conf':<15}")
     print("-" * 80)
-    print(f"{'CNN':<20} {np.mean([r['cnn_confidence'] for r in results_baseline]):.3f}{' '*11} {np.min([r['cnn_confidence'] for r in results_baseline]):.3f}{' '*11} {np.max([r['cnn_confidence'] for r in results_baseline]):.3f}")
+    print(f"{'CNN':<20} {np.mean(cnn_confidences):.3f}{' '*11} {np.min(cnn_confidences):.3f}{' '*11} {np.max(cnn_confidences):.3f}")
     print(f"{'Baseline Fusion':<20} {np.mean(baseline_confidences):.3f}{' '*11} {np.min(baseline_confidences):.3f}{' '*11} {np.max(baseline_confidences):.3f}")
     print(f"{'Optimized Fusion':<20} {np.mean(optimized_confidences):.3f}{' '*11} {np.min(optimized_confidences):.3f}{' '*11} {np.max(optimized_confidences):.3f}")
     
@@ -12,37 +12,116 @@ import os
 try:
     import torch
     import torch.nn as nn
+    import torch.nn.functional as F
     import torch.optim as optim
-    from torch.utils.data import Dataset, DataLoader
+    from torch.utils.data import Dataset, DataLoader, Sampler
 except ImportError:
     print("[ERROR] PyTorch not installed. Run: pip install torch")
     sys.exit(1)
 
+from text_encoder import TextEncoder, MIN_PAD_LEN
+from inference_backend import has_padding_window, padding_context
+from corpus_cache import CACHE_DIR, cache_key, cache_prefix, load_corpus, open_ids, save_corpus
 
-class TextDataset(Dataset):
-    """Simple text dataset."""
-    def __init__(self, texts, labels, vocab, max_len=50):
-        self.texts = texts
-        self.labels = labels
-        self.vocab = vocab
-        self.max_len = max_len
+# Tokens per text the model is trained on
+MAX_LEN = 50
+
+
+class EncodedDataset(Dataset):
+    """Dataset over a pre-encoded [n, max_len] ID matrix, e.g. a memory-mapped corpus cache.
+    
+    Items are the rows listed in `indices` (all rows by default), as unpadded
+    index tensors; batch them with pad_collate so each batch is only padded
+    to its longest text. Rows are read from `ids` on access, so a memmap is
+    never loaded whole.
+    """
+    def __init__(self, ids, lengths, labels, indices=None):
+        self.ids = ids
+        self.max_len = ids.shape[1]
+        self.rows = np.arange(len(ids)) if indices is None else np.asarray(indices)
+        self.lengths = np.asarray(lengths)[self.rows]
+        self.labels = np.asarray(labels, dtype=np.float32)[self.rows]
     
     def __len__(self):
-        return len(self.texts)
+        return len(self.rows)
     
     def __getitem__(self, idx):
-        text = self.texts[idx]
-        label = self.labels[idx]
+        indices = torch.from_numpy(np.array(self.ids[self.rows[idx], :self.lengths[idx]]))
+        return indices, torch.tensor(self.labels[idx])
+
+
+class TextDataset(EncodedDataset):
+    """Simple text dataset, encoded up front with one TextEncoder pass."""
+    def __init__(self, texts, labels, vocab, max_len=MAX_LEN, workers=1):
+        self.vocab = vocab
+        encoder = TextEncoder(vocab, max_len)
+        ids, lengths = encoder.encode(texts, width=max_len, workers=workers)
+        super().__init__(ids, lengths, labels)
+
+
+def pad_collate(batch, min_len=MIN_PAD_LEN):
+    """Collate (indices, label) items, padding only to the longest text in the batch."""
+    width = max(min_len, max(len(indices) for indices, _ in batch))
+    inputs = torch.zeros((len(batch), width), dtype=torch.long)
+    for i, (indices, _) in enumerate(batch):
+        inputs[i, :len(indices)] = indices
+    labels = torch.stack([label for _, label in batch])
+    return inputs, labels
+
+
+class LengthBucketSampler(Sampler):
+    """Batch sampler that groups texts of similar length.
+    
+    Each epoch the indices are shuffled, split into pools of `bucket_size`
+    batches and sorted by length inside each pool before being cut into
+    batches; the batch order is shuffled again. Batches stay random but pad
+    to roughly uniform lengths.
+    """
+    def __init__(self, lengths, batch_size, bucket_size=50, shuffle=True, seed=None):
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.pool_size = batch_size * bucket_size
+        self.shuffle = shuffle
+        self.rng = np.random.RandomState(seed)
+    
+    def __iter__(self):
+        if self.shuffle:
+            order = self.rng.permutation(len(self.lengths))
+        else:
+            order = np.arange(len(self.lengths))
         
-        # Convert text to indices
-        tokens = text.split()[:self.max_len]
-        indices = [self.vocab.get(token, 0) for token in tokens]
+        batches = []
+        for start in range(0, len(order), self.pool_size):
+            pool = order[start:start + self.pool_size]
+            pool = pool[np.argsort(self.lengths[pool], kind='stable')]
+            batches.extend(pool[i:i + self.batch_size] for i in range(0, len(pool), self.batch_size))
         
-        # Pad
-        if len(indices) < self.max_len:
-            indices += [0] * (self.max_len - len(indices))
+        if self.shuffle:
+            batches = [batches[i] for i in self.rng.permutation(len(batches))]
         
-        return torch.tensor(indices, dtype=torch.long), torch.tensor(label, dtype=torch.float32)
+        for batch in batches:
+            yield batch.tolist()
+    
+    def __len__(self):
+        return (len(self.lengths) + self.batch_size - 1) // self.batch_size
+
+
+def pad_context(x, context, padded_len):
+    """Append the padding columns that windows over the last tokens still reach."""
+    # Pad then slice (never wider than padded_len) so traced/exported graphs keep a dynamic length
+    return F.pad(x, (0, context))[:, :padded_len]
+
+
+def token_lengths(tokens):
+    """Length of each row up to its last non-padding token."""
+    positions = torch.arange(1, tokens.size(1) + 1, device=tokens.device)
+    return (positions * (tokens != 0)).max(dim=1)[0]
+
+
+def pad_windows(pooled, lengths, kernel_size, padding, pad_value, padded_len):
+    """Add pad_value (relu(bias)) to the max of rows that would have an all-padding window at padded_len."""
+    has_window = has_padding_window(lengths, kernel_size, padding, padded_len)
+    return torch.where(has_window.unsqueeze(1), torch.maximum(pooled, pad_value), pooled)
 
 
 class SimpleCNN(nn.Module):
@@ -57,8 +136,20 @@ class SimpleCNN(nn.Module):
         self.fc = nn.Linear(num_filters * 3, 1)
         self.sigmoid = nn.Sigmoid()
     
-    def forward(self, x):
+    def features(self, x, padded_len=None):
+        """Deterministic trunk: embedding, convolutions and max-pooling -> [batch, 3 * num_filters].
+        
+        x may be padded only to its longest row. With `padded_len` the result
+        equals that of x zero-padded to `padded_len` tokens: x is extended by
+        the few columns the windows over its last tokens reach, and windows
+        that see only padding output relu(bias), so that value joins the max
+        wherever such a window would have existed.
+        """
         # x: [batch, seq_len]
+        convs = (self.conv1, self.conv2, self.conv3)
+        if padded_len is not None:
+            x = pad_context(x, padding_context((c.kernel_size[0], c.padding[0]) for c in convs), padded_len)
+        tokens = x
         x = self.embedding(x)  # [batch, seq_len, embed_dim]
         x = x.permute(0, 2, 1)  # [batch, embed_dim, seq_len]
         
@@ -72,21 +163,68 @@ class SimpleCNN(nn.Module):
         c2 = torch.max(c2, dim=2)[0]
         c3 = torch.max(c3, dim=2)[0]
         
+        if padded_len is not None:
+            lengths = token_lengths(tokens)
+            c1, c2, c3 = (
+                pad_windows(c, lengths, conv.kernel_size[0], conv.padding[0], torch.relu(conv.bias), padded_len)
+                for c, conv in zip((c1, c2, c3), convs)
+            )
+        
         # Concatenate
-        out = torch.cat([c1, c2, c3], dim=1)
+        return torch.cat([c1, c2, c3], dim=1)
+    
+    def forward(self, x, padded_len=None):
+        out = self.features(x, padded_len)
         out = self.dropout(out)
         out = self.fc(out)
         out = self.sigmoid(out)
         
         return out.squeeze()
+    
+    def mc_predict(self, x, n=20, padded_len=None):
+        """MC Dropout predictions from a single trunk pass.
+        
+        Dropout only acts on the pooled features, so the embedding/conv/max-pool
+        trunk runs once and n Bernoulli masks (scaled by 1/(1-p), as nn.Dropout
+        does) are applied to it, followed by fc as one batched matmul. Gives the
+        same distribution as n stochastic forward passes, in any train/eval mode.
+        
+        Returns:
+            Probabilities of shape [n, batch]
+        """
+        features = self.features(x, padded_len)  # [batch, 3 * num_filters]
+        p = self.dropout.p
+        masks = torch.empty((n,) + features.shape, device=features.device).bernoulli_(1.0 - p)
+        masks = masks / (1.0 - p) if p < 1.0 else masks * 0.0
+        return self.masked_predict(features, masks)
+    
+    def masked_predict(self, features, masks):
+        """fc + sigmoid over pooled features under given (already scaled) dropout masks.
+        
+        Args:
+            features: [batch, 3 * num_filters] output of features()
+            masks: [n, batch, 3 * num_filters]
+        
+        Returns:
+            Probabilities of shape [n, batch]
+        """
+        logits = (features.unsqueeze(0) * masks) @ self.fc.weight.t() + self.fc.bias  # [n, batch, 1]
+        return self.sigmoid(logits).squeeze(-1)
 
 
-def build_vocab(texts, min_freq=1):
-    """Build vocabulary from texts."""
-    word_counts = {}
-    for text in texts:
-        for word in text.split():
-            word_counts[word] = word_counts.get(word, 0) + 1
+def build_vocab(texts, min_freq=1, corpus=None):
+    """Build vocabulary from texts.
+    
+    If `corpus` (an apriori_algo.EncodedCorpus of the same texts) is given, its
+    interned tokens and counts are reused instead of re-splitting the texts.
+    """
+    if corpus is not None:
+        word_counts = dict(zip(corpus.vocab.tokens, corpus.vocab.counts))
+    else:
+        word_counts = {}
+        for text in texts:
+            for word in text.split():
+                word_counts[word] = word_counts.get(word, 0) + 1
     
     vocab = {'<PAD>': 0, '<UNK>': 1}
     for word, count in word_counts.items():
@@ -96,22 +234,102 @@ def build_vocab(texts, min_freq=1):
     return vocab
 
 
-def mc_dropout_predict(model, dataloader, mc_samples=20, device='cpu'):
-    """Perform MC Dropout inference."""
-    model.train()  # Keep dropout active
+def read_texts(path):
+    """Stream the non-empty 'text' fields of a CSV."""
+    with open(path, 'r', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            if row.get('text'):
+                yield row['text']
+
+
+def build_corpus(real_path, fake_path, prefix, key, test_split=0.0, seed=42, max_len=MAX_LEN,
+                 min_freq=1, chunk_size=5000):
+    """Encode the real (label 1) and fake (label 0) CSVs into the corpus cache.
+    
+    Texts are streamed, never held in memory: one pass counts rows, one
+    builds the vocabulary from the training rows and one encodes everything
+    into the memory-mapped ID matrix. The split and vocabulary are the same
+    as build_vocab over the training texts in split order.
+    """
+    def all_texts():
+        yield from read_texts(real_path)
+        yield from read_texts(fake_path)
+    
+    n_real = sum(1 for _ in read_texts(real_path))
+    n_total = n_real + sum(1 for _ in read_texts(fake_path))
+    
+    # Train/Test split if requested
+    if test_split > 0:
+        np.random.seed(seed)
+        indices = np.random.permutation(n_total)
+        test_size = int(n_total * test_split)
+        test_indices = indices[:test_size]
+        train_indices = indices[test_size:]
+    else:
+        train_indices = np.arange(n_total)
+        test_indices = np.arange(0)
+    
+    # Vocabulary in order of first appearance in the training texts (as build_vocab)
+    train_rank = np.full(n_total, -1, dtype=np.int64)
+    train_rank[train_indices] = np.arange(len(train_indices))
+    word_counts = {}
+    first_seen = {}
+    for row, text in enumerate(all_texts()):
+        rank = train_rank[row]
+        if rank < 0:
+            continue
+        for position, word in enumerate(text.split()):
+            if word in word_counts:
+                word_counts[word] += 1
+                first_seen[word] = min(first_seen[word], (rank, position))
+            else:
+                word_counts[word] = 1
+                first_seen[word] = (rank, position)
+    
+    vocab = {'<PAD>': 0, '<UNK>': 1}
+    for word in sorted(first_seen, key=first_seen.get):
+        if word_counts[word] >= min_freq:
+            vocab[word] = len(vocab)
+    tokens = sorted(vocab, key=vocab.get)
+    
+    # Encode in chunks straight into the memory-mapped ID matrix
+    encoder = TextEncoder(vocab, max_len, dtype=np.int32)
+    ids = open_ids(prefix, (n_total, max_len), encoder.dtype)
+    lengths = np.zeros(n_total, dtype=np.int64)
+    chunk = []
+    start = 0
+    for text in all_texts():
+        chunk.append(text)
+        if len(chunk) == chunk_size:
+            ids[start:start + len(chunk)], lengths[start:start + len(chunk)] = encoder.encode(chunk, width=max_len)
+            start += len(chunk)
+            chunk = []
+    if chunk:
+        ids[start:start + len(chunk)], lengths[start:start + len(chunk)] = encoder.encode(chunk, width=max_len)
+    
+    # Release the mapping before save_corpus renames the file (impossible while mapped on Windows)
+    ids.flush()
+    del ids
+    
+    labels = np.zeros(n_total, dtype=np.float32)
+    labels[:n_real] = 1.0
+    return save_corpus(prefix, key, None, lengths, labels, tokens, n_real=np.array(n_real),
+                       train_indices=train_indices, test_indices=test_indices)
+
+
+def mc_dropout_predict(model, dataloader, mc_samples=20, device='cpu', padded_len=None):
+    """Perform MC Dropout inference (one trunk pass per batch, see SimpleCNN.mc_predict)."""
+    model.eval()
     all_predictions = []
     
     with torch.no_grad():
-        for _ in range(mc_samples):
-            batch_preds = []
-            for inputs, _ in dataloader:
-                inputs = inputs.to(device)
-                outputs = model(inputs)
-                batch_preds.append(outputs.cpu().numpy())
-            all_predictions.append(np.concatenate(batch_preds))
+        for inputs, _ in dataloader:
+            inputs = inputs.to(device)
+            outputs = model.mc_predict(inputs, mc_samples, padded_len)  # [mc_samples, batch]
+            all_predictions.append(outputs.cpu().numpy())
     
     # Average predictions
-    predictions = np.mean(all_predictions, axis=0)
+    predictions = np.mean(np.concatenate(all_predictions, axis=1), axis=0)
     return predictions
 
 
@@ -126,71 +344,52 @@ def main():
     parser.add_argument('--batch_size', type=int, default=8, help='Batch size')
     parser.add_argument('--test_split', type=float, default=0.0, help='Test set ratio (0.0-0.5)')
     parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    parser.add_argument('--cache_dir', default=CACHE_DIR, help='Directory for the encoded corpus cache')
+    parser.add_argument('--rebuild_cache', action='store_true', help='Re-encode the corpus even if cached')
     
     args = parser.parse_args()
     
-    print("[INFO] Loading data...")
-    
-    # Load real news (label=1)
-    real_texts = []
-    with open(args.real, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            if row.get('text'):
-                real_texts.append(row['text'])
-    
-    # Load fake news (label=0)
-    fake_texts = []
-    with open(args.fake, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            if row.get('text'):
-                fake_texts.append(row['text'])
-    
-    # Combine
-    all_texts = real_texts + fake_texts
-    all_labels = [1.0] * len(real_texts) + [0.0] * len(fake_texts)
+    # Encoded corpus (token IDs, labels, vocabulary, split), cached per input checksum and settings
+    settings = {'max_len': MAX_LEN, 'min_freq': 1, 'test_split': args.test_split, 'seed': args.seed}
+    key = cache_key([args.real, args.fake], settings, code=[__file__])
+    prefix = cache_prefix('cnn_corpus', key, args.cache_dir)
+    corpus = None if args.rebuild_cache else load_corpus(prefix, key)
+    if corpus is None:
+        print("[INFO] Loading data...")
+        corpus = build_corpus(args.real, args.fake, prefix, key, args.test_split, args.seed, MAX_LEN)
+        print(f"[INFO] Cached encoded corpus: {prefix}")
+    else:
+        print(f"[INFO] Loaded encoded corpus from cache: {prefix}")
     
-    print(f"[INFO] Total samples: {len(all_texts)} (Real: {len(real_texts)}, Fake: {len(fake_texts)})")
+    n_real = int(corpus.arrays['n_real'])
+    n_fake = len(corpus) - n_real
+    train_indices = corpus.arrays['train_indices']
+    test_indices = corpus.arrays['test_indices']
+    vocab = corpus.vocab
     
-    # Train/Test split if requested
+    print(f"[INFO] Total samples: {len(corpus)} (Real: {n_real}, Fake: {n_fake})")
     if args.test_split > 0:
-        np.random.seed(args.seed)
-        indices = np.random.permutation(len(all_texts))
-        test_size = int(len(all_texts) * args.test_split)
-        test_indices = indices[:test_size]
-        train_indices = indices[test_size:]
-        
-        train_texts = [all_texts[i] for i in train_indices]
-        train_labels = [all_labels[i] for i in train_indices]
-        test_texts = [all_texts[i] for i in test_indices]
-        test_labels = [all_labels[i] for i in test_indices]
-        
-        print(f"[INFO] Train/Test split: {len(train_texts)}/{len(test_texts)} ({(1-args.test_split)*100:.0f}%/{args.test_split*100:.0f}%)")
+        print(f"[INFO] Train/Test split: {len(train_indices)}/{len(test_indices)} ({(1-args.test_split)*100:.0f}%/{args.test_split*100:.0f}%)")
     else:
-        train_texts = all_texts
-        train_labels = all_labels
-        test_texts = all_texts
-        test_labels = all_labels
         print(f"[INFO] No train/test split - using all data for both")
-    
-    # Build vocabulary from training data only
-    print("[INFO] Building vocabulary...")
-    vocab = build_vocab(train_texts)
     print(f"[INFO] Vocabulary size: {len(vocab)}")
     
-    # Create datasets
-    train_dataset = TextDataset(train_texts, train_labels, vocab)
-    train_dataloader = DataLoader(train_dataset, batch_size=args.batch_size, shuffle=True)
+    # Create datasets (batches padded to their longest text, training batches bucketed by length)
+    train_dataset = EncodedDataset(corpus.ids, corpus.lengths, corpus.labels, train_indices)
+    train_sampler = LengthBucketSampler(train_dataset.lengths, args.batch_size, seed=args.seed)
+    train_dataloader = DataLoader(train_dataset, batch_sampler=train_sampler, collate_fn=pad_collate)
+    
+    # The model behaves as if every text were padded to max_len
+    padded_len = train_dataset.max_len
     
     # Full dataset for final predictions (in original order)
-    full_dataset = TextDataset(all_texts, all_labels, vocab)
-    full_dataloader = DataLoader(full_dataset, batch_size=args.batch_size, shuffle=False)
+    full_dataset = EncodedDataset(corpus.ids, corpus.lengths, corpus.labels)
+    full_dataloader = DataLoader(full_dataset, batch_size=args.batch_size, shuffle=False, collate_fn=pad_collate)
     
     # Test dataset
     if args.test_split > 0:
-        test_dataset = TextDataset(test_texts, test_labels, vocab)
-        test_dataloader_eval = DataLoader(test_dataset, batch_size=args.batch_size, shuffle=False)
+        test_dataset = EncodedDataset(corpus.ids, corpus.lengths, corpus.labels, test_indices)
+        test_dataloader_eval = DataLoader(test_dataset, batch_size=args.batch_size, shuffle=False, collate_fn=pad_collate)
     
     # Model
     device = 'cuda' if torch.cuda.is_available() else 'cpu'
@@ -212,7 +411,7 @@ def main():
             inputs, labels = inputs.to(device), labels.to(device)
             
             optimizer.zero_grad()
-            outputs = model(inputs)
+            outputs = model(inputs, padded_len)
             loss = criterion(outputs, labels)
             loss.backward()
             optimizer.step()
@@ -232,7 +431,7 @@ def main():
             with torch.no_grad():
                 for inputs, labels in test_dataloader_eval:
                     inputs, labels = inputs.to(device), labels.to(device)
-                    outputs = model(inputs)
+                    outputs = model(inputs, padded_len)
                     predictions = (outputs > 0.5).float()
                     test_correct += (predictions == labels).sum().item()
                     test_total += labels.size(0)
@@ -243,7 +442,7 @@ def main():
     
     # MC Dropout inference on full dataset (in original order)
     print(f"[INFO] Running MC Dropout inference ({args.mc_samples} samples)...")
-    predictions = mc_dropout_predict(model, full_dataloader, args.mc_samples, device)
+    predictions = mc_dropout_predict(model, full_dataloader, args.mc_samples, device, padded_len)
     
     # Save predictions
     np.save(args.out_probs, predictions)
@@ -254,11 +453,11 @@ def main():
     # Final accuracy report
     if args.test_split > 0:
         print(f"\n[INFO] Final Test Set Performance:")
-        test_preds_mc = mc_dropout_predict(model, test_dataloader_eval, args.mc_samples, device)
+        test_preds_mc = mc_dropout_predict(model, test_dataloader_eval, args.mc_samples, device, padded_len)
         test_preds_binary = (test_preds_mc > 0.5).astype(int)
-        test_labels_array = np.array(test_labels)
+        test_labels_array = test_dataset.labels
         test_acc_final = np.mean(test_preds_binary == test_labels_array)
-        print(f"  Test Accuracy (MC Dropout): {test_acc_final:.4f} ({int(test_acc_final*len(test_labels))}/{len(test_labels)})")
+        print(f"  Test Accuracy (MC Dropout): {test_acc_final:.4f} ({int(test_acc_final*len(test_labels_array))}/{len(test_labels_array)})")
     
     # Save model for deployment
     print(f"\n[INFO] Saving model for deployment...")
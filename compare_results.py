@@ -3,8 +3,12 @@
 compare_results.py - Detailed comparison showing KB impact on predictions
 """
 import csv
+from collections import Counter
+
 import numpy as np
-from collections import defaultdict
+
+from kb_matcher import KBMatcher, kb_scores
+from verification.fusion import baseline_fusion
 
 
 def load_patterns(pattern_file):
@@ -20,21 +24,6 @@ def load_patterns(pattern_file):
     return patterns
 
 
-def calculate_kb_support(text, patterns, limit=20):
-    """Calculate KB support for text."""
-    words = set(text.lower().split())
-    total_support = 0.0
-    matches = []
-    
-    for pattern, support in list(patterns.items())[:limit]:
-        pattern_words = set(pattern.split())
-        if pattern_words.issubset(words):
-            total_support += support
-            matches.append(pattern)
-    
-    return total_support, matches
-
-
 def main():
     # Load data
     print("\n" + "="*80)
@@ -61,74 +50,55 @@ def main():
             texts.append(row['text'])
             labels.append(int(row['label']))
     
-    # Calculate all metrics
-    results = []
-    for i, (text, label, cnn_prob) in enumerate(zip(texts, labels, cnn_probs)):
-        real_support, real_matches = calculate_kb_support(text, real_patterns, 20)
-        fake_support, fake_matches = calculate_kb_support(text, fake_patterns, 20)
-        
-        kb_signal = real_support - fake_support
-        kb_prob = 0.5 + (kb_signal * 0.5)
-        kb_prob = max(0.0, min(1.0, kb_prob))
-        
-        fused_prob = (cnn_prob + kb_prob) / 2.0
-        
-        kb_impact = fused_prob - cnn_prob
-        
-        results.append({
-            'idx': i,
-            'text': text,
-            'label': label,
-            'cnn_prob': cnn_prob,
-            'kb_prob': kb_prob,
-            'fused_prob': fused_prob,
-            'kb_impact': kb_impact,
-            'real_matches': real_matches,
-            'fake_matches': fake_matches,
-            'cnn_correct': (cnn_prob > 0.5) == label,
-            'fused_correct': (fused_prob > 0.5) == label
-        })
+    # Calculate all metrics (batch-scored per KB)
+    kb = kb_scores(texts, real_patterns, fake_patterns, limit=20)
+    real_matches = KBMatcher(real_patterns, 20).matched_patterns(texts)
+    fake_matches = KBMatcher(fake_patterns, 20).matched_patterns(texts)
+    labels = np.array(labels)
+    
+    fused_prob = baseline_fusion(cnn_probs, kb['kb_prob'])
+    
+    kb_impact = fused_prob - cnn_probs
+    
+    cnn_correct = (cnn_probs > 0.5) == labels
+    fused_correct = (fused_prob > 0.5) == labels
     
     # Overall stats
     print(f"\n{'='*80}")
     print("OVERALL STATISTICS")
     print(f"{'='*80}\n")
     
-    total = len(results)
-    cnn_acc = sum(1 for r in results if r['cnn_correct']) / total
-    fused_acc = sum(1 for r in results if r['fused_correct']) / total
+    total = len(labels)
+    cnn_acc = np.sum(cnn_correct) / total
+    fused_acc = np.sum(fused_correct) / total
     
     print(f"Total samples: {total}")
-    print(f"CNN Accuracy:   {cnn_acc:.2%} ({sum(1 for r in results if r['cnn_correct'])}/{total})")
-    print(f"Fused Accuracy: {fused_acc:.2%} ({sum(1 for r in results if r['fused_correct'])}/{total})")
+    print(f"CNN Accuracy:   {cnn_acc:.2%} ({np.sum(cnn_correct)}/{total})")
+    print(f"Fused Accuracy: {fused_acc:.2%} ({np.sum(fused_correct)}/{total})")
     print(f"Improvement:    {(fused_acc - cnn_acc):.2%}")
     
     # KB impact analysis
-    avg_impact = np.mean([r['kb_impact'] for r in results])
+    avg_impact = np.mean(kb_impact)
     print(f"\nAverage KB impact: {avg_impact:+.4f}")
     
-    positive_impact = [r for r in results if r['kb_impact'] > 0.01]
-    negative_impact = [r for r in results if r['kb_impact'] < -0.01]
-    neutral_impact = [r for r in results if abs(r['kb_impact']) <= 0.01]
-    
-    print(f"  Positive impact (KB helps):  {len(positive_impact)} cases")
-    print(f"  Negative impact (KB hurts):  {len(negative_impact)} cases")
-    print(f"  Neutral (no KB effect):      {len(neutral_impact)} cases")
+    print(f"  Positive impact (KB helps):  {np.sum(kb_impact > 0.01)} cases")
+    print(f"  Negative impact (KB hurts):  {np.sum(kb_impact < -0.01)} cases")
+    print(f"  Neutral (no KB effect):      {np.sum(np.abs(kb_impact) <= 0.01)} cases")
     
     # Most confident KB signals
     print(f"\n{'='*80}")
     print("TOP 10 CASES WHERE KB HAD STRONGEST POSITIVE IMPACT")
     print(f"{'='*80}\n")
     
-    sorted_positive = sorted(results, key=lambda x: x['kb_impact'], reverse=True)[:10]
-    for i, r in enumerate(sorted_positive, 1):
-        label_str = "REAL" if r['label'] == 1 else "FAKE"
-        print(f"{i}. [{label_str}] {r['text'][:60]}...")
-        print(f"   CNN: {r['cnn_prob']:.3f} → Fused: {r['fused_prob']:.3f} (KB impact: +{r['kb_impact']:.3f})")
-        if r['real_matches']:
-            print(f"   Real patterns: {', '.join(r['real_matches'])}")
-        if r['fake_matches']:
-            print(f"   Fake patterns: {', '.join(r['fake_matches'])}")
+    sorted_positive = np.argsort(-kb_impact, kind='stable')[:10]
+    for i, idx in enumerate(sorted_positive, 1):
+        label_str = "REAL" if labels[idx] == 1 else "FAKE"
+        print(f"{i}. [{label_str}] {texts[idx][:60]}...")
+        print(f"   CNN: {cnn_probs[idx]:.3f} → Fused: {fused_prob[idx]:.3f} (KB impact: +{kb_impact[idx]:.3f})")
+        if real_matches[idx]:
+            print(f"   Real patterns: {', '.join(real_matches[idx])}")
+        if fake_matches[idx]:
+            print(f"   Fake patterns: {', '.join(fake_matches[idx])}")
         print()
     
     # Cases where KB had negative impact
@@ -136,15 +106,15 @@ def main():
     print("TOP 10 CASES WHERE KB HAD STRONGEST NEGATIVE IMPACT")
     print(f"{'='*80}\n")
     
-    sorted_negative = sorted(results, key=lambda x: x['kb_impact'])[:10]
-    for i, r in enumerate(sorted_negative, 1):
-        label_str = "REAL" if r['label'] == 1 else "FAKE"
-        print(f"{i}. [{label_str}] {r['text'][:60]}...")
-        print(f"   CNN: {r['cnn_prob']:.3f} → Fused: {r['fused_prob']:.3f} (KB impact: {r['kb_impact']:.3f})")
-        if r['real_matches']:
-            print(f"   Real patterns: {', '.join(r['real_matches'])}")
-        if r['fake_matches']:
-            print(f"   Fake patterns: {', '.join(r['fake_matches'])}")
+    sorted_negative = np.argsort(kb_impact, kind='stable')[:10]
+    for i, idx in enumerate(sorted_negative, 1):
+        label_str = "REAL" if labels[idx] == 1 else "FAKE"
+        print(f"{i}. [{label_str}] {texts[idx][:60]}...")
+        print(f"   CNN: {cnn_probs[idx]:.3f} → Fused: {fused_prob[idx]:.3f} (KB impact: {kb_impact[idx]:.3f})")
+        if real_matches[idx]:
+            print(f"   Real patterns: {', '.join(real_matches[idx])}")
+        if fake_matches[idx]:
+            print(f"   Fake patterns: {', '.join(fake_matches[idx])}")
         print()
     
     # Pattern frequency in correct classifications
@@ -152,30 +122,27 @@ def main():
     print("PATTERN USAGE IN CLASSIFICATIONS")
     print(f"{'='*80}\n")
     
-    real_news = [r for r in results if r['label'] == 1]
-    fake_news = [r for r in results if r['label'] == 0]
+    real_mask = labels == 1
+    fake_mask = labels == 0
+    real_counts = kb['real_matches']
+    fake_counts = kb['fake_matches']
     
-    print(f"REAL NEWS ({len(real_news)} samples):")
-    print(f"  Average real patterns matched: {np.mean([len(r['real_matches']) for r in real_news]):.2f}")
-    print(f"  Average fake patterns matched: {np.mean([len(r['fake_matches']) for r in real_news]):.2f}")
+    print(f"REAL NEWS ({np.sum(real_mask)} samples):")
+    print(f"  Average real patterns matched: {np.mean(real_counts[real_mask]):.2f}")
+    print(f"  Average fake patterns matched: {np.mean(fake_counts[real_mask]):.2f}")
     
-    print(f"\nFAKE NEWS ({len(fake_news)} samples):")
-    print(f"  Average real patterns matched: {np.mean([len(r['real_matches']) for r in fake_news]):.2f}")
-    print(f"  Average fake patterns matched: {np.mean([len(r['fake_matches']) for r in fake_news]):.2f}")
+    print(f"\nFAKE NEWS ({np.sum(fake_mask)} samples):")
+    print(f"  Average real patterns matched: {np.mean(real_counts[fake_mask]):.2f}")
+    print(f"  Average fake patterns matched: {np.mean(fake_counts[fake_mask]):.2f}")
     
     # Most common patterns used
     print(f"\n{'='*80}")
     print("MOST FREQUENTLY MATCHED PATTERNS")
     print(f"{'='*80}\n")
     
-    all_real_matches = defaultdict(int)
-    all_fake_matches = defaultdict(int)
-    
-    for r in results:
-        for pattern in r['real_matches']:
-            all_real_matches[pattern] += 1
-        for pattern in r['fake_matches']:
-            all_fake_matches[pattern] += 1
+    # Counter keeps first-match order for patterns with equal counts
+    all_real_matches = Counter(pattern for matches in real_matches for pattern in matches)
+    all_fake_matches = Counter(pattern for matches in fake_matches for pattern in matches)
     
     print("Real patterns (in actual usage):")
     for pattern, count in sorted(all_real_matches.items(), key=lambda x: x[1], reverse=True):
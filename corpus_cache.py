@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+corpus_cache.py - On-disk cache of encoded training corpora
+Stores the token-ID matrix, lengths, labels and vocabulary of a corpus keyed
+by input file checksums, preprocessing settings and the checksums of the
+preprocessing code (the calling script and text_encoder.py); the ID matrix is
+memory-mapped on load, so repeat runs skip cleaning, vocabulary building and
+encoding entirely.
+
+Layout: <prefix>.ids.npy (raw .npy, memory-mapped) and <prefix>.meta.npz
+(everything else). The metadata file is written last, so an interrupted
+build is never picked up.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+
+CACHE_DIR = 'cache'
+# Tokenization and encoding code shared by every cached corpus
+ENCODER_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'text_encoder.py')
+
+
+def file_checksum(path, chunk_size=1 << 20):
+    """SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(paths, settings, code=()):
+    """
+    Key of an encoded corpus: checksums of the input files, the preprocessing
+    settings, and checksums of the preprocessing code.
+
+    Args:
+        paths: Input files
+        settings: JSON-serializable preprocessing settings
+        code: Source files that clean, filter or encode the texts (usually the
+            calling script's __file__); text_encoder.py is always included, so
+            editing any of them invalidates the cache
+    """
+    sources = [ENCODER_SOURCE] + [path for path in code if os.path.abspath(path) != ENCODER_SOURCE]
+    payload = json.dumps({'files': [file_checksum(path) for path in paths], 'settings': settings,
+                          'code': [file_checksum(path) for path in sources]},
+                         sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def cache_prefix(name, key, cache_dir=CACHE_DIR):
+    """Path prefix of the cache files for corpus `name` under `key`."""
+    return os.path.join(cache_dir, f"{name}_{key}")
+
+
+def vocab_hash(tokens):
+    """SHA-256 of a vocabulary given as tokens in ID order."""
+    return hashlib.sha256('\n'.join(tokens).encode('utf-8')).hexdigest()
+
+
+class CachedCorpus:
+    """
+    An encoded corpus loaded from the cache.
+
+    Attributes:
+        ids: [n, max_len] token-ID matrix (read-only memmap)
+        lengths: Token count of every row
+        labels: Label of every row
+        tokens: Vocabulary tokens in ID order
+        arrays: Any extra arrays stored with the corpus (e.g. split indices)
+    """
+
+    def __init__(self, ids, lengths, labels, tokens, arrays=None):
+        self.ids = ids
+        self.lengths = lengths
+        self.labels = labels
+        self.tokens = tokens
+        self.arrays = arrays or {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def vocab(self):
+        """Token -> ID dictionary."""
+        return {token: idx for idx, token in enumerate(self.tokens)}
+
+
+def open_ids(prefix, shape, dtype=np.int32):
+    """Create the ID matrix of a streamed build as a writable memmap (finish with save_corpus)."""
+    os.makedirs(os.path.dirname(prefix) or '.', exist_ok=True)
+    return np.lib.format.open_memmap(prefix + '.ids.npy.tmp', mode='w+', dtype=dtype, shape=shape)
+
+
+def save_corpus(prefix, key, ids, lengths, labels, tokens, **arrays):
+    """
+    Write an encoded corpus and return it reloaded from the cache.
+
+    Args:
+        prefix: Cache path prefix (see cache_prefix)
+        key: Cache key (see cache_key)
+        ids: [n, max_len] ID matrix, or None if it was streamed into open_ids(prefix);
+            the caller must flush that memmap and drop every reference to it
+            first (a mapped file cannot be renamed on Windows)
+        lengths: Token count of every row
+        labels: Label of every row
+        tokens: Vocabulary tokens in ID order
+        **arrays: Extra arrays to store (e.g. train/test indices)
+    """
+    os.makedirs(os.path.dirname(prefix) or '.', exist_ok=True)
+    ids_path = prefix + '.ids.npy'
+
+    if ids is None:
+        if not os.path.exists(ids_path + '.tmp'):
+            raise FileNotFoundError(f"No streamed ID matrix at {ids_path}.tmp (see open_ids)")
+    else:
+        with open(ids_path + '.tmp', 'wb') as f:
+            np.save(f, np.ascontiguousarray(ids))
+    os.replace(ids_path + '.tmp', ids_path)
+
+    meta_path = prefix + '.meta.npz'
+    with open(meta_path + '.tmp', 'wb') as f:
+        np.savez(f, key=np.array(key), vocab_hash=np.array(vocab_hash(tokens)),
+                 tokens=np.array(tokens, dtype=str), lengths=np.asarray(lengths),
+                 labels=np.asarray(labels), **arrays)
+    os.replace(meta_path + '.tmp', meta_path)
+
+    return load_corpus(prefix, key)
+
+
+def load_corpus(prefix, key):
+    """Load a cached corpus, or None if it is missing, stale or damaged."""
+    ids_path = prefix + '.ids.npy'
+    meta_path = prefix + '.meta.npz'
+    if not (os.path.exists(ids_path) and os.path.exists(meta_path)):
+        return None
+
+    with np.load(meta_path) as data:
+        meta = {name: data[name] for name in data.files}
+    tokens = meta.pop('tokens').tolist()
+    if str(meta.pop('key')) != key or str(meta.pop('vocab_hash')) != vocab_hash(tokens):
+        return None
+
+    ids = np.load(ids_path, mmap_mode='r')
+    lengths = meta.pop('lengths')
+    labels = meta.pop('labels')
+    if len(ids) != len(lengths) or len(ids) != len(labels):
+        return None
+
+    return CachedCorpus(ids, lengths, labels, tokens, meta)
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+inference_backend.py - Pluggable CNN inference backends for the BANED APIs
+Every backend takes a [batch, seq_len] int64 NumPy array of token IDs (padded
+to its longest text) and returns MC Dropout probabilities of shape
+[mc_samples, batch] as a NumPy array.
+
+- torch:       the SimpleCNN module itself (SimpleCNN.mc_predict)
+- torchscript: graph exported by save_model.py --export (no model class needed)
+- onnx:        ONNX graph exported by save_model.py --export, run with ONNX Runtime
+               (no PyTorch needed)
+- int8:        int8-quantized TorchScript graph written by quantize_model.py
+               (faster on bulk batches only; slower than torchscript for one text)
+- numpy:       .npz weights exported by save_model.py --export, run by numpy_cnn.py
+               (NumPy only)
+
+The exported MC graphs take the dropout masks as an input, so the same
+Bernoulli(1 - p) masks scaled by 1/(1-p) as nn.Dropout are drawn here.
+"""
+import json
+
+import numpy as np
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+BACKENDS = ('torch', 'torchscript', 'onnx', 'int8', 'numpy')
+
+
+def dropout_masks(rng, shape, p):
+    """Dropout keep-masks scaled by 1/(1-p), as nn.Dropout applies them."""
+    if p >= 1.0:
+        return np.zeros(shape, dtype=np.float32)
+    keep = rng.random(shape, dtype=np.float32) >= np.float32(p)
+    return keep.astype(np.float32) / np.float32(1.0 - p)
+
+
+def padding_context(windows):
+    """Padding columns past the last token that conv windows ((kernel_size, padding) pairs) still reach."""
+    return max(k - 1 - p for k, p in windows)
+
+
+def has_padding_window(lengths, kernel_size, padding, padded_len):
+    """
+    Rows that, zero-padded to padded_len, have a conv window over padding only.
+
+    lengths counts tokens up to each row's last non-padding one (NumPy array
+    or torch tensor). Such a window outputs relu(bias), which then joins the
+    row's max-pool. Shared by every SimpleCNN implementation that scores
+    batches padded only to their longest text.
+    """
+    return lengths <= padded_len + padding - kernel_size
+
+
+def export_paths(model_path):
+    """Files save_model.py --export (and quantize_model.py) write for a .pth checkpoint."""
+    base = model_path[:-4] if model_path.endswith('.pth') else model_path
+    return {
+        'torchscript': base + '_scripted.pt',
+        'torchscript_mc': base + '_mc_scripted.pt',
+        'onnx': base + '.onnx',
+        'onnx_mc': base + '_mc.onnx',
+        'int8': base + '_int8.pt',
+        'npz': base + '.npz',
+    }
+
+
+class TorchBackend:
+    """Eager PyTorch backend around a loaded SimpleCNN."""
+    name = 'torch'
+
+    def __init__(self, model, padded_len, device='cpu'):
+        self.model = model
+        self.padded_len = padded_len
+        self.device = device
+
+    def mc_predict(self, ids, n):
+        import torch
+        with torch.no_grad():
+            x = torch.from_numpy(ids).to(self.device)
+            probs = self.model.mc_predict(x, n, padded_len=self.padded_len)
+        return probs.cpu().numpy()
+
+
+class TorchScriptBackend:
+    """TorchScript MC graph (tokens, masks) -> probabilities."""
+    name = 'torchscript'
+
+    def __init__(self, path, seed=None):
+        import torch
+        extra_files = {'meta.json': ''}
+        self.module = torch.jit.load(path, map_location='cpu', _extra_files=extra_files)
+        self.meta = json.loads(extra_files['meta.json'])
+        self.rng = np.random.default_rng(seed)
+
+    def mc_predict(self, ids, n):
+        import torch
+        masks = dropout_masks(self.rng, (n, len(ids), self.meta['num_features']), self.meta['dropout_p'])
+        with torch.no_grad():
+            probs = self.module(torch.from_numpy(ids), torch.from_numpy(masks))
+        return probs.numpy()
+
+
+class Int8Backend(TorchScriptBackend):
+    """int8-quantized TorchScript MC graph (quantize_model.py), same interface."""
+    name = 'int8'
+
+
+class OnnxBackend:
+    """ONNX Runtime (CPU) MC graph (tokens, masks) -> probabilities."""
+    name = 'onnx'
+
+    def __init__(self, path, threads=None, seed=None):
+        if ort is None:
+            raise ImportError("onnxruntime not installed. Run: pip install onnxruntime")
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        meta = self.session.get_modelmeta().custom_metadata_map
+        self.meta = {'padded_len': int(meta['padded_len']), 'dropout_p': float(meta['dropout_p']),
+                     'num_features': int(meta['num_features'])}
+        self.rng = np.random.default_rng(seed)
+
+    def mc_predict(self, ids, n):
+        masks = dropout_masks(self.rng, (n, len(ids), self.meta['num_features']), self.meta['dropout_p'])
+        return self.session.run(None, {'tokens': ids.astype(np.int64, copy=False), 'masks': masks})[0]
+
+
+def load_backend(kind, model_path, model=None, padded_len=None, device='cpu'):
+    """
+    Create an inference backend.
+
+    Args:
+        kind: 'torch', 'torchscript', 'onnx', 'int8' or 'numpy'
+        model_path: The .pth checkpoint (exported graphs are found next to it)
+        model: Loaded SimpleCNN (torch backend only)
+        padded_len: Token length the model was trained on (checked against exported graphs)
+        device: Torch device (torch backend only)
+    """
+    if kind == 'torch':
+        return TorchBackend(model, padded_len, device)
+    if kind == 'torchscript':
+        backend = TorchScriptBackend(export_paths(model_path)['torchscript_mc'])
+    elif kind == 'onnx':
+        backend = OnnxBackend(export_paths(model_path)['onnx_mc'])
+    elif kind == 'int8':
+        backend = Int8Backend(export_paths(model_path)['int8'])
+    elif kind == 'numpy':
+        from numpy_cnn import NumpyCNN
+        backend = NumpyCNN.load(export_paths(model_path)['npz'])
+    else:
+        raise ValueError(f"Unknown CNN backend: {kind} (choose from {', '.join(BACKENDS)})")
+
+    if padded_len is not None and backend.meta['padded_len'] != padded_len:
+        raise ValueError(f"Exported graph was built for {backend.meta['padded_len']} tokens, not {padded_len}")
+    return backend
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+kb_matcher.py - Precompiled Knowledge Base pattern matcher
+Scores texts against Apriori support patterns using an inverted token index,
+or a sparse document x pattern product for whole corpora
+"""
+from collections import defaultdict
+
+import numpy as np
+
+try:
+    from scipy import sparse
+except ImportError:
+    sparse = None
+
+from verification.fusion import kb_probability
+
+
+class KBMatcher:
+    """
+    Compiled matcher for one KB (pattern -> support, in ranking order).
+
+    A pattern matches a text when all of its words occur among the text's
+    lowercased whitespace tokens. Patterns are split once into token-ID
+    tuples and indexed by token, so scoring a text only touches patterns that
+    share at least one word with it.
+    """
+
+    def __init__(self, patterns, limit=None):
+        """
+        Args:
+            patterns: Dictionary mapping patterns to support values
+            limit: Use only the first `limit` patterns (top-K); None for all
+        """
+        items = list(patterns.items())
+        if limit is not None:
+            items = items[:limit]
+
+        self.patterns = [pattern for pattern, _ in items]
+        self.supports = [float(support) for _, support in items]
+        self.token_to_id = {}
+
+        self.pattern_tokens = []
+        for pattern in self.patterns:
+            ids = {self.token_to_id.setdefault(word, len(self.token_to_id)) for word in pattern.split()}
+            self.pattern_tokens.append(tuple(sorted(ids)))
+        self.pattern_lengths = [len(tokens) for tokens in self.pattern_tokens]
+
+        # token ID -> patterns containing it; empty patterns match every text
+        self.index = defaultdict(list)
+        self.always = []
+        for p, tokens in enumerate(self.pattern_tokens):
+            if not tokens:
+                self.always.append(p)
+            for token_id in tokens:
+                self.index[token_id].append(p)
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def match(self, text):
+        """Return the indices (in ranking order) of patterns fully contained in text."""
+        token_ids = {self.token_to_id[word] for word in text.lower().split() if word in self.token_to_id}
+
+        hits = defaultdict(int)
+        for token_id in token_ids:
+            for p in self.index[token_id]:
+                hits[p] += 1
+
+        lengths = self.pattern_lengths
+        matched = [p for p, count in hits.items() if count == lengths[p]]
+        matched.extend(self.always)
+        return sorted(matched)
+
+    def score(self, text):
+        """Score one text.
+
+        Returns:
+            (total support, number of matches, matched patterns)
+        """
+        matched = self.match(text)
+        total_support = 0.0
+        for p in matched:
+            total_support += self.supports[p]
+        return total_support, len(matched), [self.patterns[p] for p in matched]
+
+    def token_matrix(self, texts):
+        """Build the CSR document x token incidence matrix (KB tokens only)."""
+        indptr = [0]
+        indices = []
+        token_to_id = self.token_to_id
+        for text in texts:
+            token_ids = {token_to_id[word] for word in text.lower().split() if word in token_to_id}
+            indices.extend(token_ids)
+            indptr.append(len(indices))
+
+        data = np.ones(len(indices), dtype=np.int32)
+        return sparse.csr_matrix((data, np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+                                 shape=(len(texts), len(self.token_to_id)))
+
+    def pattern_matrix(self):
+        """Build the CSR pattern x token incidence matrix."""
+        indptr = np.zeros(len(self.patterns) + 1, dtype=np.int64)
+        np.cumsum(self.pattern_lengths, out=indptr[1:])
+        indices = np.array([t for tokens in self.pattern_tokens for t in tokens], dtype=np.int32)
+        data = np.ones(len(indices), dtype=np.int32)
+        return sparse.csr_matrix((data, indices, indptr), shape=(len(self.patterns), len(self.token_to_id)))
+
+    def match_matrix(self, texts):
+        """Return a CSR document x pattern matrix with 1 where the pattern matches.
+
+        Token overlaps come from one sparse product; a pattern matches a document
+        when the overlap equals the pattern length.
+        """
+        hits = (self.token_matrix(texts) @ self.pattern_matrix().T).tocsr()
+        lengths = np.asarray(self.pattern_lengths, dtype=np.int32)
+        hits.data = (hits.data == lengths[hits.indices]).astype(np.int8)
+        hits.eliminate_zeros()
+
+        if self.always:
+            always = np.zeros(len(self.patterns), dtype=np.int8)
+            always[self.always] = 1
+            hits = (hits + sparse.csr_matrix(np.tile(always, (len(texts), 1)))).tocsr()
+
+        hits.sort_indices()
+        return hits
+
+    def score_batch(self, texts):
+        """Score a whole corpus.
+
+        Uses the sparse match matrix when SciPy is installed, otherwise the
+        inverted index text by text.
+
+        Returns:
+            (support sums, match counts) as NumPy arrays with one entry per text
+        """
+        if sparse is not None:
+            matches = self.match_matrix(texts)
+            support_sums = matches @ np.asarray(self.supports, dtype=np.float64)
+            match_counts = np.diff(matches.indptr).astype(np.int64)
+            return support_sums, match_counts
+
+        support_sums = np.zeros(len(texts), dtype=np.float64)
+        match_counts = np.zeros(len(texts), dtype=np.int64)
+
+        for i, text in enumerate(texts):
+            matched = self.match(text)
+            total_support = 0.0
+            for p in matched:
+                total_support += self.supports[p]
+            support_sums[i] = total_support
+            match_counts[i] = len(matched)
+
+        return support_sums, match_counts
+
+    def matched_patterns(self, texts):
+        """Return, per text, the list of matched patterns in ranking order."""
+        if sparse is not None:
+            matches = self.match_matrix(texts)
+            return [[self.patterns[p] for p in matches.indices[matches.indptr[i]:matches.indptr[i + 1]]]
+                    for i in range(len(texts))]
+        return [[self.patterns[p] for p in self.match(text)] for text in texts]
+
+
+def kb_scores(texts, real_patterns, fake_patterns, limit=20):
+    """Score a corpus against the real and fake KBs in one call.
+
+    Returns:
+        Dictionary of NumPy arrays: real_support, real_matches, fake_support,
+        fake_matches, kb_signal and kb_prob (the clamped 0.5 + signal/2 mapping)
+    """
+    real_support, real_matches = KBMatcher(real_patterns, limit).score_batch(texts)
+    fake_support, fake_matches = KBMatcher(fake_patterns, limit).score_batch(texts)
+
+    kb_signal = real_support - fake_support
+    kb_prob = kb_probability(kb_signal)
+
+    return {
+        'real_support': real_support,
+        'real_matches': real_matches,
+        'fake_support': fake_support,
+        'fake_matches': fake_matches,
+        'kb_signal': kb_signal,
+        'kb_prob': kb_prob,
+    }
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+numpy_cnn.py - Pure-NumPy SimpleCNN inference
+Runs SimpleCNN (embedding, Conv1d + ReLU + max-pool, fc, sigmoid, MC Dropout)
+from the .npz written by save_model.py --export, with no PyTorch installed.
+Used by api_vercel.py and by inference_backend.py (BANED_CNN_BACKEND=numpy).
+
+Each convolution is an im2col matmul: sliding_window_view gives every
+kernel-wide window of the embedded text, reshaped to one row per window and
+multiplied with the flattened kernel.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from inference_backend import dropout_masks, has_padding_window, padding_context
+
+CONVS = ('conv1', 'conv2', 'conv3')
+
+
+def sigmoid(x):
+    """Logistic function without overflow warnings for large |x|."""
+    return np.exp(-np.logaddexp(0, -x))
+
+
+class NumpyCNN:
+    """
+    SimpleCNN forward pass in NumPy.
+
+    Takes [batch, seq_len] token IDs padded to the longest text and scores
+    them as if padded to `padded_len`, exactly like SimpleCNN.features(x,
+    padded_len). mc_predict matches the inference_backend interface.
+    """
+    name = 'numpy'
+
+    def __init__(self, weights, padded_len, dropout_p=0.5, seed=None):
+        """
+        Args:
+            weights: SimpleCNN state dict as NumPy arrays, plus 'kernel_sizes' and 'paddings'
+            padded_len: Token length the model was trained on
+            dropout_p: Dropout probability for MC Dropout
+            seed: Seed of the dropout mask generator
+        """
+        self.embedding = np.ascontiguousarray(weights['embedding.weight'], dtype=np.float32)
+        self.convs = []
+        for name, k, p in zip(CONVS, weights['kernel_sizes'].tolist(), weights['paddings'].tolist()):
+            kernel = np.asarray(weights[name + '.weight'], dtype=np.float32)  # [filters, embed_dim, k]
+            bias = np.asarray(weights[name + '.bias'], dtype=np.float32)
+            # Window rows come out as [embed_dim, k], so flatten the kernel the same way
+            self.convs.append((kernel.reshape(len(kernel), -1).T.copy(), bias, np.maximum(bias, 0), k, p))
+        self.fc_weight = np.asarray(weights['fc.weight'], dtype=np.float32)[0]
+        self.fc_bias = np.float32(weights['fc.bias'][0])
+
+        self.padded_len = padded_len
+        self.context = padding_context((k, p) for _, _, _, k, p in self.convs)
+        self.meta = {'padded_len': padded_len, 'dropout_p': dropout_p, 'num_features': len(self.fc_weight)}
+        self.rng = np.random.default_rng(seed)
+
+    @classmethod
+    def load(cls, path, seed=None):
+        """Load the .npz written by save_model.py --export."""
+        with np.load(path) as data:
+            weights = {name: data[name] for name in data.files}
+        return cls(weights, int(weights.pop('padded_len')), float(weights.pop('dropout_p')), seed)
+
+    def features(self, ids):
+        """Embedding, convolutions and max-pooling -> [batch, 3 * num_filters]."""
+        ids = np.asarray(ids)
+        # Same right context and all-padding windows as SimpleCNN.features(x, padded_len)
+        ids = np.pad(ids, ((0, 0), (0, self.context)))[:, :self.padded_len]
+        positions = np.arange(1, ids.shape[1] + 1)
+        lengths = (positions * (ids != 0)).max(axis=1)
+
+        x = self.embedding[ids]  # [batch, seq_len, embed_dim]
+        pooled = []
+        for kernel, bias, pad_value, k, p in self.convs:
+            windows = sliding_window_view(np.pad(x, ((0, 0), (p, p), (0, 0))), k, axis=1)
+            cols = windows.reshape(len(ids), windows.shape[1], -1)  # im2col: [batch, windows, embed_dim * k]
+            # ReLU and the bias commute with the max over windows
+            c = np.maximum((cols @ kernel).max(axis=1) + bias, 0)
+            has_window = has_padding_window(lengths, k, p, self.padded_len)
+            pooled.append(np.where(has_window[:, None], np.maximum(c, pad_value), c))
+        return np.concatenate(pooled, axis=1)
+
+    def predict(self, ids):
+        """Deterministic probabilities [batch] (dropout off)."""
+        return sigmoid(self.features(ids) @ self.fc_weight + self.fc_bias)
+
+    def masked_predict(self, features, masks):
+        """fc + sigmoid under given (already scaled) dropout masks [n, batch, features] -> [n, batch]."""
+        return sigmoid((features[None] * masks) @ self.fc_weight + self.fc_bias)
+
+    def mc_predict(self, ids, n):
+        """MC Dropout probabilities [n, batch] from one trunk pass."""
+        features = self.features(ids)
+        masks = dropout_masks(self.rng, (n,) + features.shape, self.meta['dropout_p'])
+        return self.masked_predict(features, masks)
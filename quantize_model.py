@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+quantize_model.py - Post-training int8 quantization of SimpleCNN
+Quantizes the Conv1d layers statically (calibrated on fnn_* training texts)
+and fc dynamically, measures fp32 vs int8 accuracy and latency on the test
+splits, and saves the int8 MC Dropout graph next to the fp32 checkpoint only
+if the accuracy drift stays within the given bounds and int8 is faster than
+fp32 TorchScript on bulk batches.
+
+The saved graph has the same (tokens, masks) -> probabilities interface as
+the save_model.py --export graphs; serve it with BANED_CNN_BACKEND=int8.
+int8 pays off on large batches only: for single texts the quantize and
+dequantize steps cost more than the int8 convolutions save.
+"""
+import argparse
+import copy
+import csv
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+try:
+    import torch
+    import torch.nn as nn
+    from torch.ao.quantization import (QuantStub, DeQuantStub, convert, fuse_modules,
+                                       get_default_qconfig, prepare, quantize_dynamic)
+except ImportError:
+    print("[ERROR] PyTorch not installed. Run: pip install torch")
+    sys.exit(1)
+
+from cnn import pad_context, pad_windows, read_texts, token_lengths
+from inference_backend import dropout_masks, export_paths, padding_context
+from prep_data import clean_text
+from save_model import MCDropoutCNN, load_checkpoint
+from text_encoder import TextEncoder
+
+
+class QuantizableCNN(nn.Module):
+    """
+    SimpleCNN laid out for eager-mode int8 quantization.
+
+    The embedding stays fp32; its output is quantized, each conv+ReLU runs
+    in int8 and is dequantized before max-pooling, and fc runs on the
+    (masked) pooled features. tokens [batch, seq_len], masks [n, batch,
+    3 * num_filters] -> probabilities [n, batch], like MCDropoutCNN.
+    """
+
+    def __init__(self, model, padded_len):
+        super().__init__()
+        convs = (model.conv1, model.conv2, model.conv3)
+        self.embedding = copy.deepcopy(model.embedding)
+        self.quant = QuantStub()
+        self.conv1, self.conv2, self.conv3 = (copy.deepcopy(conv) for conv in convs)
+        self.relu1, self.relu2, self.relu3 = nn.ReLU(), nn.ReLU(), nn.ReLU()
+        self.dequant = DeQuantStub()
+        self.fc = copy.deepcopy(model.fc)
+
+        # Kept as plain values: quantized convs no longer expose float biases
+        self.padded_len = padded_len
+        self.windows = [(conv.kernel_size[0], conv.padding[0]) for conv in convs]
+        self.context = padding_context(self.windows)
+        self.register_buffer('pad_values', torch.stack([torch.relu(conv.bias.detach()) for conv in convs]))
+
+    def features(self, tokens):
+        # Same dynamic-padding handling as SimpleCNN.features(x, padded_len)
+        tokens = pad_context(tokens, self.context, self.padded_len)
+        lengths = token_lengths(tokens)
+
+        x = self.quant(self.embedding(tokens).transpose(1, 2))
+        branches = ((self.conv1, self.relu1), (self.conv2, self.relu2), (self.conv3, self.relu3))
+        pooled = []
+        for i, (conv, relu) in enumerate(branches):
+            c = torch.max(self.dequant(relu(conv(x))), dim=2)[0]
+            k, p = self.windows[i]
+            pooled.append(pad_windows(c, lengths, k, p, self.pad_values[i], self.padded_len))
+        return torch.cat(pooled, dim=1)
+
+    def forward(self, tokens, masks):
+        logits = self.fc(self.features(tokens).unsqueeze(0) * masks)
+        return torch.sigmoid(logits).squeeze(-1)
+
+
+def quantize(model, padded_len, calibration_ids, mode='static', batch_size=64):
+    """
+    Build the int8 model.
+
+    Args:
+        model: fp32 SimpleCNN
+        padded_len: Token length the model was trained on
+        calibration_ids: [n, seq_len] token IDs used to calibrate activation ranges
+        mode: 'static' (int8 convs + dynamic int8 fc) or 'dynamic' (dynamic int8 fc only)
+    """
+    qmodel = QuantizableCNN(model, padded_len).eval()
+    num_features = model.fc.in_features
+
+    if mode == 'static':
+        qmodel = fuse_modules(qmodel, [['conv1', 'relu1'], ['conv2', 'relu2'], ['conv3', 'relu3']])
+        qmodel.qconfig = get_default_qconfig('x86')
+        qmodel.embedding.qconfig = None
+        qmodel.fc.qconfig = None
+        qmodel = prepare(qmodel)
+        with torch.no_grad():
+            for start in range(0, len(calibration_ids), batch_size):
+                ids = torch.from_numpy(calibration_ids[start:start + batch_size])
+                qmodel(ids, torch.ones(1, len(ids), num_features))
+        qmodel = convert(qmodel)
+
+    return quantize_dynamic(qmodel, {nn.Linear}, dtype=torch.qint8)
+
+
+def load_vocab(path):
+    """Vocabulary file (one token per line, line number = ID), as api.load_model reads it."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return {word.strip(): idx for idx, word in enumerate(f.readlines())}
+
+
+def load_split(real_path, fake_path, test_split, seed):
+    """Texts and labels of cnn.py's train/test split (cleaned as by prep_data.py)."""
+    real = [t for t in (clean_text(text) for text in read_texts(real_path)) if t]
+    fake = [t for t in (clean_text(text) for text in read_texts(fake_path)) if t]
+    texts = real + fake
+    labels = np.array([1] * len(real) + [0] * len(fake))
+
+    np.random.seed(seed)
+    indices = np.random.permutation(len(texts))
+    test_size = int(len(texts) * test_split)
+    test_indices, train_indices = indices[:test_size], indices[test_size:]
+    return ([texts[i] for i in train_indices], labels[train_indices],
+            [texts[i] for i in test_indices], labels[test_indices])
+
+
+def clean_script_text(text):
+    """clean_text of the train_*_10k scripts: whitespace collapsed, lowercased."""
+    return ' '.join(text.split()).lower()
+
+
+def load_labeled_test(path, test_split, seed):
+    """
+    Test split of a combined text,label CSV, as the train_*_10k scripts
+    make it: their clean_text, texts of 10 characters or fewer dropped,
+    then a stratified train_test_split.
+    """
+    from sklearn.model_selection import train_test_split
+
+    texts, labels = [], []
+    with open(path, 'r', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            text = clean_script_text(row.get('text') or '')
+            if len(text) > 10:
+                texts.append(text)
+                labels.append(int(row['label']))
+    if not texts:
+        return [], np.array([], dtype=int)
+    _, texts, _, labels = train_test_split(texts, np.array(labels), test_size=test_split,
+                                           random_state=seed, stratify=labels)
+    return texts, labels
+
+
+def predict(fn, ids, masks, batch_size=256):
+    """MC Dropout probabilities [n, len(ids)] for fixed masks, in batches."""
+    out = []
+    with torch.no_grad():
+        for start in range(0, len(ids), batch_size):
+            batch = torch.from_numpy(ids[start:start + batch_size])
+            out.append(fn(batch, torch.from_numpy(masks[:, start:start + batch_size])).numpy())
+    return np.concatenate(out, axis=1)
+
+
+def compare(fp32, int8, ids, labels, masks):
+    """fp32 vs int8 accuracy and probability drift under identical dropout masks."""
+    p32 = predict(fp32, ids, masks).mean(axis=0)
+    p8 = predict(int8, ids, masks).mean(axis=0)
+    drift = np.abs(p32 - p8)
+    return {
+        'samples': len(labels),
+        'fp32_accuracy': float(np.mean((p32 > 0.5) == labels)),
+        'int8_accuracy': float(np.mean((p8 > 0.5) == labels)),
+        'agreement': float(np.mean((p32 > 0.5) == (p8 > 0.5))),
+        'mean_drift': float(drift.mean()),
+        'max_drift': float(drift.max()),
+    }
+
+
+def latency(fn, ids, masks, repeat=200):
+    """Median milliseconds per call."""
+    ids, masks = torch.from_numpy(ids), torch.from_numpy(masks)
+    times = []
+    with torch.no_grad():
+        for _ in range(10):
+            fn(ids, masks)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn(ids, masks)
+            times.append(time.perf_counter() - start)
+    return float(np.median(times) * 1000.0)
+
+
+def serving_note(timings):
+    """Which batch sizes int8 is faster at, as one report line."""
+    faster = [int(batch) for batch, t in timings.items() if t['int8_script'] < t['fp32_script']]
+    if not faster:
+        return "int8 is slower than fp32 TorchScript at every measured batch size; serve fp32"
+    if len(faster) == len(timings):
+        return "int8 is faster than fp32 TorchScript at every measured batch size"
+    return (f"int8 is faster than fp32 TorchScript from batch {min(faster)} on and slower below; "
+            f"use it for bulk scoring (/predict/batch), not for single-text /predict")
+
+
+def write_report(path, args, results, timings, sizes, accepted):
+    """Markdown fp32-vs-int8 report."""
+    bulk = max(timings, key=int)
+    serving = serving_note(timings)
+    lines = [
+        "# INT8 QUANTIZATION REPORT",
+        "",
+        f"- Model: `{args.model}` (padded length {args.max_len}, MC samples {args.mc_samples})",
+        f"- Mode: {args.mode} (int8 Conv1d: {'yes' if args.mode == 'static' else 'no'}, dynamic int8 fc: yes)",
+        f"- Calibration: {args.calibration} training texts",
+        f"- Bounds: accuracy drop <= {args.max_accuracy_drop:.2f} pp, prediction agreement >= {args.min_agreement:.2%}, "
+        f"speedup at batch {bulk} >= {args.min_bulk_speedup:.2f}x",
+        f"- Result: **{'ACCEPTED' if accepted else 'REJECTED'}**",
+        f"- Serving: {serving}",
+        f"- Platform: {platform.machine()}, torch {torch.__version__}, {torch.get_num_threads()} threads",
+        "",
+        "## Accuracy (same dropout masks for fp32 and int8)",
+        "",
+        "| Test split | Samples | fp32 acc | int8 acc | Agreement | Mean abs drift | Max abs drift |",
+        "|---|---|---|---|---|---|---|",
+    ]
+    for name, r in results.items():
+        lines.append(f"| {name} | {r['samples']} | {r['fp32_accuracy']:.4f} | {r['int8_accuracy']:.4f} "
+                     f"| {r['agreement']:.4f} | {r['mean_drift']:.5f} | {r['max_drift']:.5f} |")
+    lines += [
+        "",
+        f"## Latency (median ms per call, {args.mc_samples} MC samples)",
+        "",
+        "| Batch | fp32 eager | fp32 TorchScript | int8 TorchScript | Speedup vs TorchScript |",
+        "|---|---|---|---|---|",
+    ]
+    for name, t in timings.items():
+        lines.append(f"| {name} | {t['fp32_eager']:.3f} | {t['fp32_script']:.3f} | {t['int8_script']:.3f} "
+                     f"| {t['fp32_script'] / t['int8_script']:.2f}x |")
+    lines += [
+        "",
+        "## Size",
+        "",
+        f"- fp32 TorchScript graph: {sizes['fp32'] / 1024:.1f} KB",
+        f"- int8 TorchScript graph: {sizes['int8'] / 1024:.1f} KB",
+        "",
+    ]
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Post-training int8 quantization of SimpleCNN')
+    parser.add_argument('--model', default='models/model_10k_easy_best.pth', help='fp32 checkpoint')
+    parser.add_argument('--vocab', default='models/vocab_10k_easy_360words.txt', help='Vocabulary file')
+    parser.add_argument('-r', '--real', default='fnn_real_1k.csv', help='Real news CSV the model was trained on')
+    parser.add_argument('-f', '--fake', default='fnn_fake_1k.csv', help='Fake news CSV the model was trained on')
+    parser.add_argument('--extra', nargs='*', default=['fnn_en_easy_10k_all.csv', 'fnn_en_extreme_10k_all.csv'],
+                        help='Combined text,label CSVs whose test splits are also compared')
+    parser.add_argument('--test_split', type=float, default=0.2, help='Test set ratio (as in training)')
+    parser.add_argument('--seed', type=int, default=42, help='Split seed (as in training)')
+    parser.add_argument('--max_len', type=int, default=50, help='Token length the model was trained on')
+    parser.add_argument('--mode', choices=['static', 'dynamic'], default='static', help='Quantization mode')
+    parser.add_argument('--calibration', type=int, default=512, help='Training texts used for calibration')
+    parser.add_argument('--mc_samples', type=int, default=10, help='MC Dropout samples')
+    parser.add_argument('--max_accuracy_drop', type=float, default=0.5, help='Allowed accuracy drop (pp)')
+    parser.add_argument('--min_agreement', type=float, default=0.99, help='Required fp32/int8 agreement')
+    parser.add_argument('--min_bulk_speedup', type=float, default=1.0,
+                        help='Required int8 speedup over fp32 TorchScript at the largest measured batch')
+    parser.add_argument('--report', default='QUANTIZATION_REPORT.md', help='Report file')
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    rng = np.random.default_rng(args.seed)
+
+    print(f"[INFO] Loading {args.model}...")
+    model = load_checkpoint(args.model)
+    vocab = load_vocab(args.vocab)
+    encoder = TextEncoder(vocab, args.max_len)
+    num_features = model.fc.in_features
+    dropout_p = model.dropout.p
+
+    train_texts, _, test_texts, test_labels = load_split(args.real, args.fake, args.test_split, args.seed)
+    if not test_texts:
+        print(f"[ERROR] No texts in {args.real} / {args.fake}")
+        sys.exit(1)
+    print(f"[INFO] Split: {len(train_texts)} train / {len(test_texts)} test")
+
+    # Calibrate on a sample of the training texts
+    sample = rng.choice(len(train_texts), min(args.calibration, len(train_texts)), replace=False)
+    calibration_ids, _ = encoder.encode([train_texts[i] for i in sample])
+    print(f"[INFO] Quantizing ({args.mode}, {len(sample)} calibration texts)...")
+    int8_model = quantize(model, args.max_len, calibration_ids, args.mode)
+
+    # Trace both precisions so latency compares like with like
+    fp32_eager = MCDropoutCNN(model, args.max_len).eval()
+    example = (torch.from_numpy(calibration_ids[:2]), torch.ones(2, 2, num_features))
+    with torch.no_grad():
+        fp32_script = torch.jit.trace(fp32_eager, example)
+        int8_script = torch.jit.trace(int8_model, example)
+
+    # Accuracy and drift
+    eval_sets = {f"{os.path.basename(args.real)} + {os.path.basename(args.fake)}": (test_texts, test_labels)}
+    for path in args.extra:
+        if os.path.exists(path):
+            eval_sets[os.path.basename(path)] = load_labeled_test(path, args.test_split, args.seed)
+    results = {}
+    for name, (texts, labels) in eval_sets.items():
+        if not texts:
+            print(f"  {name}: no texts, skipped")
+            continue
+        ids, _ = encoder.encode(texts, width=args.max_len)
+        masks = dropout_masks(rng, (args.mc_samples, len(ids), num_features), dropout_p)
+        results[name] = compare(fp32_script, int8_script, ids, labels, masks)
+        r = results[name]
+        print(f"  {name}: fp32 {r['fp32_accuracy']:.4f}, int8 {r['int8_accuracy']:.4f}, "
+              f"agreement {r['agreement']:.4f}, max drift {r['max_drift']:.5f}")
+
+    # Latency
+    test_ids, _ = encoder.encode(test_texts)
+    timings = {}
+    for batch in (1, 32, 256):
+        ids = test_ids[:batch]
+        ids = ids[:, :max(5, int((ids != 0).sum(axis=1).max()))]
+        masks = dropout_masks(rng, (args.mc_samples, len(ids), num_features), dropout_p)
+        timings[str(batch)] = {
+            'fp32_eager': latency(fp32_eager, ids, masks),
+            'fp32_script': latency(fp32_script, ids, masks),
+            'int8_script': latency(int8_script, ids, masks),
+        }
+        t = timings[str(batch)]
+        print(f"  batch {batch}: fp32 {t['fp32_script']:.3f} ms, int8 {t['int8_script']:.3f} ms")
+
+    # Accept only bounded drift on the model's own test split, and a bulk speedup
+    main_result = next(iter(results.values()))
+    accuracy_drop = (main_result['fp32_accuracy'] - main_result['int8_accuracy']) * 100.0
+    bulk = timings[max(timings, key=int)]
+    bulk_speedup = bulk['fp32_script'] / bulk['int8_script']
+    accepted = (accuracy_drop <= args.max_accuracy_drop and main_result['agreement'] >= args.min_agreement
+                and bulk_speedup >= args.min_bulk_speedup)
+
+    out_path = export_paths(args.model)['int8']
+    meta = {'padded_len': args.max_len, 'dropout_p': dropout_p, 'num_features': num_features,
+            'mode': args.mode, 'accuracy_drop_pp': accuracy_drop, 'agreement': main_result['agreement'],
+            'bulk_speedup': bulk_speedup}
+    fp32_tmp = out_path + '.fp32.tmp'
+    torch.jit.save(fp32_script, fp32_tmp)
+    sizes = {'fp32': os.path.getsize(fp32_tmp)}
+    os.remove(fp32_tmp)
+    if accepted:
+        torch.jit.save(int8_script, out_path, _extra_files={'meta.json': json.dumps(meta)})
+        sizes['int8'] = os.path.getsize(out_path)
+    else:
+        int8_tmp = out_path + '.tmp'
+        torch.jit.save(int8_script, int8_tmp)
+        sizes['int8'] = os.path.getsize(int8_tmp)
+        os.remove(int8_tmp)
+
+    write_report(args.report, args, results, timings, sizes, accepted)
+    print(f"[INFO] Report saved to: {args.report}")
+
+    if not accepted:
+        print(f"[ERROR] int8 out of bounds (accuracy drop {accuracy_drop:.2f} pp, "
+              f"agreement {main_result['agreement']:.4f}, bulk speedup {bulk_speedup:.2f}x); checkpoint not saved")
+        sys.exit(1)
+    print(f"[INFO] Saved int8 checkpoint: {out_path}")
+    print(f"[INFO] {serving_note(timings)}")
+
+
+if __name__ == '__main__':
+    main()
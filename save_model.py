@@ -1,12 +1,18 @@
 #!/usr/bin/env python3
 """
 save_model.py - Save trained model and vocabulary for API deployment
+Also exports trained checkpoints to TorchScript, ONNX and NumPy .npz (see inference_backend.py)
 """
 import torch
+import numpy as np
 import csv
+import json
 import os
 import argparse
 
+from cnn import SimpleCNN
+from inference_backend import export_paths
+
 def save_model_for_api(model_path, vocab_dict, output_dir='models'):
     """Save model and vocabulary for API"""
     os.makedirs(output_dir, exist_ok=True)
@@ -23,6 +29,101 @@ def save_model_for_api(model_path, vocab_dict, output_dir='models'):
     print(f"[INFO] Place model weights at: {output_dir}/model.pth")
     print("[INFO] Use torch.save(model.state_dict(), 'models/model.pth') during training")
 
+class DeterministicCNN(torch.nn.Module):
+    """SimpleCNN without dropout: tokens [batch, seq_len] -> probabilities [batch]"""
+    def __init__(self, model, padded_len):
+        super().__init__()
+        self.model = model
+        self.padded_len = padded_len
+    
+    def forward(self, tokens):
+        features = self.model.features(tokens, self.padded_len)
+        return torch.sigmoid(self.model.fc(features)).squeeze(-1)
+
+class MCDropoutCNN(torch.nn.Module):
+    """SimpleCNN with dropout masks as an input:
+    tokens [batch, seq_len], masks [n, batch, 3 * num_filters] -> probabilities [n, batch]"""
+    def __init__(self, model, padded_len):
+        super().__init__()
+        self.model = model
+        self.padded_len = padded_len
+    
+    def forward(self, tokens, masks):
+        return self.model.masked_predict(self.model.features(tokens, self.padded_len), masks)
+
+def load_checkpoint(model_path, dropout_p=0.5):
+    """Load a SimpleCNN state dict, taking the layer sizes from the weights"""
+    state = torch.load(model_path, map_location='cpu')
+    vocab_size, embed_dim = state['embedding.weight'].shape
+    num_filters = state['conv1.weight'].shape[0]
+    model = SimpleCNN(vocab_size, embed_dim, num_filters, dropout_p)
+    model.load_state_dict(state)
+    model.eval()
+    return model
+
+def export_model(model_path, padded_len=50, dropout_p=0.5, formats=('torchscript', 'onnx', 'npz'), opset=17):
+    """
+    Export a trained checkpoint for the inference backends
+    
+    Writes a deterministic graph and an MC Dropout graph (masks as input) per
+    format, next to the checkpoint. Both take token IDs padded to the longest
+    text and score them as if padded to `padded_len`. The 'npz' format holds
+    the raw weights for numpy_cnn.py.
+    
+    Returns:
+        Dict of written file paths
+    """
+    model = load_checkpoint(model_path, dropout_p)
+    paths = export_paths(model_path)
+    meta = {'padded_len': padded_len, 'dropout_p': dropout_p, 'num_features': model.fc.in_features}
+    
+    deterministic = DeterministicCNN(model, padded_len).eval()
+    mc = MCDropoutCNN(model, padded_len).eval()
+    tokens = torch.randint(1, model.embedding.num_embeddings, (2, 12))
+    masks = torch.ones(3, 2, model.fc.in_features)
+    written = {}
+    
+    if 'torchscript' in formats:
+        extra_files = {'meta.json': json.dumps(meta)}
+        with torch.no_grad():
+            torch.jit.save(torch.jit.trace(deterministic, (tokens,)), paths['torchscript'], _extra_files=extra_files)
+            torch.jit.save(torch.jit.trace(mc, (tokens, masks)), paths['torchscript_mc'], _extra_files=extra_files)
+        written['torchscript'] = paths['torchscript']
+        written['torchscript_mc'] = paths['torchscript_mc']
+        print(f"[INFO] Saved TorchScript: {paths['torchscript']}, {paths['torchscript_mc']}")
+    
+    if 'onnx' in formats:
+        import onnx
+        
+        graphs = (
+            (deterministic, (tokens,), paths['onnx'], ['tokens'], ['probability'],
+             {'tokens': {0: 'batch', 1: 'seq_len'}, 'probability': {0: 'batch'}}),
+            (mc, (tokens, masks), paths['onnx_mc'], ['tokens', 'masks'], ['probabilities'],
+             {'tokens': {0: 'batch', 1: 'seq_len'}, 'masks': {0: 'samples', 1: 'batch'},
+              'probabilities': {0: 'samples', 1: 'batch'}}),
+        )
+        for module, args, path, input_names, output_names, dynamic_axes in graphs:
+            torch.onnx.export(module, args, path, input_names=input_names, output_names=output_names,
+                              dynamic_axes=dynamic_axes, opset_version=opset, dynamo=False)
+            graph = onnx.load(path)
+            for key, value in meta.items():
+                graph.metadata_props.add(key=key, value=str(value))
+            onnx.save(graph, path)
+        written['onnx'] = paths['onnx']
+        written['onnx_mc'] = paths['onnx_mc']
+        print(f"[INFO] Saved ONNX: {paths['onnx']}, {paths['onnx_mc']}")
+    
+    if 'npz' in formats:
+        convs = (model.conv1, model.conv2, model.conv3)
+        weights = {name: tensor.cpu().numpy() for name, tensor in model.state_dict().items()}
+        np.savez(paths['npz'], padded_len=padded_len, dropout_p=dropout_p,
+                 kernel_sizes=[conv.kernel_size[0] for conv in convs],
+                 paddings=[conv.padding[0] for conv in convs], **weights)
+        written['npz'] = paths['npz']
+        print(f"[INFO] Saved NumPy weights: {paths['npz']}")
+    
+    return written
+
 def save_kb_patterns(real_patterns_csv, fake_patterns_csv, output_dir='kb'):
     """Copy KB patterns for API"""
     os.makedirs(output_dir, exist_ok=True)
@@ -45,8 +146,17 @@ def main():
     parser = argparse.ArgumentParser(description='Prepare model for API deployment')
     parser.add_argument('--real_support', default='real_10k_support.csv', help='Real patterns CSV')
     parser.add_argument('--fake_support', default='fake_10k_support.csv', help='Fake patterns CSV')
+    parser.add_argument('--export', metavar='MODEL_PTH', help='Export a checkpoint to TorchScript/ONNX/NumPy and exit')
+    parser.add_argument('--max_len', type=int, default=50, help='Token length the model was trained on (export)')
+    parser.add_argument('--dropout_p', type=float, default=0.5, help='Dropout probability (export)')
+    parser.add_argument('--formats', default='torchscript,onnx,npz', help='Export formats (export)')
     args = parser.parse_args()
     
+    if args.export:
+        print(f"[INFO] Exporting {args.export}...")
+        export_model(args.export, args.max_len, args.dropout_p, args.formats.split(','))
+        return
+    
     print("[INFO] Preparing model for API deployment...")
     print("[INFO] This script helps organize files for the API")
     print()
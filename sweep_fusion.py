@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+sweep_fusion.py - Grid search over fusion parameters with cached signals
+Computes CNN, KB and verification signals once (.npz cache), then evaluates
+every fusion configuration vectorized, reporting accuracy / F1 / ECE
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+import numpy as np
+
+from calculate_optimized import COMMON_WORDS_BLACKLIST, filter_distinctive_patterns, load_support
+from kb_matcher import KBMatcher
+from verification import fusion
+
+
+def parse_grid(spec):
+    """Parse a grid spec: comma list ("5,10,20") or inclusive range ("0.1:1.0:0.05")."""
+    if ':' in spec:
+        start, stop, step = (float(v) for v in spec.split(':'))
+        count = int(round((stop - start) / step)) + 1
+        return np.round(start + step * np.arange(count), 10)
+    return np.array([float(v) for v in spec.split(',') if v.strip()])
+
+
+def cache_key(args):
+    """Describe the inputs a cache was built from, so stale caches get rebuilt."""
+    parts = []
+    for path in (args.combined_csv, args.probabilities, args.real_support, args.fake_support):
+        stat = os.stat(path) if os.path.exists(path) else None
+        parts.append(f"{os.path.abspath(path)}:{stat.st_size if stat else 0}:{stat.st_mtime_ns if stat else 0}")
+    parts.append(f"max_limit={args.max_limit}")
+    parts.append(f"filter={not args.no_filter}")
+    parts.append(f"verification={not args.no_verification}")
+    parts.append(f"cnn_positive={args.cnn_positive}")
+    return '|'.join(parts)
+
+
+def build_cache(args):
+    """Compute per-row signals once and save them to the .npz cache."""
+    print("[INFO] Building signal cache...")
+    cnn_probs = np.load(args.probabilities).astype(np.float64)
+    if args.cnn_positive == 'fake':
+        cnn_probs = 1.0 - cnn_probs  # sweep works on P(real), label 1 = REAL
+
+    texts = []
+    labels = []
+    with open(args.combined_csv, 'r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            texts.append(row['text'])
+            labels.append(int(row['label']))
+
+    if len(cnn_probs) != len(texts):
+        print(f"[ERROR] Mismatch: {len(cnn_probs)} predictions vs {len(texts)} texts")
+        sys.exit(1)
+
+    real_patterns = load_support(args.real_support)
+    fake_patterns = load_support(args.fake_support)
+    if not args.no_filter:
+        print(f"  Blacklist: {len(COMMON_WORDS_BLACKLIST)} common words")
+        real_patterns = filter_distinctive_patterns(real_patterns)
+        fake_patterns = filter_distinctive_patterns(fake_patterns)
+
+    # KB match vectors for the top max_limit patterns (sparse rows, ranking order)
+    cache = {'labels': np.array(labels, dtype=np.int8), 'cnn_probs': cnn_probs}
+    for name, patterns in (('real', real_patterns), ('fake', fake_patterns)):
+        matcher = KBMatcher(patterns, args.max_limit)
+        hits = matcher.match_matrix(texts)
+        cache[f'{name}_indices'] = hits.indices.astype(np.int32)
+        cache[f'{name}_indptr'] = hits.indptr.astype(np.int64)
+        cache[f'{name}_supports'] = np.asarray(matcher.supports, dtype=np.float64)
+        print(f"  {name.capitalize()} patterns: {len(matcher)} (matches: {hits.nnz})")
+
+    # Verification signals (raw, unrounded)
+    if not args.no_verification:
+        from verification.logical_consistency import DoublePowerVerifier
+        verifier = DoublePowerVerifier()
+        scores = np.zeros(len(texts), dtype=np.float64)
+        impacts = np.ones(len(texts), dtype=np.float64)
+        issue_counts = np.zeros(len(texts), dtype=np.int32)
+        start = time.time()
+        for i, text in enumerate(texts):
+            signals = verifier.analyze(text)
+            scores[i] = signals['verification_score']
+            impacts[i] = signals['combined_confidence_impact']
+            issue_counts[i] = len(signals['all_issues'])
+        print(f"  Verification: {len(texts)} texts in {time.time() - start:.1f}s")
+        cache['verification_score'] = scores
+        cache['confidence_impact'] = impacts
+        cache['issue_count'] = issue_counts
+
+    cache['key'] = np.array(cache_key(args))
+    np.savez_compressed(args.cache, **cache)
+    print(f"[INFO] Saved signal cache to: {args.cache}")
+    return load_cache(args.cache)
+
+
+def load_cache(path):
+    """Load a signal cache into a plain dictionary of arrays."""
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+def supports_by_limit(cache, name, limits):
+    """Total KB support per text for every top-K limit.
+
+    Returns:
+        Array of shape (len(limits), n_texts)
+    """
+    indices = cache[f'{name}_indices']
+    indptr = cache[f'{name}_indptr']
+    n = len(indptr) - 1
+    rows = np.repeat(np.arange(n), np.diff(indptr))
+    weights = cache[f'{name}_supports'][indices]
+
+    # bincount adds in pattern order within each row, like KBMatcher.score
+    out = np.zeros((len(limits), n), dtype=np.float64)
+    for j, limit in enumerate(limits):
+        mask = indices < limit
+        out[j] = np.bincount(rows[mask], weights=weights[mask], minlength=n)
+    return out
+
+
+def evaluate(probs, preds, labels, bins=10):
+    """Metrics for a block of configurations.
+
+    Args:
+        probs: (configs, n) fused P(real)
+        preds: (configs, n) predictions: 1 = REAL, 0 = FAKE, -1 = UNCERTAIN
+        labels: (n,) true labels (1 = REAL)
+
+    Returns:
+        (accuracy, fake-class F1, ECE, coverage), each of shape (configs,)
+    """
+    accuracy = np.mean(preds == labels, axis=1)
+    coverage = np.mean(preds != -1, axis=1)
+
+    tp = np.sum((preds == 0) & (labels == 0), axis=1)
+    fp = np.sum((preds == 0) & (labels == 1), axis=1)
+    fn = np.sum((preds != 0) & (labels == 0), axis=1)
+    denom = 2 * tp + fp + fn
+    f1 = np.where(denom > 0, 2 * tp / np.maximum(denom, 1), 0.0)
+
+    # Expected calibration error of P(real), equal-width bins
+    configs, n = probs.shape
+    bin_ids = np.clip((probs * bins).astype(np.int64), 0, bins - 1)
+    flat = (np.arange(configs)[:, None] * bins + bin_ids).ravel()
+    sum_p = np.bincount(flat, weights=probs.ravel(), minlength=configs * bins)
+    sum_y = np.bincount(flat, weights=np.broadcast_to(labels, probs.shape).ravel(), minlength=configs * bins)
+    ece = np.abs(sum_p - sum_y).reshape(configs, bins).sum(axis=1) / n
+
+    return accuracy, f1, ece, coverage
+
+
+def sweep(cache, limits, divisors, fake_thresholds, real_thresholds, chunk=256):
+    """Evaluate every strategy / parameter combination.
+
+    Returns:
+        List of result dictionaries, one per configuration
+    """
+    labels = cache['labels'].astype(np.int64)
+    cnn = cache['cnn_probs']
+    results = []
+
+    def add(strategy, params, probs, preds):
+        accuracy, f1, ece, coverage = evaluate(probs, preds, labels)
+        for k, p in enumerate(params):
+            results.append(dict(strategy=strategy, **p, accuracy=accuracy[k], f1=f1[k], ece=ece[k], coverage=coverage[k]))
+
+    # CNN only (reference)
+    add('cnn', [{}], cnn[None, :], (cnn > 0.5).astype(np.int64)[None, :])
+
+    real = supports_by_limit(cache, 'real', limits)
+    fake = supports_by_limit(cache, 'fake', limits)
+    kb_probs = fusion.kb_probability(real - fake)
+
+    # Baseline average, one row per limit
+    probs = fusion.baseline_fusion(cnn[None, :], kb_probs)
+    add('baseline', [{'limit': int(l)} for l in limits], probs, (probs > 0.5).astype(np.int64))
+
+    # Confidence-weighted, limit x divisor
+    for j, limit in enumerate(limits):
+        for start in range(0, len(divisors), chunk):
+            block = divisors[start:start + chunk]
+            probs = fusion.weighted_fusion(cnn[None, :], kb_probs[j][None, :], divisor=block[:, None])
+            add('weighted', [{'limit': int(limit), 'divisor': float(d)} for d in block],
+                probs, (probs > 0.5).astype(np.int64))
+
+    # Verification-adjusted CNN, verdict thresholds on P(fake)
+    if 'verification_score' in cache:
+        fake_prob, _ = fusion.verification_fusion(1.0 - cnn, cache['verification_score'],
+                                                  cache['confidence_impact'], cache['issue_count'])
+        pairs = [(f, r) for f in fake_thresholds for r in real_thresholds if r <= f]
+        for start in range(0, len(pairs), chunk):
+            block = np.array(pairs[start:start + chunk])
+            f_thr, r_thr = block[:, :1], block[:, 1:]
+            preds = np.where(fake_prob > f_thr, 0, np.where(fake_prob < r_thr, 1, -1))
+            probs = np.broadcast_to(1.0 - fake_prob, preds.shape)
+            add('verification', [{'fake_threshold': float(f), 'real_threshold': float(r)} for f, r in block],
+                probs, preds)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sweep fusion parameters over cached signals')
+    parser.add_argument('combined_csv', help='Combined CSV with text and label columns')
+    parser.add_argument('--probabilities', required=True, help='CNN probabilities .npy file')
+    parser.add_argument('--fake_support', required=True, help='Fake news support patterns CSV')
+    parser.add_argument('--real_support', required=True, help='Real news support patterns CSV')
+    parser.add_argument('--cnn_positive', choices=['real', 'fake'], default='real',
+                        help='Class the CNN probability refers to (cnn.py: real)')
+    parser.add_argument('--no_filter', action='store_true', help='Disable common word filtering')
+    parser.add_argument('--no_verification', action='store_true', help='Skip Double Power verification signals')
+    parser.add_argument('--cache', default='fusion_sweep_cache.npz', help='Signal cache (.npz)')
+    parser.add_argument('--rebuild', action='store_true', help='Recompute the signal cache')
+    parser.add_argument('--max_limit', type=int, default=100, help='Largest top-K limit kept in the cache')
+    parser.add_argument('--limits', default='5,10,20,30,50,100', help='Top-K limits (list or start:stop:step)')
+    parser.add_argument('--divisors', default='0.05:1.0:0.05', help='Weighted fusion confidence divisors')
+    parser.add_argument('--fake_thresholds', default='0.5:0.8:0.01', help='Verdict FAKE thresholds')
+    parser.add_argument('--real_thresholds', default='0.2:0.5:0.01', help='Verdict REAL thresholds')
+    parser.add_argument('--metric', choices=['accuracy', 'f1', 'ece'], default='accuracy', help='Ranking metric')
+    parser.add_argument('--top', type=int, default=10, help='Configurations to print')
+    parser.add_argument('--out', default='fusion_sweep_results.csv', help='Output CSV with all configurations')
+
+    args = parser.parse_args()
+
+    limits = parse_grid(args.limits).astype(int)
+    if limits.max() > args.max_limit:
+        print(f"[ERROR] Limit {limits.max()} exceeds --max_limit {args.max_limit}")
+        sys.exit(1)
+
+    cache = None
+    if os.path.exists(args.cache) and not args.rebuild:
+        cache = load_cache(args.cache)
+        if str(cache.get('key')) != cache_key(args):
+            print("[INFO] Signal cache is stale")
+            cache = None
+        else:
+            print(f"[INFO] Loaded signal cache: {args.cache}")
+    if cache is None:
+        cache = build_cache(args)
+
+    divisors = parse_grid(args.divisors)
+    fake_thresholds = parse_grid(args.fake_thresholds)
+    real_thresholds = parse_grid(args.real_thresholds)
+
+    start = time.time()
+    results = sweep(cache, limits, divisors, fake_thresholds, real_thresholds)
+    elapsed = time.time() - start
+    print(f"[INFO] Evaluated {len(results)} configurations on {len(cache['labels'])} rows in {elapsed:.2f}s")
+
+    fields = ['strategy', 'limit', 'divisor', 'fake_threshold', 'real_threshold', 'accuracy', 'f1', 'ece', 'coverage']
+    with open(args.out, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for r in results:
+            writer.writerow({k: (f"{v:.6f}" if isinstance(v, float) else v) for k, v in r.items()})
+    print(f"[INFO] Saved results to: {args.out}")
+
+    reverse = args.metric != 'ece'
+    ranked = sorted(results, key=lambda r: r[args.metric], reverse=reverse)
+
+    print("\n" + "="*80)
+    print(f"TOP {args.top} CONFIGURATIONS BY {args.metric.upper()}")
+    print("="*80)
+    print(f"{'Strategy':<14} {'Params':<34} {'Acc':<8} {'F1':<8} {'ECE':<8} {'Cover':<8}")
+    print("-" * 80)
+    for r in ranked[:args.top]:
+        params = ', '.join(f"{k}={r[k]:g}" for k in ('limit', 'divisor', 'fake_threshold', 'real_threshold') if k in r)
+        print(f"{r['strategy']:<14} {params:<34} {r['accuracy']:.4f}   {r['f1']:.4f}   {r['ece']:.4f}   {r['coverage']:.4f}")
+    print("\n" + "="*80 + "\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+test_regex_program.py - Test RegexProgram against per-pattern re scans
+Every rule of a RegexProgram must give exactly the hits it gives on its own:
+re.finditer for find_all rules, re.search otherwise.
+"""
+import csv
+import os
+import random
+import re
+import sys
+
+sys.path.append(os.path.dirname(__file__))
+
+from verification.logical_consistency import LogicalConsistencyChecker
+from verification.regex_program import RegexProgram
+
+ATOMS = ['a', 'b', 'ab', ' ', '.', '[ab]', r'\d', r'\w', r'\s', r'\b', '^', '$', '']
+QUANTIFIERS = ['', '', '*', '+', '?', '{2}', '{1,3}', '*?', '+?']
+
+
+def random_pattern(rng, depth=0):
+    """A random pattern over 'ab1 ' with groups, alternation and quantifiers."""
+    parts = []
+    for _ in range(rng.randint(1, 3)):
+        if depth < 2 and rng.random() < 0.3:
+            inner = random_pattern(rng, depth + 1)
+            atom = rng.choice([f'({inner})', f'(?:{inner})', f'(?:{inner}|{random_pattern(rng, depth + 1)})'])
+        else:
+            atom = rng.choice(ATOMS)
+        if atom and atom not in ('^', '$', r'\b'):
+            atom += rng.choice(QUANTIFIERS)
+        parts.append(atom)
+    return ''.join(parts)
+
+
+def expected_hits(pattern, find_all, text, flags):
+    """(start, end, text, groups) of the rule scanned on its own."""
+    compiled = re.compile(pattern, flags)
+    if find_all:
+        matches = list(compiled.finditer(text))
+    else:
+        match = compiled.search(text)
+        matches = [match] if match else []
+    return [(m.start(), m.end(), m.group(0), m.groups()) for m in matches]
+
+
+def check_program(rules, texts, flags=0):
+    """Assert that the program and the separate scans agree on every text."""
+    program = RegexProgram(rules, flags)
+    for text in texts:
+        scanned = program.scan(text)
+        assert [tag for tag, _ in scanned] == [tag for _, tag, _ in rules]
+        for (pattern, tag, find_all), (_, hits) in zip(rules, scanned):
+            got = [(hit.start, hit.end, hit.text, hit.groups) for hit in hits]
+            expected = expected_hits(pattern, find_all, text, flags)
+            assert got == expected, f"rule {pattern!r} on {text!r}: {got} != {expected}"
+
+
+def test_random_rules():
+    """Random rule sets (overlapping, empty-matching, grouped) on random texts"""
+    rng = random.Random(0)
+    for trial in range(500):
+        rules = [(random_pattern(rng), i, rng.random() < 0.5) for i in range(rng.randint(1, 6))]
+        texts = [''.join(rng.choice('ab1 ') for _ in range(rng.randint(0, 20))) for _ in range(10)]
+        check_program(rules, texts, re.IGNORECASE if trial % 2 else 0)
+    print(f"{'Random rule sets':30} 500 passed")
+
+
+def test_consistency_rules():
+    """LogicalConsistencyChecker's own rules on the repo corpora"""
+    checker = LogicalConsistencyChecker()
+    rules = ([(pattern, None, True) for pattern, _, _ in checker.numerical_patterns] +
+             [(pattern, None, False) for pattern, _ in checker.statistical_flags] +
+             [(pattern, None, False) for pattern in checker.temporal_patterns])
+    rules = [(pattern, i, find_all) for i, (pattern, _, find_all) in enumerate(rules)]
+
+    texts = ['150% increase yesterday in 2015', '100% effective, 0% risk, 200 years old',
+             'Tomorrow in 2024 and next year in 2030', '']
+    for filename in ('real_world_validation.csv', 'fnn_en_extreme_10k_all.csv', 'fnn_pl_extreme_10k_all.csv'):
+        if os.path.exists(filename):
+            with open(filename, encoding='utf-8') as f:
+                texts += [row['text'] for row in csv.DictReader(f) if row.get('text')][:300]
+    check_program(rules, texts, re.IGNORECASE)
+    print(f"{'Consistency rules':30} {len(texts)} texts passed")
+
+
+def test_rejected_rules():
+    """Named groups and backreferences raise ValueError"""
+    for pattern in [r'(?P<n>a)b', r'(a)\1', r'(a)(?(1)b|c)', r'x(?:y|(a)+\1)']:
+        try:
+            RegexProgram([(pattern, None, True)])
+        except ValueError:
+            continue
+        raise AssertionError(f"{pattern!r} was not rejected")
+    RegexProgram([(r'\\1', None, True), (r'(a)(b)', None, False)])
+    print(f"{'Rejected rules':30} passed")
+
+
+def main():
+    """Run all tests"""
+    try:
+        test_random_rules()
+        test_consistency_rules()
+        test_rejected_rules()
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        return 1
+    print("\n✅ ALL REGEX PROGRAM TESTS PASSED")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
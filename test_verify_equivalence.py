@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+test_verify_equivalence.py - Regression test of DoublePowerVerifier.verify
+Runs verify() over a fixed corpus (the repo CSVs plus generated texts mixing
+the verification phrase lists, KB keywords and numeric/temporal claims) and
+compares a digest of every result with verify_golden.json, recorded before
+the phrase automaton, regex program, shared text analysis and compiled fact
+store were introduced. The compiled store must give the same results as the
+JSON knowledge base. The temporal checks run against the year stored with the
+digests, not the clock.
+
+Usage: python test_verify_equivalence.py [--update]
+"""
+import contextlib
+import csv
+import hashlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime
+
+sys.path.append(os.path.dirname(__file__))
+
+from verification.logical_consistency import (
+    DoublePowerVerifier,
+    EmotionalLanguageDetector,
+    FactDatabase,
+)
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+GOLDEN_PATH = os.path.join(ROOT, 'verify_golden.json')
+CORPORA = ['real_world_validation.csv', 'fnn_en_extreme_10k_all.csv', 'fnn_pl_extreme_10k_all.csv',
+           'fnn_pl_hard_10k_all.csv', 'fnn_pl_10k_all.csv']
+CLAIMS = ['always', 'never', 'all', 'none', 'increase', 'decline', 'zawsze', 'nigdy', 'wszyscy', 'nikt', 'confirm',
+          'deny', '150%', '250% ', '0.00%', '200 years old', '150 lat', '500 procent', '1200 percent',
+          '100% effective', '0% risk', 'unlimited', 'yesterday in 2015', 'Tomorrow in 2024', 'next year in 2030',
+          'jutro in 2026', '2019', '2015', '1939', '1950', '2031', '2099', '8,849', '300,000', '3.5', '12', '1914',
+          '1918', 'covid', 'wwii', 'world war 2', 'olympics 2020', '100', '42', '1000000']
+
+
+def quiet(fn, *args, **kwargs):
+    """Call fn without its console output"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+def corpus():
+    """The 400 first texts of every corpus plus 1500 generated texts"""
+    texts = []
+    for filename in CORPORA:
+        with open(os.path.join(ROOT, filename), encoding='utf-8') as f:
+            texts += [row['text'] for row in csv.DictReader(f) if row.get('text')][:400]
+
+    facts, emotions = quiet(FactDatabase), quiet(EmotionalLanguageDetector)
+    phrases = (facts.impossible_claims + facts.scientific_impossibilities + facts.fake_patterns +
+               sum(emotions.emotional_words.values(), []) + sum(emotions.fear_words.values(), []))
+    with open(os.path.join(ROOT, 'knowledge_base.json'), encoding='utf-8') as f:
+        keywords = [keyword for fact in json.load(f)['facts'] for keyword in fact['keywords']]
+
+    rng = random.Random(0)
+    for _ in range(1500):
+        parts = (rng.sample(phrases, rng.randint(0, 5)) + rng.sample(keywords, rng.randint(0, 4)) +
+                 rng.sample(CLAIMS, rng.randint(0, 6)))
+        parts = [part.upper() if rng.random() < 0.2 else part for part in parts]
+        rng.shuffle(parts)
+        texts.append(' '.join(parts) + rng.choice(['', '!', '!!!', ' ???']))
+    return texts
+
+
+def load_golden():
+    """(current year, digests) recorded in verify_golden.json"""
+    with open(GOLDEN_PATH, encoding='utf-8') as f:
+        golden = json.load(f)
+    return golden['year'], golden['digests']
+
+
+def digests(verifier, texts, year):
+    """Digest of every verify() result (every other text with a CNN probability) as of year"""
+    verifier.consistency_checker.current_year = year
+    results = []
+    for i, text in enumerate(texts):
+        result = verifier.verify(text, None if i % 2 else (i % 97) / 97)
+        encoded = json.dumps(result, ensure_ascii=False, sort_keys=True).encode('utf-8')
+        results.append(hashlib.sha256(encoded).hexdigest()[:16])
+    return results
+
+
+def compare(name, got, golden, texts):
+    """Assert that got matches the golden digests"""
+    mismatches = [i for i, (a, b) in enumerate(zip(got, golden)) if a != b]
+    assert len(got) == len(golden), f"{name}: {len(got)} results, golden has {len(golden)}"
+    assert not mismatches, (f"{name}: {len(mismatches)} results differ, first on text {mismatches[0]}: "
+                            f"{texts[mismatches[0]][:80]!r}")
+    print(f"{name:30} {len(got)} results match")
+
+
+def test_verify_json_kb():
+    """verify() with the JSON knowledge base matches the golden results"""
+    texts = corpus()
+    year, golden = load_golden()
+    compare('JSON knowledge base', digests(quiet(DoublePowerVerifier), texts, year), golden, texts)
+
+
+def test_verify_compiled_store():
+    """verify() with a compiled fact store matches the golden results"""
+    from verification.fact_checker import FactChecker
+    from verification.fact_store import compile_store
+
+    texts = corpus()
+    year, golden = load_golden()
+    json_path = os.path.join(ROOT, 'knowledge_base.json')
+    with tempfile.TemporaryDirectory() as tmp:
+        store_path = compile_store(json_path, os.path.join(tmp, 'knowledge_base.bin'))
+        verifier = quiet(DoublePowerVerifier)
+        verifier.fact_checker = quiet(FactChecker, json_path, str(store_path))
+        assert verifier.fact_checker.store is not None, "compiled store was not used"
+        got = digests(verifier, texts, year)
+        verifier.fact_checker = None
+    compare('Compiled fact store', got, golden, texts)
+
+
+def main():
+    """Run all tests, or record the golden digests with --update"""
+    if '--update' in sys.argv:
+        texts = corpus()
+        year = datetime.now().year
+        with open(GOLDEN_PATH, 'w', encoding='utf-8') as f:
+            json.dump({'texts': len(texts), 'year': year,
+                       'digests': digests(quiet(DoublePowerVerifier), texts, year)}, f, indent=0)
+            f.write('\n')
+        print(f"[INFO] Recorded {len(texts)} digests in {GOLDEN_PATH}")
+        return 0
+
+    try:
+        test_verify_json_kb()
+        test_verify_compiled_store()
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        return 1
+    print("\n✅ ALL VERIFY EQUIVALENCE TESTS PASSED")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
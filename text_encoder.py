@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+text_encoder.py - Bulk text-to-index encoding for the BANED CNNs
+Cleans, tokenizes and maps whole corpora to padded vocabulary-ID arrays
+"""
+import re
+from multiprocessing import Pool
+
+import numpy as np
+
+URL_RE = re.compile(r'http\S+|www\S+')
+NON_LETTER_RE = re.compile(r'[^a-z\s]')
+NON_LETTER_PL_RE = re.compile(r'[^a-ząćęłńóśźż\s]')
+SPACES_RE = re.compile(r'\s+')
+
+# Shortest padded width: the widest convolution kernel
+MIN_PAD_LEN = 5
+
+
+def clean_text(text):
+    """Lowercase, drop URLs and keep only a-z (same as prep_data.py)"""
+    text = text.lower()
+    text = URL_RE.sub('', text)
+    text = NON_LETTER_RE.sub('', text)
+    text = SPACES_RE.sub(' ', text)
+    return text.strip()
+
+
+def clean_text_pl(text):
+    """Lowercase, drop URLs and replace anything but (Polish) letters with spaces"""
+    text = text.lower()
+    text = URL_RE.sub('', text)
+    text = NON_LETTER_PL_RE.sub(' ', text)
+    return SPACES_RE.sub(' ', text).strip()
+
+
+class TextEncoder:
+    """
+    Maps texts to vocabulary IDs.
+
+    `encode` turns a whole list of texts into one preallocated [n, width]
+    ID array (0 = padding) plus a vector of token counts, so corpora and API
+    batches are encoded in one call instead of one padded list per text.
+    """
+
+    def __init__(self, vocab, max_len=50, clean=None, unk=0, min_len=MIN_PAD_LEN, dtype=np.int64):
+        """
+        Args:
+            vocab: Dict token -> ID (0 is padding)
+            max_len: Tokens kept per text
+            clean: Optional text -> text function applied before splitting
+                   (must be picklable to use workers)
+            unk: ID for tokens missing from vocab
+            min_len: Smallest width when padding to the longest text
+            dtype: Integer dtype of the ID array (np.int64 or np.int32)
+        """
+        self.vocab = vocab
+        self.max_len = max_len
+        self.clean = clean
+        self.unk = unk
+        self.min_len = min_len
+        self.dtype = dtype
+
+    def tokenize(self, text):
+        """Clean and split one text, truncated to max_len tokens."""
+        if self.clean is not None:
+            text = self.clean(text)
+        return text.split()[:self.max_len]
+
+    def encode_flat(self, texts):
+        """IDs of all tokens of `texts` concatenated, and the token count of each text."""
+        get = self.vocab.get
+        unk = self.unk
+        lengths = np.empty(len(texts), dtype=np.int64)
+        ids = []
+        for i, text in enumerate(texts):
+            tokens = self.tokenize(text)
+            lengths[i] = len(tokens)
+            ids.extend([get(token, unk) for token in tokens])
+        return np.array(ids, dtype=self.dtype), lengths
+
+    def encode(self, texts, width=None, workers=1, chunk_size=2000):
+        """
+        Encode texts into a padded ID array.
+
+        Args:
+            texts: Sequence of strings
+            width: Columns of the output; None pads to the longest text
+                   (at least min_len, at most max_len)
+            workers: Processes used to tokenize large corpora
+            chunk_size: Texts per worker task
+
+        Returns:
+            (ids [n, width] array, lengths [n] int64 array)
+        """
+        texts = list(texts)
+
+        if workers > 1 and len(texts) > chunk_size:
+            chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+            with Pool(workers) as pool:
+                parts = pool.map(self.encode_flat, chunks)
+            flat = np.concatenate([ids for ids, _ in parts])
+            lengths = np.concatenate([counts for _, counts in parts])
+        else:
+            flat, lengths = self.encode_flat(texts)
+
+        if width is None:
+            width = max(self.min_len, int(lengths.max()) if len(lengths) else 0)
+
+        # Scatter the flat IDs: token j of text i goes to ids[i, j]
+        rows = np.repeat(np.arange(len(texts)), lengths)
+        cols = np.arange(len(flat)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        keep = cols < width
+
+        ids = np.zeros((len(texts), width), dtype=self.dtype)
+        ids[rows[keep], cols[keep]] = flat[keep]
+        return ids, np.minimum(lengths, width)
@@ -13,6 +13,8 @@ from sklearn.metrics import accuracy_score, precision_recall_fscore_support, con
 from collections import Counter
 
 from cnn import SimpleCNN
+from text_encoder import TextEncoder
+from corpus_cache import cache_key, cache_prefix, load_corpus, save_corpus
 from apriori_algo import apriori_algorithm
 
 print("="*80)
@@ -95,28 +97,39 @@ print("\n[STEP 4/7] Preparing data for CNN...")
 def tokenize(text):
     return text.lower().split()
 
-all_words = []
-for text in df['text']:
-    all_words.extend(tokenize(text))
-
-word_counts = Counter(all_words)
-vocab = {word: idx + 1 for idx, (word, _) in enumerate(word_counts.most_common(5000))}
-vocab['<PAD>'] = 0
+# Encoded corpus cache: repeat runs skip vocabulary building and encoding
+corpus_key = cache_key(['fnn_extreme_real_1k.csv', 'fnn_extreme_fake_1k.csv'],
+                       {'script': 'train_en_extreme_10k', 'vocab_size': 5000, 'max_len': 100},
+                       code=[__file__])  # clean_text and the length filter above are part of the key
+corpus_prefix = cache_prefix('en_extreme_10k', corpus_key)
+corpus = load_corpus(corpus_prefix, corpus_key)
+
+if corpus is None:
+    all_words = []
+    for text in df['text']:
+        all_words.extend(tokenize(text))
+
+    word_counts = Counter(all_words)
+    vocab = {word: idx + 1 for idx, (word, _) in enumerate(word_counts.most_common(5000))}
+    vocab['<PAD>'] = 0
+
+    # Convert texts to sequences (one bulk encode into a [n, 100] array)
+    encoder = TextEncoder(vocab, max_len=100, clean=str.lower)
+    X, lengths = encoder.encode(df['text'].tolist(), width=100)
+    corpus = save_corpus(corpus_prefix, corpus_key, X, lengths, df['label'].values,
+                         sorted(vocab, key=vocab.get))
+    print(f"  ✓ Cached encoded corpus: {corpus_prefix}")
+else:
+    print(f"  ✓ Loaded encoded corpus from cache: {corpus_prefix}")
+
+vocab = corpus.vocab
 vocab_size = len(vocab)
 
 print(f"  ✓ Vocabulary size: {vocab_size}")
 
-def text_to_sequence(text, max_len=100):
-    tokens = tokenize(text)
-    sequence = [vocab.get(token, 0) for token in tokens]
-    if len(sequence) < max_len:
-        sequence += [0] * (max_len - len(sequence))
-    else:
-        sequence = sequence[:max_len]
-    return sequence
-
-X = np.array([text_to_sequence(text) for text in df['text']])
-y = df['label'].values
+# Token IDs are memory-mapped from the cache
+X = corpus.ids
+y = corpus.labels
 
 print(f"  ✓ Input shape: {X.shape}")
 
@@ -189,17 +202,10 @@ print(f"\n  ✓ Best loss: {best_loss:.4f}")
 print("\n[STEP 6/7] Generating MC Dropout predictions...")
 
 model.eval()
-for module in model.modules():
-    if isinstance(module, nn.Dropout):
-        module.train()
-
-all_predictions = []
-for _ in range(50):
-    with torch.no_grad():
-        preds = model(X_test_t.to(device)).cpu().numpy()
-        all_predictions.append(preds)
+# Dropout masks resampled on top of one trunk pass (SimpleCNN.mc_predict)
+with torch.no_grad():
+    all_predictions = model.mc_predict(X_test_t.to(device), 50).cpu().numpy()
 
-all_predictions = np.array(all_predictions)
 mean_predictions = all_predictions.mean(axis=0)
 std_predictions = all_predictions.std(axis=0)
 
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+analyzed_text.py - Shared per-request text analysis for BANED verification
+The lowercased text, tokens, years, numbers and language of a text, computed
+once (on first use) and shared by every DoublePowerVerifier stage.
+"""
+import re
+from functools import cached_property
+from typing import List, Set, Tuple, Union
+
+# 4-digit years 1000-2999
+YEAR_RE = re.compile(r'\b([12]\d{3})\b')
+THOUSANDS_RE = re.compile(r"\b\d{1,3}(?:,\d{3})+\b")
+NUMBER_RE = re.compile(r"\b\d+\.?\d*\b")
+WORD_RE = re.compile(r'\b\w+\b')
+
+POLISH_CHARS = set('ąćęłńóśźż')
+POLISH_COMMON_WORDS = {
+    'jest', 'się', 'nie', 'że', 'jak', 'ale', 'dla', 'jego', 'przez',
+    'na', 'do', 'po', 'przed', 'bardzo', 'może', 'tylko'
+}
+
+
+def extract_numbers(text: str) -> List[float]:
+    """Extract numerical values from text.
+    Handles integers, decimals, and numbers with thousands separators.
+    Year-like numbers (1000-2999) are skipped; see AnalyzedText.years.
+    """
+    numbers: List[float] = []
+
+    # First handle numbers with thousands separators like 8,849 or 300,000
+    cleaned = text
+    for m in THOUSANDS_RE.findall(text):
+        try:
+            value = float(m.replace(",", ""))
+        except ValueError:
+            continue
+        numbers.append(value)
+        # Remove this match from text so it isn't double-counted later
+        cleaned = cleaned.replace(m, " ")
+
+    # Replace remaining commas with spaces to avoid splitting decimals oddly
+    cleaned = cleaned.replace(",", " ")
+
+    # Match integers and decimals (without thousands separators)
+    for m in NUMBER_RE.findall(cleaned):
+        if len(m) > 10:
+            continue
+        try:
+            value = float(m)
+        except ValueError:
+            continue
+        # Skip year-like numbers
+        if 1000 <= value <= 2999:
+            continue
+        numbers.append(value)
+
+    # Deduplicate while preserving order
+    unique_numbers: List[float] = []
+    for v in numbers:
+        if v not in unique_numbers:
+            unique_numbers.append(v)
+    return unique_numbers
+
+
+class AnalyzedText:
+    """
+    One text prepared for all verification stages.
+
+    Every checker accepts either a plain string or an AnalyzedText
+    (see `of`); DoublePowerVerifier builds one per request and passes it
+    on, so lowercasing, tokenization and year/number extraction run once.
+    Attributes are computed on first access and then cached.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+
+    @classmethod
+    def of(cls, text: Union[str, 'AnalyzedText']) -> 'AnalyzedText':
+        """The AnalyzedText itself, or a new one for a plain string."""
+        return text if isinstance(text, AnalyzedText) else cls(text)
+
+    def __str__(self) -> str:
+        return self.text
+
+    @cached_property
+    def lower(self) -> str:
+        """Lowercased text"""
+        return self.text.lower()
+
+    @cached_property
+    def tokens(self) -> List[str]:
+        """Whitespace tokens of the original text (case preserved)"""
+        return self.text.split()
+
+    @cached_property
+    def words(self) -> Set[str]:
+        """Set of lowercased \\w+ words"""
+        return set(WORD_RE.findall(self.lower))
+
+    @cached_property
+    def year_spans(self) -> List[Tuple[int, int, int]]:
+        """(year, start, end) of every 4-digit year 1000-2999, in text order"""
+        return [(int(m.group(1)), m.start(1), m.end(1)) for m in YEAR_RE.finditer(self.text)]
+
+    @cached_property
+    def years(self) -> List[int]:
+        """Every year mention 1000-2999, in text order (with repeats)"""
+        return [year for year, _, _ in self.year_spans]
+
+    @cached_property
+    def numbers(self) -> List[float]:
+        """Distinct non-year numbers, in text order"""
+        return extract_numbers(self.text)
+
+    @cached_property
+    def language(self) -> str:
+        """'pl' or 'en' (Polish diacritics or common Polish words); the API language detection"""
+        if any(char in POLISH_CHARS for char in self.lower):
+            return 'pl'
+        polish_word_count = len(self.words & POLISH_COMMON_WORDS)
+        if polish_word_count >= 2 or (polish_word_count > 0 and len(self.words) < 10):
+            return 'pl'
+        return 'en'
+
+
+# Accepted by every checker
+TextLike = Union[str, AnalyzedText]
@@ -1,13 +1,22 @@
 #!/usr/bin/env python3
 """
 fact_checker.py - Stage 2: Fact Verification Module for BANED
-Checks claims against knowledge base with transparent source attribution
+Checks claims against knowledge base with transparent source attribution.
+knowledge_base.json is memory-mapped from its compiled knowledge_base.bin
+(see fact_store.py) when that is up to date, and parsed otherwise.
 """
 import json
-import re
 import os
 from typing import Dict, List, Tuple, Optional
 from pathlib import Path
+try:
+    from verification.analyzed_text import AnalyzedText, TextLike
+    from verification.fact_store import default_store_path, keyword_entries, open_store
+    from verification.phrase_matcher import PhraseMatcher
+except ImportError:
+    from analyzed_text import AnalyzedText, TextLike
+    from fact_store import default_store_path, keyword_entries, open_store
+    from phrase_matcher import PhraseMatcher
 
 
 class FactChecker:
@@ -17,20 +26,36 @@ class FactChecker:
     with transparent source attribution.
     """
     
-    def __init__(self, knowledge_base_path: Optional[str] = None):
-        """Initialize fact checker with knowledge base"""
+    def __init__(self, knowledge_base_path: Optional[str] = None, store_path: Optional[str] = None):
+        """
+        Initialize fact checker with knowledge base
+        
+        Args:
+            knowledge_base_path: knowledge_base.json (source of truth)
+            store_path: Compiled binary store (default: knowledge_base.bin next to the JSON)
+        """
         if knowledge_base_path is None:
             # Default path relative to this file
             base_dir = Path(__file__).parent.parent
             knowledge_base_path = base_dir / "knowledge_base.json"
         
         self.knowledge_base_path = knowledge_base_path
+        self.store_path = store_path or default_store_path(knowledge_base_path)
+        self.store = None
         self.facts = []
         self.kb_info = {}
         self._load_knowledge_base()
     
     def _load_knowledge_base(self):
-        """Load knowledge base from JSON file"""
+        """Map the compiled fact store if it is up to date, else load the JSON file"""
+        self.store = open_store(self.store_path, self.knowledge_base_path)
+        if self.store is not None:
+            self.facts = self.store.facts
+            self.kb_info = self.store.kb_info
+            self.keyword_index = self.store.keyword_index
+            print(f"[KB] Mapped {len(self.facts)} facts from {self.store_path}")
+            return
+        
         try:
             with open(self.knowledge_base_path, 'r', encoding='utf-8') as f:
                 data = json.load(f)
@@ -47,79 +72,51 @@ class FactChecker:
         except json.JSONDecodeError as e:
             print(f"[KB WARNING] Error parsing knowledge base: {e}")
             self.facts = []
+        self._build_keyword_index()
+    
+    def _build_keyword_index(self):
+        """
+        Compile all fact keywords (lowercased) into one automaton tagged with
+        (fact index, keyword), so check_fact only visits facts whose keywords
+        occur in the text. Call again after changing self.facts.
+        """
+        self.keyword_index = PhraseMatcher(keyword_entries(self.facts))
+    
+    def matching_facts(self, text: TextLike) -> List[Tuple[Dict, List[str]]]:
+        """(fact, matched keywords) of every fact with a keyword in the text, in KB order"""
+        matched = {}
+        # Tags come in entry order: by fact, then by keyword within the fact
+        for index, keyword in self.keyword_index.find(AnalyzedText.of(text).lower):
+            matched.setdefault(index, []).append(keyword)
+        return [(self.facts[index], keywords) for index, keywords in matched.items()]
     
-    def extract_years(self, text: str) -> List[int]:
-        """Extract year mentions from text"""
-        # Match 4-digit years (1000-2999)
-        years = re.findall(r'\b([12]\d{3})\b', text)
-        return [int(y) for y in years]
+    def extract_years(self, text: TextLike) -> List[int]:
+        """Extract year mentions (1000-2999) from text"""
+        return list(AnalyzedText.of(text).years)
     
-    def extract_numbers(self, text: str) -> List[float]:
+    def extract_numbers(self, text: TextLike) -> List[float]:
         """Extract numerical values from text.
         Handles integers, decimals, and numbers with thousands separators.
         Years (1000-2999) are handled separately in extract_years and skipped here.
         """
-        numbers: List[float] = []
-
-        # First handle numbers with thousands separators like 8,849 or 300,000
-        thousand_matches = re.findall(r"\b\d{1,3}(?:,\d{3})+\b", text)
-        cleaned = text
-        for m in thousand_matches:
-            try:
-                value = float(m.replace(",", ""))
-            except ValueError:
-                continue
-            numbers.append(value)
-            # Remove this match from text so it isn't double-counted later
-            cleaned = cleaned.replace(m, " ")
-
-        # Replace remaining commas with spaces to avoid splitting decimals oddly
-        cleaned = cleaned.replace(",", " ")
-
-        # Match integers and decimals (without thousands separators)
-        simple_matches = re.findall(r"\b\d+\.?\d*\b", cleaned)
-        for m in simple_matches:
-            if len(m) > 10:
-                continue
-            try:
-                value = float(m)
-            except ValueError:
-                continue
-            # Skip year-like numbers (handled by extract_years)
-            if 1000 <= value <= 2999:
-                continue
-            numbers.append(value)
-
-        # Deduplicate while preserving order
-        unique_numbers: List[float] = []
-        for v in numbers:
-            if v not in unique_numbers:
-                unique_numbers.append(v)
-        return unique_numbers
+        return list(AnalyzedText.of(text).numbers)
     
-    def check_fact(self, text: str) -> Tuple[List[Dict], float]:
+    def check_fact(self, text: TextLike) -> Tuple[List[Dict], float]:
         """
         Check text against knowledge base facts.
         Returns: (list of checks, verification score)
         """
-        text_lower = text.lower()
+        text = AnalyzedText.of(text)
+        text_lower = text.lower
         checks = []
         score = 0.0
         
-        # Extract potential claims
-        mentioned_years = self.extract_years(text)
-        mentioned_numbers = self.extract_numbers(text)
+        # Potential claims (extracted once per text, on first use)
+        mentioned_years = text.years
+        mentioned_numbers = text.numbers
         
-        # Check each fact in knowledge base
-        for fact in self.facts:
-            keywords = fact.get('keywords', [])
-            
-            # Check if any keyword is mentioned
-            keyword_matches = [kw for kw in keywords if kw.lower() in text_lower]
-            
-            if not keyword_matches:
-                continue  # Fact not relevant to this text
-            
+        # Check each fact with a keyword mentioned in the text (keyword index lookup)
+        for fact, keyword_matches in self.matching_facts(text):
             # Fact is potentially relevant
             check_result = {
                 'fact_id': fact['id'],
@@ -255,7 +252,7 @@ class FactChecker:
         
         return checks, score
     
-    def verify(self, text: str) -> Dict:
+    def verify(self, text: TextLike) -> Dict:
         """
         Main verification method.
         Returns comprehensive fact check results.
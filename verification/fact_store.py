@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+fact_store.py - Binary, memory-mapped fact store for BANED Stage 2
+Compiles knowledge_base.json (the editable source of truth) into one binary
+file that FactChecker memory-maps instead of parsing the JSON:
+
+- fact records: compact JSON per fact, decoded only when a fact is matched
+- keyword index: the FactChecker keyword automaton as flat arrays
+  (transitions, failure links, outputs) walked in place
+- string table: the keywords reported as matched
+
+Opening the store only reads its header, so startup does not grow with the
+KB, and every process mapping the file shares the same page cache.
+
+The store is a build artifact (not committed): compile it on every host,
+e.g. in the Docker/Render build. Recompile with the API workers stopped; on
+Windows the store cannot be replaced while a worker has it mapped.
+
+Usage: python verification/fact_store.py [knowledge_base.json] [-o knowledge_base.bin]
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    from verification.phrase_matcher import PhraseMatcher
+except ImportError:
+    from phrase_matcher import PhraseMatcher
+
+MAGIC = b'BANEDKB\0'
+VERSION = 1
+# magic, version, little-endian flag, JSON size, JSON mtime (ns), JSON sha256
+HEADER = struct.Struct('<8sIIQQ32s')
+HEADER_MTIME = struct.Struct('<Q')
+HEADER_MTIME_OFFSET = 24  # of the JSON mtime field
+SECTION = struct.Struct('<QQ')
+SECTIONS = (
+    'meta',             # JSON: kb_info and counts
+    'fact_offsets',     # u64[n_facts + 1] into fact_records
+    'fact_records',     # compact JSON of every fact
+    'edge_start',       # u32[n_nodes + 1] into edge_chars/edge_targets
+    'edge_chars',       # u32 code points, sorted per node
+    'edge_targets',     # u32 child nodes
+    'fail',             # u32[n_nodes] failure links
+    'output_start',     # u32[n_nodes + 1] into output_entries
+    'output_entries',   # u32 keyword entries ending at (or inherited by) each node
+    'entry_fact',       # u32[n_entries] fact index of each keyword entry
+    'keyword_offsets',  # u64[n_entries + 1] into strings
+    'strings',          # UTF-8 keywords
+)
+TYPECODES = {'fact_offsets': 'Q', 'keyword_offsets': 'Q', 'edge_start': 'I', 'edge_chars': 'I',
+             'edge_targets': 'I', 'fail': 'I', 'output_start': 'I', 'output_entries': 'I', 'entry_fact': 'I'}
+
+
+def default_store_path(json_path) -> Path:
+    """knowledge_base.json -> knowledge_base.bin"""
+    return Path(json_path).with_suffix('.bin')
+
+
+def keyword_entries(facts: Iterable[Dict]) -> Iterable[Tuple[str, Tuple[int, str]]]:
+    """(lowercased keyword, (fact index, keyword)) for every keyword of every fact, in KB order"""
+    for index, fact in enumerate(facts):
+        for keyword in fact.get('keywords', []):
+            yield keyword.lower(), (index, keyword)
+
+
+def _sha256(path) -> bytes:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.digest()
+
+
+def compile_store(json_path, store_path=None) -> Path:
+    """
+    Compile a knowledge base JSON into the binary store (written atomically).
+    Stop the processes using the store first: on Windows a mapped store
+    cannot be replaced.
+
+    Returns:
+        Path of the written store
+    """
+    json_path = Path(json_path)
+    store_path = Path(store_path) if store_path else default_store_path(json_path)
+    with open(json_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    facts = data.get('facts', [])
+    kb_info = {
+        'version': data.get('knowledge_base_version', 'unknown'),
+        'reference_date': data.get('reference_date', 'unknown'),
+        'philosophy': data.get('interpretation_philosophy', '')
+    }
+
+    # Fact records
+    records = bytearray()
+    fact_offsets = array('Q', [0])
+    for fact in facts:
+        records += json.dumps(fact, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        fact_offsets.append(len(records))
+
+    # Keyword automaton, flattened (edges sorted by code point for binary search)
+    matcher = PhraseMatcher(keyword_entries(facts))
+    edge_start, edge_chars, edge_targets = array('I', [0]), array('I'), array('I')
+    output_start, output_entries = array('I', [0]), array('I')
+    for node, children in enumerate(matcher.goto):
+        for char, child in sorted(children.items(), key=lambda item: ord(item[0])):
+            edge_chars.append(ord(char))
+            edge_targets.append(child)
+        edge_start.append(len(edge_chars))
+        output_entries.extend(sorted(matcher.output.get(node, ())))
+        output_start.append(len(output_entries))
+
+    strings = bytearray()
+    entry_fact, keyword_offsets = array('I'), array('Q', [0])
+    for index, keyword in matcher.tags:
+        entry_fact.append(index)
+        strings += keyword.encode('utf-8')
+        keyword_offsets.append(len(strings))
+
+    meta = {'kb_info': kb_info, 'facts': len(facts), 'nodes': len(matcher.goto), 'entries': len(matcher)}
+    sections = {
+        'meta': json.dumps(meta, ensure_ascii=False).encode('utf-8'),
+        'fact_offsets': fact_offsets, 'fact_records': records,
+        'edge_start': edge_start, 'edge_chars': edge_chars, 'edge_targets': edge_targets,
+        'fail': array('I', matcher.fail),
+        'output_start': output_start, 'output_entries': output_entries,
+        'entry_fact': entry_fact, 'keyword_offsets': keyword_offsets, 'strings': strings,
+    }
+
+    stat = json_path.stat()
+    header = HEADER.pack(MAGIC, VERSION, sys.byteorder == 'little', stat.st_size, stat.st_mtime_ns,
+                         _sha256(json_path))
+    offset = HEADER.size + SECTION.size * len(SECTIONS)
+    table, blobs = [], []
+    for name in SECTIONS:
+        blob = sections[name].tobytes() if isinstance(sections[name], array) else bytes(sections[name])
+        padding = -offset % 8  # keep every section 8-byte aligned
+        blobs.append(b'\0' * padding + blob)
+        offset += padding
+        table.append(SECTION.pack(offset, len(blob)))
+        offset += len(blob)
+
+    tmp_path = store_path.with_name(store_path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        f.write(b''.join(table))
+        for blob in blobs:
+            f.write(blob)
+    try:
+        os.replace(tmp_path, store_path)
+    except PermissionError as e:
+        os.remove(tmp_path)
+        raise PermissionError(f"Cannot replace {store_path} (stop the API workers using it first): {e}") from e
+    return store_path
+
+
+class FactRecords:
+    """Read-only list of facts decoded from the store on access."""
+
+    def __init__(self, offsets, records):
+        self.offsets = offsets
+        self.records = records
+        self._decode = lru_cache(maxsize=4096)(self._load)
+
+    def _load(self, index: int) -> Dict:
+        return json.loads(bytes(self.records[self.offsets[index]:self.offsets[index + 1]]).decode('utf-8'))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> Dict:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('fact index out of range')
+        return self._decode(index)
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
+
+class MappedPhraseMatcher:
+    """The FactChecker keyword automaton read in place from the store (same find() as PhraseMatcher)."""
+
+    def __init__(self, arrays: Dict[str, memoryview], strings: memoryview):
+        self.edge_start = arrays['edge_start']
+        self.edge_chars = arrays['edge_chars']
+        self.edge_targets = arrays['edge_targets']
+        self.fail = arrays['fail']
+        self.output_start = arrays['output_start']
+        self.output_entries = arrays['output_entries']
+        self.entry_fact = arrays['entry_fact']
+        self.keyword_offsets = arrays['keyword_offsets']
+        self.strings = strings
+
+    def __len__(self) -> int:
+        return len(self.entry_fact)
+
+    def tag(self, entry: int) -> Tuple[int, str]:
+        """(fact index, keyword) of a keyword entry"""
+        start, end = self.keyword_offsets[entry], self.keyword_offsets[entry + 1]
+        return self.entry_fact[entry], bytes(self.strings[start:end]).decode('utf-8')
+
+    def find(self, text: str) -> List[Tuple[int, str]]:
+        """Tags of all keyword entries occurring in text, in entry order."""
+        edge_start, edge_chars, edge_targets = self.edge_start, self.edge_chars, self.edge_targets
+        fail, output_start, output_entries = self.fail, self.output_start, self.output_entries
+        found = set(output_entries[output_start[0]:output_start[1]])  # empty keywords
+        node = 0
+        for char in text:
+            code = ord(char)
+            while True:
+                lo, hi = edge_start[node], edge_start[node + 1]
+                i = bisect_left(edge_chars, code, lo, hi)
+                if i < hi and edge_chars[i] == code:
+                    node = edge_targets[i]
+                    break
+                if not node:
+                    break
+                node = fail[node]
+            start, end = output_start[node], output_start[node + 1]
+            if start != end:
+                found.update(output_entries[start:end])
+        return [self.tag(entry) for entry in sorted(found)]
+
+
+class FactStore:
+    """
+    A memory-mapped compiled knowledge base.
+
+    Attributes:
+        facts: FactRecords (decoded lazily)
+        kb_info: Knowledge base version, reference date and philosophy
+        keyword_index: MappedPhraseMatcher over all fact keywords
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        magic, version, little, self.json_size, self.json_mtime_ns, self.json_sha256 = HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.path} is not a version {VERSION} fact store")
+        if bool(little) != (sys.byteorder == 'little'):
+            raise ValueError(f"{self.path} was compiled on a machine with a different byte order")
+
+        sections = {}
+        for i, name in enumerate(SECTIONS):
+            offset, length = SECTION.unpack_from(view, HEADER.size + SECTION.size * i)
+            section = view[offset:offset + length]
+            sections[name] = section.cast(TYPECODES[name]) if name in TYPECODES else section
+
+        meta = json.loads(bytes(sections['meta']).decode('utf-8'))
+        self.kb_info = meta['kb_info']
+        self.facts = FactRecords(sections['fact_offsets'], sections['fact_records'])
+        self.keyword_index = MappedPhraseMatcher(sections, sections['strings'])
+
+    def is_fresh(self, json_path) -> bool:
+        """True if the store was compiled from the current contents of json_path."""
+        try:
+            stat = os.stat(json_path)
+        except OSError:
+            return True  # Deployed without the JSON: the store is all there is
+        if stat.st_size != self.json_size:
+            return False
+        if stat.st_mtime_ns == self.json_mtime_ns:
+            return True
+        # Same size, new mtime (e.g. a fresh checkout): compare contents once
+        if _sha256(json_path) != self.json_sha256:
+            return False
+        if os.stat(json_path).st_mtime_ns == stat.st_mtime_ns:
+            self._record_mtime(stat.st_mtime_ns)
+        return True
+
+    def _record_mtime(self, mtime_ns: int):
+        """Store the JSON mtime of a content match, so later startups skip the hash."""
+        try:
+            with open(self.path, 'r+b') as f:
+                f.seek(HEADER_MTIME_OFFSET)
+                f.write(HEADER_MTIME.pack(mtime_ns))
+        except OSError:
+            return  # Read-only deployment: hash again next time
+        self.json_mtime_ns = mtime_ns
+
+
+def open_store(store_path, json_path=None) -> Optional[FactStore]:
+    """The store at store_path, or None if it is missing, unreadable or stale against json_path."""
+    if not os.path.exists(store_path):
+        return None
+    try:
+        store = FactStore(store_path)
+    except (OSError, ValueError, struct.error) as e:
+        print(f"[KB WARNING] Ignoring fact store {store_path}: {e}")
+        return None
+    if json_path is not None and not store.is_fresh(json_path):
+        print(f"[KB WARNING] Fact store {store_path} is older than {json_path}; "
+              f"recompile with: python verification/fact_store.py {json_path}")
+        return None
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compile knowledge_base.json into a binary fact store')
+    parser.add_argument('json_path', nargs='?', default=str(Path(__file__).parent.parent / 'knowledge_base.json'),
+                        help='Knowledge base JSON (source of truth)')
+    parser.add_argument('-o', '--output', help='Store path (default: JSON path with .bin suffix)')
+    args = parser.parse_args()
+
+    path = compile_store(args.json_path, args.output)
+    store = FactStore(path)
+    print(f"[KB] Compiled {len(store.facts)} facts, {len(store.keyword_index)} keywords -> {path} "
+          f"({os.path.getsize(path) / 1024:.1f} KB)")
+
+
+if __name__ == '__main__':
+    main()
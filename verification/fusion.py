@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+fusion.py - Fusion strategies for BANED
+Combines CNN probabilities with Knowledge Base and verification signals.
+
+Every strategy works element-wise on NumPy arrays (offline evaluation and
+threshold sweeps) and on plain floats (API requests), so both go through the
+same code. Scalars in give plain Python values out. NumPy is optional: without
+it only scalar inputs are supported (verification-only serverless mode).
+"""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _where(condition, a, b):
+    if np is not None:
+        return np.where(condition, a, b)
+    return a if condition else b
+
+
+def _minimum(a, b):
+    return np.minimum(a, b) if np is not None else min(a, b)
+
+
+def _maximum(a, b):
+    return np.maximum(a, b) if np is not None else max(a, b)
+
+
+def _unwrap(x):
+    """Turn 0-d NumPy results back into Python scalars."""
+    if np is not None and np.ndim(x) == 0 and isinstance(x, (np.ndarray, np.generic)):
+        return x.item()
+    return x
+
+
+def kb_probability(kb_signal, scale=0.5):
+    """Map a KB signal (real support - fake support) to a probability in [0, 1]."""
+    return _unwrap(_maximum(0.0, _minimum(1.0, 0.5 + (kb_signal * scale))))
+
+
+def count_probability(real_count, fake_count):
+    """KB probability as the share of real pattern matches (0.5 with no matches)."""
+    total_count = real_count + fake_count
+    return _unwrap(_where(total_count > 0, real_count / _maximum(total_count, 1), 0.5))
+
+
+def baseline_fusion(cnn_prob, kb_prob):
+    """Baseline fusion: simple average of CNN and KB probabilities."""
+    return _unwrap((cnn_prob + kb_prob) / 2.0)
+
+
+def weighted_fusion(cnn_prob, kb_prob, cnn_confidence=None, divisor=0.4):
+    """
+    Confidence-weighted fusion: give more weight to CNN when it's very confident
+
+    Args:
+        cnn_prob: CNN probability (0-1)
+        kb_prob: KB probability (0-1)
+        cnn_confidence: How confident CNN is (default: distance from 0.5)
+        divisor: Confidence at which the CNN gets full weight
+
+    Returns:
+        Fused probability (0-1)
+    """
+    if cnn_confidence is None:
+        cnn_confidence = abs(cnn_prob - 0.5)
+
+    cnn_weight = _minimum(1.0, cnn_confidence / divisor)
+    kb_weight = 1.0 - cnn_weight
+
+    return _unwrap((cnn_prob * cnn_weight) + (kb_prob * kb_weight))
+
+
+def count_fusion(cnn_prob, real_count, fake_count, divisor=0.4):
+    """Weighted fusion with the KB probability taken from match counts.
+
+    Texts without any KB match keep their CNN probability.
+    """
+    kb_prob = count_probability(real_count, fake_count)
+    fused_prob = weighted_fusion(cnn_prob, kb_prob, divisor=divisor)
+    return _unwrap(_where(real_count + fake_count > 0, fused_prob, cnn_prob))
+
+
+def verification_fusion(cnn_prob, verification_score, confidence_impact=1.0, issue_count=0):
+    """
+    Adjust a CNN fake probability with Double Power verification results.
+
+    Args:
+        cnn_prob: CNN fake probability (0-1), or None for verification-only mode
+        verification_score: Combined verification score (negative = suspicious)
+        confidence_impact: Combined confidence impact of the checks
+        issue_count: Number of issues found (verification-only mode)
+
+    Returns:
+        (adjusted fake probability, final confidence)
+    """
+    penalty = abs(verification_score)
+
+    if cnn_prob is not None:
+        adjusted = cnn_prob * confidence_impact
+
+        # If verification found major issues, increase fake probability more aggressively
+        boost = _where(verification_score < -5.0, penalty * 0.08, penalty * 0.06)
+        adjusted = _where(verification_score < -3.0, _minimum(1.0, adjusted + boost), adjusted)
+
+        # If verification found positive signals, decrease fake probability
+        adjusted = _where(verification_score > 2.0, _maximum(0.0, adjusted - penalty * 0.05), adjusted)
+
+        confidence = abs(adjusted - 0.5) * 2.0
+    else:
+        # Verification-only mode: negative score = higher fake prob
+        adjusted = _maximum(0.0, _minimum(1.0, 0.5 - (verification_score * 0.08)))
+        confidence = abs(adjusted - 0.5) * 2.0
+
+        # If no issues detected, bias toward REAL
+        no_issues = (verification_score >= 0) & (issue_count == 0)
+        adjusted = _where(no_issues, 0.35, adjusted)
+        confidence = _where(no_issues, 0.30, confidence)
+
+    return _unwrap(adjusted), _unwrap(confidence)
+
+
+def verdict(fake_prob, fake_threshold=0.55, real_threshold=0.45):
+    """Three-way verdict from a fake probability: FAKE, REAL or UNCERTAIN."""
+    label = _where(fake_prob > fake_threshold, "FAKE", _where(fake_prob < real_threshold, "REAL", "UNCERTAIN"))
+    return _unwrap(label)
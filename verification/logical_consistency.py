@@ -17,6 +17,18 @@ except ImportError:
     except ImportError:
         FACT_CHECKER_AVAILABLE = False
         print("FactChecker not available - Stage 2 disabled")
+try:
+    from verification.fusion import verification_fusion, verdict as fusion_verdict
+except ImportError:
+    from fusion import verification_fusion, verdict as fusion_verdict
+try:
+    from verification.analyzed_text import AnalyzedText, TextLike
+    from verification.phrase_matcher import PhraseMatcher
+    from verification.regex_program import RegexProgram
+except ImportError:
+    from analyzed_text import AnalyzedText, TextLike
+    from phrase_matcher import PhraseMatcher
+    from regex_program import RegexProgram
 
 
 class LogicalConsistencyChecker:
@@ -60,16 +72,45 @@ class LogicalConsistencyChecker:
             r'\b(tomorrow|jutro) in (\d{4})\b',
             r'\b(next year|przyszły rok) in (\d{4})\b',
         ]
+        
+        self.build_program()
     
-    def check_contradictions(self, text: str) -> Tuple[float, List[str]]:
+    def build_program(self):
+        """
+        Compile the patterns into one regex program and the contradiction
+        words into one automaton (call again after editing the lists).
+        Every rule keeps its own semantics: finditer for numerical patterns,
+        search for statistical and temporal patterns.
+        """
+        rules = (
+            [(pattern, ('numerical', (weight, issue_type)), True) for pattern, weight, issue_type in self.numerical_patterns] +
+            [(pattern, ('statistical', (pattern, weight)), False) for pattern, weight in self.statistical_flags] +
+            [(pattern, ('temporal', pattern), False) for pattern in self.temporal_patterns]
+        )
+        self.program = RegexProgram(rules, re.IGNORECASE)
+        
+        entries = []
+        for i, (positive_words, negative_words, _) in enumerate(self.contradiction_pairs):
+            entries.extend((word, (i, True)) for word in positive_words)
+            entries.extend((word, (i, False)) for word in negative_words)
+        self.contradiction_matcher = PhraseMatcher(entries)
+    
+    def scan(self, text: TextLike) -> Dict[str, List]:
+        """Run the regex program once: (rule, matches) per rule, grouped by check"""
+        hits = {'numerical': [], 'statistical': [], 'temporal': []}
+        for (check, rule), matches in self.program.scan(str(text)):
+            hits[check].append((rule, matches))
+        return hits
+    
+    def check_contradictions(self, text: TextLike) -> Tuple[float, List[str]]:
         """Detect self-contradictions in text"""
         score = 0.0
         issues = []
-        text_lower = text.lower()
+        found = set(self.contradiction_matcher.find(AnalyzedText.of(text).lower))
         
-        for positive_words, negative_words, weight in self.contradiction_pairs:
-            has_positive = any(word in text_lower for word in positive_words)
-            has_negative = any(word in text_lower for word in negative_words)
+        for i, (positive_words, negative_words, weight) in enumerate(self.contradiction_pairs):
+            has_positive = (i, True) in found
+            has_negative = (i, False) in found
             
             if has_positive and has_negative:
                 score += weight
@@ -77,58 +118,62 @@ class LogicalConsistencyChecker:
         
         return score, issues
     
-    def check_numerical_consistency(self, text: str) -> Tuple[float, List[str]]:
-        """Check for impossible numerical claims"""
+    def check_numerical_consistency(self, text: TextLike, hits: Dict = None) -> Tuple[float, List[str]]:
+        """Check for impossible numerical claims (hits: result of scan(text), if already run)"""
         score = 0.0
         issues = []
+        if hits is None:
+            hits = self.scan(text)
         
         # Check impossible percentages and numbers
-        for pattern, weight, issue_type in self.numerical_patterns:
-            matches = re.finditer(pattern, text, re.IGNORECASE)
+        for (weight, issue_type), matches in hits['numerical']:
             for match in matches:
                 score += weight
                 issues.append(f"{issue_type}: {match.group()}")
         
         # Check statistical red flags
-        for pattern, weight in self.statistical_flags:
-            if re.search(pattern, text, re.IGNORECASE):
+        for (pattern, weight), matches in hits['statistical']:
+            if matches:
                 score += weight
                 issues.append(f"Statistical red flag: {pattern}")
         
         return score, issues
     
-    def check_temporal_logic(self, text: str) -> Tuple[float, List[str]]:
-        """Check for temporal inconsistencies"""
+    def check_temporal_logic(self, text: TextLike, hits: Dict = None) -> Tuple[float, List[str]]:
+        """Check for temporal inconsistencies (hits: result of scan(text), if already run)"""
         score = 0.0
         issues = []
+        text = AnalyzedText.of(text)
+        if hits is None:
+            hits = self.scan(text)
         
         # Check for temporal contradictions
-        for pattern in self.temporal_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
+        for _, matches in hits['temporal']:
+            if matches:
+                match = matches[0]
                 referenced_year = int(match.group(2))
                 if abs(referenced_year - self.current_year) > 1:
                     score -= 3.0
                     issues.append(f"Temporal inconsistency: {match.group()}")
         
-        # Check for impossible future dates
-        future_pattern = r'\b(20\d{2})\b'
-        for match in re.finditer(future_pattern, text):
-            year = int(match.group(1))
-            if year > self.current_year + 1:
+        # Check for impossible future dates (20xx years)
+        for year in text.years:
+            if 2000 <= year <= 2099 and year > self.current_year + 1:
                 score -= 1.0
                 issues.append(f"Suspicious future date: {year}")
         
         return score, issues
     
-    def analyze(self, text: str) -> Dict:
+    def analyze(self, text: TextLike) -> Dict:
         """
         Comprehensive logical consistency analysis.
         Returns detailed verification results.
         """
+        text = AnalyzedText.of(text)
+        hits = self.scan(text)
         contradiction_score, contradiction_issues = self.check_contradictions(text)
-        numerical_score, numerical_issues = self.check_numerical_consistency(text)
-        temporal_score, temporal_issues = self.check_temporal_logic(text)
+        numerical_score, numerical_issues = self.check_numerical_consistency(text, hits)
+        temporal_score, temporal_issues = self.check_temporal_logic(text, hits)
         
         total_score = contradiction_score + numerical_score + temporal_score
         all_issues = contradiction_issues + numerical_issues + temporal_issues
@@ -193,26 +238,26 @@ class EmotionalLanguageDetector:
             'en': ['danger', 'threat', 'risk', 'warning', 'alert', 'crisis', 'disaster'],
             'pl': ['niebezpieczeństwo', 'zagrożenie', 'ryzyko', 'ostrzeżenie', 'alarm', 'kryzys', 'katastrofa']
         }
+        
+        self.build_matcher()
+    
+    def build_matcher(self):
+        """Compile the word lists into one automaton (call again after editing them)"""
+        entries = []
+        for category, words in (('emotional', self.emotional_words), ('fear', self.fear_words)):
+            for lang, lang_words in words.items():
+                entries.extend((word, (category, lang)) for word in lang_words)
+        self.matcher = PhraseMatcher(entries)
     
-    def analyze(self, text: str) -> Tuple[float, List[str]]:
+    def analyze(self, text: TextLike) -> Tuple[float, List[str]]:
         """Detect emotional language"""
         score = 0.0
         issues = []
-        text_lower = text.lower()
-        
-        # Count emotional words
-        emotional_count = 0
-        for lang_words in self.emotional_words.values():
-            for word in lang_words:
-                if word in text_lower:
-                    emotional_count += 1
-        
-        # Count fear words
-        fear_count = 0
-        for lang_words in self.fear_words.values():
-            for word in lang_words:
-                if word in text_lower:
-                    fear_count += 1
+        
+        # Count emotional and fear words (every listed word found in the text, in one pass)
+        categories = [category for category, _ in self.matcher.find(AnalyzedText.of(text).lower)]
+        emotional_count = categories.count('emotional')
+        fear_count = categories.count('fear')
         
         # Scoring
         if emotional_count >= 3:
@@ -234,13 +279,14 @@ class StyleDetector:
     Detects style markers typical of fake news (CAPS, excessive punctuation, etc.)
     """
     
-    def analyze(self, text: str) -> Tuple[float, List[str]]:
+    def analyze(self, text: TextLike) -> Tuple[float, List[str]]:
         """Detect suspicious style markers"""
         score = 0.0
         issues = []
+        words = AnalyzedText.of(text).tokens
+        text = str(text)
         
         # ALL CAPS words detection
-        words = text.split()
         caps_words = [w for w in words if w.isupper() and len(w) > 2]
         if len(caps_words) >= 3:
             score -= 2.0
@@ -389,38 +435,37 @@ class FactDatabase:
             'propaganda',
             'to ci ukrywają',
         ]
+        
+        self.build_matcher()
+    
+    def build_matcher(self):
+        """Compile the claim and pattern lists into one automaton (call again after editing them)"""
+        self.matcher = PhraseMatcher(
+            [(claim, ('Impossible claim', claim, -4.0)) for claim in self.impossible_claims] +
+            [(item, ('Scientific impossibility', item, -3.0)) for item in self.scientific_impossibilities] +
+            [(pattern, ('Fake pattern', pattern, -2.5)) for pattern in self.fake_patterns]
+        )
     
-    def check_impossible_claims(self, text: str) -> Tuple[float, List[str]]:
+    def check_impossible_claims(self, text: TextLike) -> Tuple[float, List[str]]:
         """Check for known impossible claims"""
         score = 0.0
         detected = []
-        text_lower = text.lower()
-        
-        for claim in self.impossible_claims:
-            if claim in text_lower:
-                score -= 4.0
-                detected.append(f"Impossible claim: {claim}")
-        
-        for impossibility in self.scientific_impossibilities:
-            if impossibility in text_lower:
-                score -= 3.0
-                detected.append(f"Scientific impossibility: {impossibility}")
         
-        for pattern in self.fake_patterns:
-            if pattern in text_lower:
-                score -= 2.5
-                detected.append(f"Fake pattern: {pattern}")
+        for label, phrase, weight in self.matcher.find(AnalyzedText.of(text).lower):
+            score += weight
+            detected.append(f"{label}: {phrase}")
         
         return score, detected
     
-    def check_historical_accuracy(self, text: str) -> Tuple[float, List[str]]:
+    def check_historical_accuracy(self, text: TextLike) -> Tuple[float, List[str]]:
         """Verify historical facts mentioned in text"""
         score = 0.0
         issues = []
-        text_lower = text.lower()
+        text = AnalyzedText.of(text)
+        text_lower = text.lower
         
-        # Extract years from text
-        years = [int(y) for y in re.findall(r'\b(19\d{2}|20\d{2})\b', text)]
+        # Years 1900-2099 mentioned in the text
+        years = [year for year in text.years if 1900 <= year <= 2099]
         
         for event_name, facts in self.historical_facts.items():
             # Check if event is mentioned
@@ -444,11 +489,12 @@ class FactDatabase:
         
         return score, issues
     
-    def verify(self, text: str) -> Dict:
+    def verify(self, text: TextLike) -> Dict:
         """
         Comprehensive fact verification.
         Returns verification results with confidence impact.
         """
+        text = AnalyzedText.of(text)
         impossible_score, impossible_claims = self.check_impossible_claims(text)
         historical_score, historical_issues = self.check_historical_accuracy(text)
         
@@ -495,6 +541,9 @@ class DoublePowerVerifier:
         self.fact_database = FactDatabase()
         self.emotional_detector = EmotionalLanguageDetector()
         self.style_detector = StyleDetector()
+        # Verdict thresholds on the adjusted fake probability (were 0.7 / 0.3)
+        self.fake_threshold = 0.55
+        self.real_threshold = 0.45
         # Stage 2: Fact Checker (if available)
         if FACT_CHECKER_AVAILABLE:
             try:
@@ -509,18 +558,14 @@ class DoublePowerVerifier:
             self.fact_checker = None
             self.stage2_enabled = False
     
-    def verify(self, text: str, cnn_prediction: float = None) -> Dict:
+    def analyze(self, text: TextLike) -> Dict:
         """
-        Perform double power verification.
-        Combines neural network output with logical verification.
-        
-        Args:
-            text: News text to verify
-            cnn_prediction: CNN probability (0-1, where 1 = fake)
-            
-        Returns:
-            Comprehensive verification report with final confidence
+        Run all verification powers on a text without fusing a CNN prediction.
+        Returns the raw (unrounded) signals that verify() combines.
+        The text is analyzed once (AnalyzedText) and shared by all stages.
         """
+        text = AnalyzedText.of(text)
+        
         # Stage 1: Heuristic Analysis
         # Power 1: Logical Consistency Check
         consistency_results = self.consistency_checker.analyze(text)
@@ -569,41 +614,49 @@ class DoublePowerVerifier:
             style_issues
         )
         
-        # If we have CNN prediction, combine it with verification
-        if cnn_prediction is not None:
-            # Adjust CNN prediction based on verification results
-            adjusted_prediction = cnn_prediction * combined_confidence_impact
-            
-            # If verification found major issues, increase fake probability more aggressively
-            if verification_score < -5.0:
-                adjusted_prediction = min(1.0, adjusted_prediction + abs(verification_score) * 0.08)
-            elif verification_score < -3.0:
-                adjusted_prediction = min(1.0, adjusted_prediction + abs(verification_score) * 0.06)
-            
-            # If verification found positive signals, decrease fake probability
-            if verification_score > 2.0:
-                adjusted_prediction = max(0.0, adjusted_prediction - abs(verification_score) * 0.05)
-            
-            final_confidence = abs(adjusted_prediction - 0.5) * 2.0
-        else:
-            # Verification-only mode: more aggressive scoring
-            adjusted_prediction = 0.5 - (verification_score * 0.08)  # Fixed: negative score = higher fake prob
-            adjusted_prediction = max(0.0, min(1.0, adjusted_prediction))
+        return {
+            'consistency_results': consistency_results,
+            'fact_results': fact_results,
+            'emotional_score': emotional_score,
+            'emotional_issues': emotional_issues,
+            'style_score': style_score,
+            'style_issues': style_issues,
+            'fact_check_results': fact_check_results,
+            'verification_score': verification_score,
+            'combined_confidence_impact': combined_confidence_impact,
+            'all_issues': all_issues
+        }
+    
+    def verify(self, text: TextLike, cnn_prediction: float = None) -> Dict:
+        """
+        Perform double power verification.
+        Combines neural network output with logical verification.
+        
+        Args:
+            text: News text to verify
+            cnn_prediction: CNN probability (0-1, where 1 = fake)
             
-            # If no issues detected in verification-only mode, bias toward REAL
-            if verification_score >= 0 and len(all_issues) == 0:
-                adjusted_prediction = 0.35  # Bias toward REAL when no issues
-                final_confidence = 0.30
-            else:
-                final_confidence = abs(adjusted_prediction - 0.5) * 2.0
+        Returns:
+            Comprehensive verification report with final confidence
+        """
+        signals = self.analyze(text)
+        consistency_results = signals['consistency_results']
+        fact_results = signals['fact_results']
+        emotional_score, emotional_issues = signals['emotional_score'], signals['emotional_issues']
+        style_score, style_issues = signals['style_score'], signals['style_issues']
+        fact_check_results = signals['fact_check_results']
+        verification_score = signals['verification_score']
+        combined_confidence_impact = signals['combined_confidence_impact']
+        all_issues = signals['all_issues']
+        
+        # If we have CNN prediction, combine it with verification;
+        # otherwise verification-only mode (more aggressive scoring)
+        adjusted_prediction, final_confidence = verification_fusion(
+            cnn_prediction, verification_score, combined_confidence_impact, len(all_issues)
+        )
         
         # Determine final verdict with more decisive thresholds
-        if adjusted_prediction > 0.55:  # More decisive (was 0.7)
-            verdict = "FAKE"
-        elif adjusted_prediction < 0.45:  # More decisive (was 0.3)
-            verdict = "REAL"
-        else:
-            verdict = "UNCERTAIN"
+        verdict = fusion_verdict(adjusted_prediction, self.fake_threshold, self.real_threshold)
         
         result = {
             'verdict': verdict,
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+phrase_matcher.py - Aho-Corasick phrase automaton for BANED verification
+Finds every phrase of a (growing) phrase list in one linear pass over the text,
+so the cost per request does not depend on how many phrases are listed.
+"""
+from typing import Any, Iterable, List, Tuple
+
+
+class PhraseMatcher:
+    """
+    Aho-Corasick automaton over (phrase, tag) entries.
+
+    `find(text)` returns the tags of all entries whose phrase occurs in
+    `text` as a substring (the same test as `phrase in text`), each entry
+    once and in entry order. Duplicate phrases stay separate entries, so a
+    phrase listed twice is reported twice. Matching is case-sensitive:
+    pass lowercased text for the lowercase phrase lists.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, Any]]):
+        self.tags = []
+        # Trie: child transitions per node, and the entries ending at a node (sparse)
+        self.goto = [{}]
+        self.output = {}
+        for phrase, tag in entries:
+            self._add(phrase, len(self.tags))
+            self.tags.append(tag)
+        self.fail = [0] * len(self.goto)
+        self._link()
+        # Characters of the phrases; any other character leads back to the root
+        self.alphabet = frozenset(char for children in self.goto for char in children)
+
+    def __len__(self) -> int:
+        return len(self.tags)
+
+    def _add(self, phrase: str, entry: int):
+        goto = self.goto
+        node = 0
+        for char in phrase:
+            child = goto[node].get(char)
+            if child is None:
+                child = goto[node][char] = len(goto)
+                goto.append({})
+            node = child
+        self.output.setdefault(node, []).append(entry)
+
+    def _link(self):
+        """Breadth-first failure links; each node also reports its failure chain's entries."""
+        goto, fail, output = self.goto, self.fail, self.output
+        queue = list(goto[0].values())
+        for node in queue:
+            for char, child in goto[node].items():
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                target = fail[child] = goto[state].get(char, 0)
+                if target in output:
+                    output[child] = output.get(child, []) + output[target]
+                queue.append(child)
+
+    def _step(self, node: int, char: str) -> int:
+        """
+        Transition from node on char through the failure links. The result
+        is memoized as an extra edge of the node: after linking, goto holds
+        completed automaton transitions, which resolve the same way.
+
+        Only non-root transitions on phrase characters are memoized, so the
+        automaton grows to at most nodes x alphabet edges, whatever the text.
+        """
+        if not node or char not in self.alphabet:
+            return 0
+        state = node
+        while state and char not in self.goto[state]:
+            state = self.fail[state]
+        target = self.goto[node][char] = self.goto[state].get(char, 0)
+        return target
+
+    def find(self, text: str) -> List[Any]:
+        """Tags of all entries occurring in text, in entry order."""
+        goto, output, step = self.goto, self.output, self._step
+        found = set(output.get(0, ()))  # empty phrases occur in every text
+        node = 0
+        for char in text:
+            target = goto[node].get(char)
+            node = step(node, char) if target is None else target
+            if node in output:
+                found.update(output[node])
+        return [self.tags[entry] for entry in sorted(found)]
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+regex_program.py - Single-pass regex program for BANED verification
+Compiles a list of regex rules into one pattern, so one scan over the text
+yields the hits of every rule.
+"""
+import re
+from typing import Any, Iterable, List, NamedTuple, Tuple
+
+try:
+    import re._parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
+
+# Pattern nodes that refer to another group by number or name
+_GROUP_REFERENCES = (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS)
+
+
+class Hit(NamedTuple):
+    """One match of one rule: its span, matched text and the rule's own groups."""
+    start: int
+    end: int
+    text: str
+    groups: Tuple[Any, ...]
+
+    def group(self, index: int = 0):
+        """Like re.Match.group: 0 is the whole match, n the rule's n-th group."""
+        return self.text if index == 0 else self.groups[index - 1]
+
+
+def _references_group(parsed) -> bool:
+    """True if a parsed pattern (or any subpattern of it) contains a backreference."""
+    for op, arg in parsed:
+        if op in _GROUP_REFERENCES:
+            return True
+        for item in arg if isinstance(arg, (list, tuple)) else (arg,):
+            if isinstance(item, sre_parse.SubPattern) and _references_group(item):
+                return True
+            if isinstance(item, (list, tuple)) and any(
+                    isinstance(sub, sre_parse.SubPattern) and _references_group(sub) for sub in item):
+                return True
+    return False
+
+
+def _rule_groups(pattern: str, flags: int) -> int:
+    """Number of groups of a rule; named groups and backreferences are rejected."""
+    compiled = re.compile(pattern, flags)
+    if compiled.groupindex:
+        raise ValueError(f"RegexProgram rules cannot use named groups: {pattern!r}")
+    if _references_group(sre_parse.parse(pattern, flags)):
+        raise ValueError(f"RegexProgram rules cannot use backreferences: {pattern!r}")
+    return compiled.groups
+
+
+class RegexProgram:
+    """
+    Rules (pattern, tag, find_all) compiled into one regex.
+
+    Every rule becomes a capturing lookahead, tried at each position where
+    at least one rule matches, so rules may overlap freely. `scan(text)`
+    returns (tag, hits) per rule in rule order, with exactly the hits the
+    rule would give on its own: all non-overlapping matches like
+    re.finditer for find_all rules, the first match like re.search
+    otherwise. Rules may use numbered groups, but no named groups or
+    backreferences (the rule is repeated inside the program); those
+    raise ValueError.
+    """
+
+    def __init__(self, rules: Iterable[Tuple[str, Any, bool]], flags: int = 0):
+        rules = [(pattern, tag, find_all, _rule_groups(pattern, flags)) for pattern, tag, find_all in rules]
+        self.rules = []
+        # Per-rule regexes, to finish find_all rules after an empty match (see scan)
+        self.compiled = [re.compile(pattern, flags) for pattern, _, _, _ in rules]
+        gate = []
+        branches = []
+        # The gate repeats every rule's own groups before the capturing branches
+        group = 1 + sum(width for _, _, _, width in rules)
+        for pattern, tag, find_all, width in rules:
+            # Group `group` captures the rule's match; its own groups follow it
+            self.rules.append((tag, find_all, group, width))
+            gate.append(f'(?:{pattern})')
+            branches.append(f'(?:(?=({pattern}))|)')
+            group += 1 + width
+        self.pattern = re.compile(f"(?={'|'.join(gate)})" + ''.join(branches), flags) if gate else None
+
+    def scan(self, text: str) -> List[Tuple[Any, List[Hit]]]:
+        """(tag, hits) of every rule, in rule order."""
+        if self.pattern is None:
+            return []
+        hits = [[] for _ in self.rules]
+        next_start = [0] * len(self.rules)
+        done = [False] * len(self.rules)
+        for match in self.pattern.finditer(text):
+            start = match.start()
+            for i, (tag, find_all, group, width) in enumerate(self.rules):
+                if done[i] or start < next_start[i] or match.start(group) < 0:
+                    continue
+                end = match.end(group)
+                if find_all and end == start:
+                    # After an empty match re.finditer may still match a longer
+                    # text at the same position, which one lookahead cannot see:
+                    # let the rule's own finditer take over from here
+                    hits[i].extend(Hit(m.start(), m.end(), m.group(0), m.groups())
+                                   for m in self.compiled[i].finditer(text, start))
+                    done[i] = True
+                    continue
+                groups = tuple(match.group(g) for g in range(group + 1, group + 1 + width))
+                hits[i].append(Hit(start, end, match.group(group), groups))
+                # Continue after this match, as re.finditer does
+                next_start[i] = end
+                done[i] = not find_all
+        return [(tag, rule_hits) for (tag, _, _, _), rule_hits in zip(self.rules, hits)]